@@ -1,7 +1,43 @@
-from .commands import *
-from .methods import *
-from .utils import *
-from .pipeline import *
 from .log import logger, setup_text_logging
-from .gui import *
 
+#   The submodules below pull pandas, plotly and dash: each one is imported on the first access
+#   to its own name (e.g. sshicstuff.methods), or to one of the names it exports (e.g. sshicstuff.aggregate),
+#   so that the CLI only loads what a command needs.
+_LAZY_SUBMODULES = ("commands", "methods", "utils", "pipeline", "gui")
+
+_EXPORTS = {
+    "commands": (
+        "lazy_import", "check_exists", "prevalidate", "warm_page_cache", "compile_usage", "parse_args",
+        "match_usage", "option_field", "AbstractCommand", "Aggregate", "Associate", "Compare", "Coverage",
+        "Dsdnaonly", "Filter", "Genomaker", "Merge", "Pipeline", "Plot", "Profile", "Rebin", "Ssdnaonly",
+        "Stats", "Subsample", "View"
+    ),
+    "methods": (
+        "aggregate", "associate_oligo_to_frag", "compare_with_wt", "coverage", "edit_genome_ref", "get_stats",
+        "filter_contacts", "fragments_correction", "merge_sparse_mat", "oligo_contacts_joining",
+        "oligo_correction", "oligo_fragments_joining", "plot_profiles", "profile_contacts", "rebin_profile",
+        "sparse_mat_correction", "sparse_with_dsdna_only", "sparse_with_ssdna_only", "starts_match", "subsample"
+    ),
+    "utils": (
+        "check_file_extension", "check_gzip", "check_if_exists", "clear_exists_cache", "check_seqtk", "copy",
+        "detect_delimiter", "read_fragments_list", "frag2", "is_debug", "make_groups_of_probes", "chr_dtype",
+        "sort_by_chr"
+    ),
+    "pipeline": (
+        "input_files", "stage_key", "task_record", "recorded_key", "record_key", "is_stale", "skip_reason",
+        "stage", "run_tasks", "full_pipeline"
+    ),
+    "gui": ("app", "server"),
+}
+
+#   Exported name -> submodule, the later submodules win as with the former star imports
+_EXPORTED_FROM = {name: submodule for submodule, names in _EXPORTS.items() for name in names}
+
+
+def __getattr__(name):
+    import importlib
+    if name in _LAZY_SUBMODULES:
+        return importlib.import_module(f".{name}", __name__)
+    if name in _EXPORTED_FROM:
+        return getattr(importlib.import_module(f".{_EXPORTED_FROM[name]}", __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,27 +1,189 @@
 import os
-from docopt import docopt
+import sys
+import importlib.util
+from types import MappingProxyType
+from collections import defaultdict
+from dataclasses import make_dataclass
+import docopt
 
-import sshicstuff.methods as methods
 import sshicstuff.log as log
-import sshicstuff.pipeline as pip
-from sshicstuff.gui.app import app
 
 logger = log.logger
 
 
+def lazy_import(name: str):
+    """
+    Import a module lazily: it is only executed on the first access to one of its attributes.
+    Spares the pandas / plotly / dash imports to the commands that don't need them (e.g. --help).
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+methods = lazy_import("sshicstuff.methods")
+pip = lazy_import("sshicstuff.pipeline")
+utils = lazy_import("sshicstuff.utils")
+
+
 def check_exists(*args):
-    """Check if a file exists."""
+    """
+    Check if the files exist.
+    Files are grouped by parent directory, and each directory is listed once with os.scandir
+    instead of one stat per file. os.path.exists is only used to confirm a missing file.
+    """
+    paths_per_dir = defaultdict(list)
     for file_path in args:
-        if os.path.exists(file_path):
-            return
-        else:
+        paths_per_dir[os.path.dirname(os.path.abspath(file_path))].append(file_path)
+
+    for directory, file_paths in paths_per_dir.items():
+        try:
+            with os.scandir(directory) as entries:
+                names = {entry.name for entry in entries}
+        except OSError:
+            names = set()
+        for file_path in file_paths:
+            if os.path.basename(file_path) in names or os.path.exists(file_path):
+                continue
             logger.error(f"File {file_path} does not exist.")
             raise FileNotFoundError(f"File {file_path} does not exist.")
 
 
+def prevalidate(*args, min_bytes: int = 1) -> dict:
+    """
+    Stat all the input files once before a long run, and fail fast on empty (or truncated) files,
+    i.e., files smaller than min_bytes.
+    Returns the os.stat result of each file.
+    """
+    stats = {file_path: os.stat(file_path) for file_path in args}
+    too_small = [file_path for file_path, stat in stats.items() if stat.st_size < min_bytes]
+    if too_small:
+        logger.error(f"Input file(s) empty or truncated: {', '.join(too_small)}")
+        raise ValueError(f"Input file(s) empty or truncated: {', '.join(too_small)}")
+    return stats
+
+
+def warm_page_cache(*args):
+    """
+    Ask the OS to start reading the input files in the background (POSIX_FADV_WILLNEED),
+    so that they are already in the page cache when they are actually read (slow disks, NFS).
+    Nothing is done on platforms without posix_fadvise (e.g. macOS).
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    for file_path in args:
+        fd = os.open(file_path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+
+
+_COMPILED_USAGES = {}
+
+
+def compile_usage(doc: str):
+    """
+    Parse the docopt grammar (usage pattern and options defaults) of a docstring.
+    The grammar only depends on the docstring, so it is compiled once and kept in _COMPILED_USAGES.
+    """
+    if doc not in _COMPILED_USAGES:
+        usage = docopt.printable_usage(doc)
+        options = docopt.parse_defaults(doc)
+        pattern = docopt.parse_pattern(docopt.formal_usage(usage), options)
+        pattern_options = set(pattern.flat(docopt.Option))
+        for ao in pattern.flat(docopt.AnyOptions):
+            ao.children = list(set(docopt.parse_defaults(doc)) - pattern_options)
+        _COMPILED_USAGES[doc] = (usage, options, pattern.fix())
+    return _COMPILED_USAGES[doc]
+
+
+def parse_args(doc: str, argv=None, help: bool = True, version=None, options_first: bool = False) -> docopt.Dict:
+    """
+    Same as docopt.docopt, but on a compiled grammar (see compile_usage):
+    only the tokenization and the matching of argv are done per call.
+    """
+    return match_usage(compile_usage(doc), doc, argv, help, version, options_first)
+
+
+def match_usage(
+        compiled: tuple, doc: str, argv=None, help: bool = True, version=None, options_first: bool = False
+) -> docopt.Dict:
+    """
+    Match argv against a grammar returned by compile_usage.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    usage, options, pattern = compiled
+    docopt.DocoptExit.usage = usage
+    argv = docopt.parse_argv(docopt.TokenStream(argv, docopt.DocoptExit), list(options), options_first)
+    docopt.extras(help, version, argv, doc)
+    matched, left, collected = pattern.match(argv)
+    if matched and left == []:
+        return docopt.Dict((a.name, a.value) for a in (pattern.flat() + collected))
+    raise docopt.DocoptExit()
+
+
+#   Options types, docopt only returns strings (or lists of strings) for options with an argument
+_BOOL_OPTS = {
+    "--force", "--compress", "--normalize", "--inter", "--cen", "--tel", "--arm-length", "--log", "--copy-inputs",
+    "--no-cache"
+}
+_INT_OPTS = {
+    "--window", "--bin-size", "--binsize", "--binning-sizes", "--flanking-number", "--fragment-size",
+    "--line-length", "--cis-range", "--window-size-cen", "--window-size-telo", "--binning-aggregate-cen",
+    "--binning-aggregate-telo", "--rolling-window", "--width", "--height", "--size", "--seed",
+    "--jobs"
+}
+_FLOAT_OPTS = {"--ymin", "--ymax"}
+
+
+def _coerce_args(args: docopt.Dict) -> docopt.Dict:
+    """
+    Convert once the parsed arguments to their python types (see _BOOL_OPTS, _INT_OPTS and _FLOAT_OPTS),
+    so that the commands forward real bool / int / float values to the methods.
+    A '[default: None]' in a usage is parsed as the string 'None' and is converted to None.
+    """
+    for key, value in args.items():
+        if value == "None":
+            args[key] = None
+        elif key in _BOOL_OPTS:
+            args[key] = str(value).lower() in ("1", "true", "yes")
+        elif value is None:
+            continue
+        elif key in _INT_OPTS:
+            args[key] = [int(v) for v in value] if isinstance(value, list) else int(value)
+        elif key in _FLOAT_OPTS:
+            args[key] = float(value)
+    return args
+
+
+def option_field(name: str) -> str:
+    """
+    Attribute name of a docopt option or argument, e.g. '--chr-coord' -> 'chr_coord', 'MATRIX' -> 'matrix'.
+    """
+    return name.lstrip("-").replace("-", "_").lower()
+
+
 class AbstractCommand:
     """Base class for the commands"""
 
+    def __init_subclass__(cls, **kwargs):
+        """
+        Compile the docopt grammar of the command once, when the class is created,
+        along with a frozen slots dataclass holding the options of the command as attributes.
+        """
+        super().__init_subclass__(**kwargs)
+        cls._usage = compile_usage(cls.__doc__)
+        fields = dict.fromkeys(option_field(leaf.name) for leaf in cls._usage[2].flat())
+        cls._Options = make_dataclass(f"{cls.__name__}Options", list(fields), slots=True, frozen=True)
+
     def __init__(self, command_args, global_args):
         """
         Initialize the commands.
@@ -29,13 +191,26 @@ class AbstractCommand:
         :param command_args: arguments of the command
         :param global_args: arguments of the program
         """
-        self.args = docopt(self.__doc__, argv=command_args)
+        #   Read-only view of the arguments, they are coerced once here and must not be modified by the commands
+        self.args = MappingProxyType(_coerce_args(match_usage(self._usage, self.__doc__, argv=command_args)))
+        self.opts = self._Options(**{option_field(key): value for key, value in self.args.items()})
         self.global_args = global_args
 
     def execute(self):
         """Execute the commands"""
         raise NotImplementedError
 
+    def run(self, func, **kwargs):
+        """
+        Single dispatch point of the commands to the methods of the package.
+        With the global --dry-run flag, the call is only logged.
+        """
+        if self.global_args.get("--dry-run"):
+            call_args = ", ".join(f"{key}={value!r}" for key, value in kwargs.items())
+            logger.info(f"[Dry run] : {func.__module__}.{func.__name__}({call_args})")
+            return None
+        return func(**kwargs)
+
 
 class Aggregate(AbstractCommand):
     """
@@ -77,28 +252,29 @@ class Aggregate(AbstractCommand):
 
     def execute(self):
         check_exists(
-            self.args["--profile"],
-            self.args["--chr-coord"],
-            self.args["--oligo-capture"]
+            self.opts.profile,
+            self.opts.chr_coord,
+            self.opts.oligo_capture
         )
 
-        if self.args["--cen"] == self.args["--tel"]:
+        if self.opts.cen is self.opts.tel:
             logger.error("You must specify either telomeres or centromeres. Not both")
             logger.error("Exiting...")
             raise ValueError("You must specify either telomeres or centromeres. Not both")
 
-        methods.aggregate(
-            binned_contacts_path=self.args["--profile"],
-            chr_coord_path=self.args["--chr-coord"],
-            oligo_capture_with_frag_path=self.args["--oligo-capture"],
-            window_size=int(self.args["--window"]),
-            telomeres=self.args["--tel"],
-            centromeres=self.args["--cen"],
-            output_dir=self.args["--output"],
-            excluded_chr_list=self.args["--exclude"],
-            inter_only=self.args["--inter"],
-            normalize=self.args["--normalize"],
-            arm_length_classification=self.args["--arm-length"]
+        self.run(
+            methods.aggregate,
+            binned_contacts_path=self.opts.profile,
+            chr_coord_path=self.opts.chr_coord,
+            oligo_capture_with_frag_path=self.opts.oligo_capture,
+            window_size=self.opts.window,
+            telomeres=self.opts.tel,
+            centromeres=self.opts.cen,
+            output_dir=self.opts.output,
+            excluded_chr_list=self.opts.exclude,
+            inter_only=self.opts.inter,
+            normalize=self.opts.normalize,
+            arm_length_classification=self.opts.arm_length
         )
 
 class Associate(AbstractCommand):
@@ -120,11 +296,12 @@ class Associate(AbstractCommand):
     """
 
     def execute(self):
-        check_exists(self.args["--oligo-capture"], self.args["--fragments"])
-        methods.associate_oligo_to_frag(
-            oligo_capture_path=self.args["--oligo-capture"],
-            fragments_path=self.args["--fragments"],
-            force=self.args["--force"]
+        check_exists(self.opts.oligo_capture, self.opts.fragments)
+        self.run(
+            methods.associate_oligo_to_frag,
+            oligo_capture_path=self.opts.oligo_capture,
+            fragments_path=self.opts.fragments,
+            force=self.opts.force
         )
 
 class Compare(AbstractCommand):
@@ -149,12 +326,13 @@ class Compare(AbstractCommand):
     """
 
     def execute(self):
-        check_exists(self.args["--sample-stats"], self.args["--reference-stats"])
-        methods.compare_with_wt(
-            stats1_path=self.args["--sample-stats"],
-            stats2_path=self.args["--reference-stats"],
-            ref_name=self.args["--name"],
-            output_dir=self.args["--output"]
+        check_exists(self.opts.sample_stats, self.opts.reference_stats)
+        self.run(
+            methods.compare_with_wt,
+            stats1_path=self.opts.sample_stats,
+            stats2_path=self.opts.reference_stats,
+            ref_name=self.opts.name,
+            output_dir=self.opts.output
         )
 
 class Coverage(AbstractCommand):
@@ -180,14 +358,15 @@ class Coverage(AbstractCommand):
         -N, --normalize                                     Normalize the coverage by the total number of contacts [default: False]
     """
     def execute(self):
-        check_exists(self.args["--fragments"], self.args["--sparse-mat"])
-        methods.coverage(
-            sparse_mat_path=self.args["--sparse-mat"],
-            fragments_list_path=self.args["--fragments"],
-            output_dir=self.args["--output"],
-            normalize=self.args["--normalize"],
-            force=self.args["--force"],
-            bin_size=int(self.args["--bin-size"])
+        check_exists(self.opts.fragments, self.opts.sparse_mat)
+        self.run(
+            methods.coverage,
+            sparse_mat_path=self.opts.sparse_mat,
+            fragments_list_path=self.opts.fragments,
+            output_dir=self.opts.output,
+            normalize=self.opts.normalize,
+            force=self.opts.force,
+            bin_size=self.opts.bin_size
         )
 
 class Dsdnaonly(AbstractCommand):
@@ -216,13 +395,14 @@ class Dsdnaonly(AbstractCommand):
                                                                 it exists [default: False]
     """
     def execute(self):
-        check_exists(self.args["--sparse-matrix"], self.args["--oligos-capture"])
-        methods.sparse_with_dsdna_only(
-            sample_sparse_mat=self.args["--sparse-matrix"],
-            oligo_capture_with_frag_path=self.args["--oligos-capture"],
-            output_path=self.args["--output"],
-            n_flanking_dsdna=int(self.args["--flanking-number"]),
-            force=self.args["--force"]
+        check_exists(self.opts.sparse_matrix, self.opts.oligos_capture)
+        self.run(
+            methods.sparse_with_dsdna_only,
+            sample_sparse_mat=self.opts.sparse_matrix,
+            oligo_capture_with_frag_path=self.opts.oligos_capture,
+            output_path=self.opts.output,
+            n_flanking_dsdna=self.opts.flanking_number,
+            force=self.opts.force
         )
 
 class Filter(AbstractCommand):
@@ -245,13 +425,14 @@ class Filter(AbstractCommand):
         -F, --force                                             Force the overwriting of the file if it exists [default: False]
     """
     def execute(self):
-        check_exists(self.args["--fragments"], self.args["--oligos-capture"], self.args["--sparse-matrix"])
-        methods.filter_contacts(
-            sparse_mat_path=self.args["--sparse-matrix"],
-            oligo_capture_path=self.args["--oligos-capture"],
-            fragments_list_path=self.args["--fragments"],
-            output_path=self.args["--output"],
-            force=self.args["--force"]
+        check_exists(self.opts.fragments, self.opts.oligos_capture, self.opts.sparse_matrix)
+        self.run(
+            methods.filter_contacts,
+            sparse_mat_path=self.opts.sparse_matrix,
+            oligo_capture_path=self.opts.oligos_capture,
+            fragments_list_path=self.opts.fragments,
+            output_path=self.opts.output,
+            force=self.opts.force
         )
 
 class Genomaker(AbstractCommand):
@@ -282,15 +463,16 @@ class Genomaker(AbstractCommand):
     """
 
     def execute(self):
-        check_exists(self.args["--oligo-annealing"], self.args["--genome"])
-        methods.edit_genome_ref(
-            self.args["--oligo-annealing"],
-            self.args["--genome"],
-            self.args["--enzyme"],
-            fragment_size=int(self.args["--fragment-size"]),
-            fasta_spacer=self.args["--spacer"],
-            fasta_line_length=int(self.args["--line-length"]),
-            additional_fasta_path=self.args["--additional"]
+        check_exists(self.opts.oligo_annealing, self.opts.genome)
+        self.run(
+            methods.edit_genome_ref,
+            annealing_input=self.opts.oligo_annealing,
+            genome_input=self.opts.genome,
+            enzyme=self.opts.enzyme,
+            fragment_size=self.opts.fragment_size,
+            fasta_spacer=self.opts.spacer or "N",
+            fasta_line_length=self.opts.line_length,
+            additional_fasta_path=self.opts.additional
         )
 
 class Merge(AbstractCommand):
@@ -313,11 +495,12 @@ class Merge(AbstractCommand):
     """
 
     def execute(self):
-        matrices = self.args["MATRIX"]
+        matrices = self.opts.matrix
         check_exists( *matrices)
-        methods.merge_sparse_mat(
-            output_path=self.args["--output"],
-            force=self.args["--force"],
+        self.run(
+            methods.merge_sparse_mat,
+            output_path=self.opts.output,
+            force=self.opts.force,
             matrices=matrices
         )
 
@@ -341,7 +524,7 @@ class Pipeline(AbstractCommand):
         [-n FLANKING_NUMBER] [-N] [-o OUTPUT] [-r CIS_RANGE]
         [--window-size-cen WINDOW_SIZE_CEN] [--window-size-telo WINDOW_SIZE_TELO]
         [--binning-aggregate-cen BIN_CEN] [--binning-aggregate-telo BIN_TELO]
-        [--copy-inputs]
+        [--copy-inputs] [-j JOBS] [--no-cache] [--invalidate STAGE...]
 
 
     Arguments:
@@ -363,14 +546,17 @@ class Pipeline(AbstractCommand):
 
         -E CHRS, --exclude=CHRS                             Exclude the chromosome(s) from the analysis
 
-        -F, --force                                         Force the overwriting of the output file if it exists
-                                                            [default: False]
+        -F, --force                                         Force the overwriting of the output files, all the steps
+                                                            are run again, even those that are up to date [default: False]
 
         -I, --inter                                         Only keep inter-chr contacts, i.e., removing contacts between
                                                             a probe and it own chr [default: True]
 
         -L, --arm-length                                    Classify telomeres aggregated in according to their arm length.
 
+        -j JOBS, --jobs JOBS                                Number of processes running the independent steps
+                                                            in parallel, 0 to use all the cores [default: 1]
+
         -n FLANKING_NUMBER, --flanking-number NUMBER        Number of flanking fragments around the fragment
                                                             containing a DSDNA oligo to consider and remove
                                                             [default: 2]
@@ -391,6 +577,12 @@ class Pipeline(AbstractCommand):
 
         --copy-inputs                                       Copy inputs files for reproducibility [default: True]
 
+        --no-cache                                          Run all the steps, even those whose outputs are up to date
+                                                            (see the .cache directory in the output directory)
+
+        --invalidate STAGE                                  Name of a step to run again even if its outputs are up
+                                                            to date (e.g., filter_contacts, coverage, rebin_profile)
+
         --window-size-cen WINDOW_SIZE_CEN                   Window size around the centromeres to aggregate contacts
                                                             [default: 150000]
 
@@ -400,37 +592,48 @@ class Pipeline(AbstractCommand):
     """
 
     def execute(self):
-        check_exists(
-            self.args["--sparse-matrix"],
-            self.args["--oligo-capture"],
-            self.args["--fragments"],
-            self.args["--chr-coord"]
-        )
-
-        binsizes = []
-        if self.args["--binning-sizes"]:
-            binsizes = [int(b) for b in self.args["--binning-sizes"]]
-
-        pip.full_pipeline(
-            sample_sparse_mat=self.args["--sparse-matrix"],
-            oligo_capture=self.args["--oligo-capture"],
-            fragments_list=self.args["--fragments"],
-            chr_coordinates=self.args["--chr-coord"],
-            output_dir=self.args["--output"],
-            additional_groups=self.args["--additional-groups"],
+        inputs = [
+            self.opts.sparse_matrix,
+            self.opts.oligo_capture,
+            self.opts.fragments,
+            self.opts.chr_coord
+        ]
+        if self.opts.additional_groups:
+            inputs.append(self.opts.additional_groups)
+
+        check_exists(*inputs)
+        prevalidate(*inputs)
+        warm_page_cache(*inputs)
+
+        #   Existence checks are memoized for the steps of the pipeline, start this run from a clean state
+        utils.clear_exists_cache()
+
+        binsizes = self.opts.binning_sizes or []
+
+        self.run(
+            pip.full_pipeline,
+            sample_sparse_mat=self.opts.sparse_matrix,
+            oligo_capture=self.opts.oligo_capture,
+            fragments_list=self.opts.fragments,
+            chr_coordinates=self.opts.chr_coord,
+            output_dir=self.opts.output,
+            additional_groups=self.opts.additional_groups,
             bin_sizes=binsizes,
-            cen_agg_window_size=int(self.args["--window-size-cen"]),
-            cen_aggregated_binning=int(self.args["--binning-aggregate-cen"]),
-            telo_agg_window_size=int(self.args["--window-size-telo"]),
-            telo_agg_binning=int(self.args["--binning-aggregate-telo"]),
-            arm_length_classification=self.args["--arm-length"],
-            excluded_chr=self.args["--exclude"],
-            cis_region_size=int(self.args["--cis-range"]),
-            n_flanking_dsdna=int(self.args["--flanking-number"]),
-            inter_chr_only=self.args["--inter"],
-            copy_inputs=self.args["--copy-inputs"],
-            force=self.args["--force"],
-            normalize=self.args["--normalize"]
+            cen_agg_window_size=self.opts.window_size_cen,
+            cen_aggregated_binning=self.opts.binning_aggregate_cen or 10000,
+            telo_agg_window_size=self.opts.window_size_telo,
+            telo_agg_binning=self.opts.binning_aggregate_telo or 10000,
+            arm_length_classification=self.opts.arm_length,
+            excluded_chr=self.opts.exclude,
+            cis_region_size=self.opts.cis_range,
+            n_flanking_dsdna=self.opts.flanking_number,
+            inter_chr_only=self.opts.inter,
+            copy_inputs=self.opts.copy_inputs,
+            force=self.opts.force,
+            normalize=self.opts.normalize,
+            n_jobs=self.opts.jobs,
+            use_cache=not self.opts.no_cache,
+            invalidate=self.opts.invalidate
         )
 
 class Plot(AbstractCommand):
@@ -439,7 +642,7 @@ class Plot(AbstractCommand):
 
     usage:
         plot -c OLIGO_CAPTURE -C CHR_COORD -p PROFILE [-e EXT] [-H HEIGHT] [-L]
-        [-o OUTDIR] [-R REGION] [-r ROLLING_WINDOW] [-W WIDTH] [-y YMIN] [-Y YMAX]
+        [-o OUTDIR] [-R REGION] [-r ROLLING_WINDOW] [-j JOBS] [-W WIDTH] [-y YMIN] [-Y YMAX]
 
     Arguments:
         -c OLIGO_CAPTURE, --oligo-capture OLIGO_CAPTURE             Path to the oligo capture CSV file (with fragment associated)
@@ -454,6 +657,8 @@ class Plot(AbstractCommand):
 
         -H HEIGHT, --height HEIGHT                                  Height of the plot (pixels)
 
+        -j JOBS, --jobs JOBS                                        Number of processes writing the plots [default: 1]
+
         -L, --log                                                   Rescale the y-axis of the plot with np.log
 
         -o OUTDIR, --output OUTDIR                                  Desired output DIRECTORY
@@ -473,56 +678,30 @@ class Plot(AbstractCommand):
 
     def execute(self):
         check_exists(
-            self.args["--profile"],
-            self.args["--chr-coord"],
-            self.args["--oligo-capture"]
+            self.opts.profile,
+            self.opts.chr_coord,
+            self.opts.oligo_capture
         )
 
-        if not self.args["--rolling-window"]:
-            rolling_window = 1
-        else:
-            rolling_window = int(self.args["--rolling-window"])
-
-        if not self.args["--log"]:
-            log_scale = False
-        else:
-            log_scale = self.args["--log"]
-
-        if not self.args["--ymin"]:
-            user_y_min = None
-        else:
-            user_y_min = float(self.args["--ymin"])
-
-        if not self.args["--ymax"]:
-            user_y_max = None
-        else:
-            user_y_max = float(self.args["--ymax"])
-
-        if not self.args["--width"]:
-            width = 1200
-        else:
-            width = int(self.args["--width"])
-
-        if not self.args["--height"]:
-            height = 600
-        else:
-            height = int(self.args["--height"])
-
-
-        rolling_window = 1 if not self.args["--rolling-window"] else int(self.args["--rolling-window"])
-        methods.plot_profiles(
-            profile_contacts_path=self.args["--profile"],
-            chr_coord_path=self.args["--chr-coord"],
-            oligo_capture_path=self.args["--oligo-capture"],
-            output_dir=self.args["--output"],
-            extension=self.args["--file-extension"],
-            region=self.args["--region"],
+        rolling_window = self.opts.rolling_window or 1
+        width = self.opts.width or 1200
+        height = self.opts.height or 600
+
+        self.run(
+            methods.plot_profiles,
+            profile_contacts_path=self.opts.profile,
+            chr_coord_path=self.opts.chr_coord,
+            oligo_capture_path=self.opts.oligo_capture,
+            output_dir=self.opts.output,
+            extension=self.opts.file_extension,
+            region=self.opts.region,
             rolling_window=rolling_window,
-            log_scale=log_scale,
-            user_y_min=user_y_min,
-            user_y_max=user_y_max,
+            log_scale=self.opts.log,
+            user_y_min=self.opts.ymin,
+            user_y_max=self.opts.ymax,
             width=width,
-            height=height
+            height=height,
+            n_jobs=self.opts.jobs
         )
 
 class Profile(AbstractCommand):
@@ -551,15 +730,16 @@ class Profile(AbstractCommand):
         -N, --normalize                                        Normalize the coverage by the total number of contacts [default: False]
     """
     def execute(self):
-        check_exists(self.args["--filtered-table"], self.args["--oligo-capture"], self.args["--chr-coord"])
-        methods.profile_contacts(
-            filtered_table_path=self.args["--filtered-table"],
-            oligo_capture_with_frag_path=self.args["--oligo-capture"],
-            chromosomes_coord_path=self.args["--chr-coord"],
-            output_path=self.args["--output"],
-            additional_groups_path=self.args["--additional"],
-            normalize=self.args["--normalize"],
-            force=self.args["--force"]
+        check_exists(self.opts.filtered_table, self.opts.oligo_capture, self.opts.chr_coord)
+        self.run(
+            methods.profile_contacts,
+            filtered_table_path=self.opts.filtered_table,
+            oligo_capture_with_frag_path=self.opts.oligo_capture,
+            chromosomes_coord_path=self.opts.chr_coord,
+            output_path=self.opts.output,
+            additional_groups_path=self.opts.additional,
+            normalize=self.opts.normalize,
+            force=self.opts.force
         )
 
 class Rebin(AbstractCommand):
@@ -582,13 +762,14 @@ class Rebin(AbstractCommand):
         -F, --force                                       Force the overwriting of the output file if it exists [default: False]
     """
     def execute(self):
-        check_exists(self.args["--profile"], self.args["--chr-coord"])
-        methods.rebin_profile(
-            contacts_unbinned_path=self.args["--profile"],
-            chromosomes_coord_path=self.args["--chr-coord"],
-            bin_size=int(self.args["--binsize"]),
-            output_path=self.args["--output"],
-            force=self.args["--force"]
+        check_exists(self.opts.profile, self.opts.chr_coord)
+        self.run(
+            methods.rebin_profile,
+            contacts_unbinned_path=self.opts.profile,
+            chromosomes_coord_path=self.opts.chr_coord,
+            bin_size=self.opts.binsize,
+            output_path=self.opts.output,
+            force=self.opts.force
         )
 
 class Ssdnaonly(AbstractCommand):
@@ -612,12 +793,13 @@ class Ssdnaonly(AbstractCommand):
         -F, --force                                             Force the overwriting of the file if it exists [default: False]
     """
     def execute(self):
-        check_exists(self.args["--sparse-matrix"], self.args["--oligos-capture"])
-        methods.sparse_with_ssdna_only(
-            sample_sparse_mat=self.args["--sparse-matrix"],
-            oligo_capture_with_frag_path=self.args["--oligos-capture"],
-            output_path=self.args["--output"],
-            force=self.args["--force"]
+        check_exists(self.opts.sparse_matrix, self.opts.oligos_capture)
+        self.run(
+            methods.sparse_with_ssdna_only,
+            sample_sparse_mat=self.opts.sparse_matrix,
+            oligo_capture_with_frag_path=self.opts.oligos_capture,
+            output_path=self.opts.output,
+            force=self.opts.force
         )
 
 class Stats(AbstractCommand):
@@ -655,19 +837,20 @@ class Stats(AbstractCommand):
 
     def execute(self):
         check_exists(
-            self.args["--profile"],
-            self.args["--sparse-mat"],
-            self.args["--chr-coord"],
-            self.args["--oligo-capture"]
+            self.opts.profile,
+            self.opts.sparse_mat,
+            self.opts.chr_coord,
+            self.opts.oligo_capture
         )
-        methods.get_stats(
-            contacts_unbinned_path=self.args["--profile"],
-            sparse_mat_path=self.args["--sparse-mat"],
-            chr_coord_path=self.args["--chr-coord"],
-            oligo_capture_with_frag_path=self.args["--oligo-capture"],
-            output_dir=self.args["--output"],
-            cis_range=int(self.args["--cis-range"]),
-            force=self.args["--force"]
+        self.run(
+            methods.get_stats,
+            contacts_unbinned_path=self.opts.profile,
+            sparse_mat_path=self.opts.sparse_mat,
+            chr_coord_path=self.opts.chr_coord,
+            oligo_capture_with_frag_path=self.opts.oligo_capture,
+            output_dir=self.opts.output,
+            cis_range=self.opts.cis_range,
+            force=self.opts.force
         )
 
 class Subsample(AbstractCommand):
@@ -691,12 +874,13 @@ class Subsample(AbstractCommand):
 
     """
     def execute(self):
-        check_exists(self.args["--input"])
-        methods.subsample(
-            input_path=self.args["--input"],
-            seed=int(self.args["--seed"]),
-            size=int(self.args["--size"]),
-            compress=self.args["--compress"]
+        check_exists(self.opts.input)
+        self.run(
+            methods.subsample,
+            input_path=self.opts.input,
+            seed=self.opts.seed,
+            size=self.opts.size,
+            compress=self.opts.compress
         )
 
 class View(AbstractCommand):
@@ -704,8 +888,14 @@ class View(AbstractCommand):
     Open a graphical user interface to visualize 4-C like profile.
 
     usage:
-        view
+        view [--no-debug]
+
+    Options:
+        --no-debug                                  Run the server without the Dash debug mode (no hot reload)
+                                                    [default: False]
     """
 
     def execute(self):
-        app.run_server(debug=True)
\ No newline at end of file
+        #   Dash / Flask are only imported when the GUI is opened
+        from sshicstuff.gui.app import main as run_app
+        run_app(debug=not self.opts.no_debug)
\ No newline at end of file
@@ -24,5 +24,10 @@ app.layout = html.Div([
 ])
 
 
+def main(debug: bool = True):
+    """Run the Dash server, by default in debug mode (hot reload and debug UI)"""
+    app.run_server(debug=debug)
+
+
 if __name__ == '__main__':
-    app.run_server(debug=True)
+    main()
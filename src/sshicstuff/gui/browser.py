@@ -1,6 +1,9 @@
 import re
 import os
+from functools import lru_cache
+from pathlib import PurePath
 
+import numpy as np
 import pandas as pd
 
 # dash
@@ -12,9 +15,12 @@ import plotly.io as pio
 from sshicstuff.gui.common import __CACHE_DIR__
 from sshicstuff.gui.common import empty_figure
 from sshicstuff.gui.common import uploaded_files
-from sshicstuff.gui.common import save_file
+from sshicstuff.gui.common import clear_uploaded_files
+from sshicstuff.gui.common import save_files
+from sshicstuff.gui.common import read_table
 
 CHR_ARTIFICIAL_EXCLUSION = ["chr_artificial_donor", "chr_artificial_ssDNA"]
+PROBE_COLUMN_PATTERN = re.compile(r'^\d+$|^\$')
 
 # layout.py
 from sshicstuff.gui.layout import layout
@@ -49,15 +55,13 @@ def update_output(value):
 )
 def update_file_list(uploaded_filenames, uploaded_file_contents, n_clicks):
     if uploaded_filenames is not None and uploaded_file_contents is not None:
-        for name, data in zip(uploaded_filenames, uploaded_file_contents):
-            save_file(name, data)
+        save_files(uploaded_filenames, uploaded_file_contents)
 
-    files = uploaded_files()
-    if n_clicks is not None:
-        if n_clicks > 0:
-            for filename in files:
-                os.remove(os.path.join(__CACHE_DIR__, filename))
-            files = []
+    if n_clicks is not None and n_clicks > 0:
+        clear_uploaded_files()
+        files = []
+    else:
+        files = uploaded_files()
 
     n_clicks = 0
     if len(files) == 0:
@@ -82,7 +86,7 @@ def update_region_dropdown(coord_value):
     if coord_value is None:
         return []
 
-    df = pd.read_csv(coord_value, sep='\t')
+    df = read_table(coord_value, sep='\t', usecols=["chr", "length"])
     df = df[~df['chr'].isin(CHR_ARTIFICIAL_EXCLUSION)]
     chr_list = df['chr'].unique()
     chr_list = [f"{c}" for c in chr_list]
@@ -90,24 +94,32 @@ def update_region_dropdown(coord_value):
     return [{'label': c, 'value': c} for c in chr_list]
 
 
+@lru_cache(maxsize=16)
+def fragments_to_probes(oligo_path: str, mtime_ns: int) -> dict:
+    """Fragment id -> probe name of an oligo capture file, kept until the file is modified (mtime)."""
+    df_oligo = read_table(oligo_path, sep=',', usecols=["name", "fragment"])
+    return dict(zip(df_oligo['fragment'].astype(str), df_oligo['name'].astype(str)))
+
+
 @callback(
     Output("probes-dropdown", "options"),
     [Input("oligo-dropdown", "value"),
      Input("samples-dropdown", "value")],
 )
 def update_probes_dropdown(oligo_value, sample_value):
-    if sample_value is None:
+    # the files may have been removed from the cache directory in the meantime
+    if sample_value is None or not os.path.isfile(sample_value):
         return []
 
-    df = pd.read_csv(sample_value, sep='\t')
-    col_of_interest = [c for c in df.columns if re.match(r'^\d+$|^\$', c)]
+    # only the header is needed to list the probes
+    columns = pd.read_csv(sample_value, sep='\t', nrows=0).columns
+    col_of_interest = [c for c in columns if PROBE_COLUMN_PATTERN.match(c)]
 
     probes_options = []
     probes_to_frag = {}
 
-    if oligo_value:
-        df2 = pd.read_csv(oligo_value)
-        probes_to_frag = dict(zip(df2['fragment'].astype(str), df2['name'].astype(str)))
+    if oligo_value and os.path.isfile(oligo_value):
+        probes_to_frag = fragments_to_probes(oligo_value, os.stat(oligo_value).st_mtime_ns)
 
     for c in col_of_interest:
         label = f"{c} - {probes_to_frag[c]}" if c in probes_to_frag else c
@@ -158,17 +170,27 @@ def update_graph(
         return empty_figure
 
     # coordinates & genomic (cumulative) positions stuff
-    df_coords = pd.read_csv(coords_value, sep='\t')
+    df_coords = read_table(coords_value, sep='\t', usecols=["chr", "length"])
     df_coords = df_coords[~df_coords['chr'].isin(CHR_ARTIFICIAL_EXCLUSION)]
-    df_coords = df_coords[["chr", "length"]]
-    df_coords["chr_start"] = df_coords["length"].shift().fillna(0).astype("int64")
-    df_coords["cumu_start"] = df_coords["chr_start"].cumsum()
+    chr_lengths = df_coords["length"].to_numpy(dtype=np.int64)
+    cumu_start = np.zeros_like(chr_lengths)
+    np.cumsum(chr_lengths[:-1], out=cumu_start[1:])
+    df_coords = df_coords[["chr", "length"]].assign(cumu_start=cumu_start)
 
     # sample reading
-    sample_name = samples_value.split('/')[-1].split('.')[0]
-    df_samples = pd.read_csv(samples_value, sep='\t')
-    df = df_samples[["chr", "start", "sizes", "genome_start"] + probes_value]
-    df = df[~df['chr'].isin(CHR_ARTIFICIAL_EXCLUSION)]
+    sample_name = PurePath(samples_value).stem
+    df_samples = read_table(
+        samples_value,
+        sep='\t',
+        usecols=["chr", "start", "sizes", "genome_start"] + probes_value,
+        dtype={"start": "int64", "sizes": "int64", "genome_start": "int64"}
+    )
+    # rows and columns are selected at once, with a single mask
+    chr_values = df_samples["chr"].to_numpy()
+    mask = ~np.isin(chr_values, CHR_ARTIFICIAL_EXCLUSION)
+    if region_value:
+        mask &= chr_values == region_value
+    df = df_samples.loc[mask, ["chr", "start", "sizes", "genome_start"] + probes_value]
 
     binsize = 0
     if binning_value:
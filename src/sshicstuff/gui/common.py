@@ -1,9 +1,12 @@
 import os
 import re
 from os.path import join
+from pathlib import Path
 import pandas as pd
 import numpy as np
 import base64
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 
 # plotly
 from plotly import graph_objs as go
@@ -47,9 +50,35 @@ METHODS TO IMPORT
 
 def save_file(name, content):
     """Decode and store a file uploaded with Plotly Dash."""
-    data = content.encode("utf8").split(b";base64,")[1]
-    with open(join(__CACHE_DIR__, name), "wb") as fp:
-        fp.write(base64.decodebytes(data))
+    data = base64.b64decode(content.partition(";base64,")[2])
+    with open(join(__CACHE_DIR__, name), "wb", buffering=1 << 20) as fp:
+        fp.write(data)
+
+
+def save_files(names, contents):
+    """Decode and store several uploaded files at once, the writes are done in threads."""
+    if len(names) == 1:
+        save_file(names[0], contents[0])
+        return
+    with ThreadPoolExecutor(max_workers=min(8, len(names))) as executor:
+        list(executor.map(save_file, names, contents))
+
+
+@lru_cache(maxsize=64)
+def _read_table(path: str, mtime_ns: int, sep: str, usecols: tuple, dtype: tuple) -> pd.DataFrame:
+    return pd.read_csv(
+        path, sep=sep, usecols=list(usecols) if usecols else None, dtype=dict(dtype) or None, memory_map=True)
+
+
+def read_table(path: str, sep: str = '\t', usecols: list[str] = None, dtype: dict = None) -> pd.DataFrame:
+    """
+    Read a table (coordinates, sample profile, oligos) for the callbacks, only the usecols columns if given.
+    Tables are parsed once and kept in memory until the file is modified (mtime),
+    the returned DataFrame is shared between calls and must be copied before being modified.
+    """
+    usecols = tuple(usecols) if usecols else ()
+    dtype = tuple(sorted(dtype.items())) if dtype else ()
+    return _read_table(path, os.stat(path).st_mtime_ns, sep, usecols, dtype)
 
 
 def sort_by_chr(df: pd.DataFrame, chr_list: list[str], *args: str):
@@ -59,14 +88,10 @@ def sort_by_chr(df: pd.DataFrame, chr_list: list[str], *args: str):
     chr_without_number = [c for c in chr_list if c not in chr_with_number]
 
     order = chr_with_number + chr_without_number
-    df['chr'] = df['chr'].apply(lambda x: order.index(x) if x in order else len(order))
-
-    if args:
-        df = df.sort_values(by=['chr', *args])
-    else:
-        df = df.sort_values(by=['chr'])
-
-    df['chr'] = df['chr'].map(lambda x: order[x])
+    # sort on an ordered categorical of the chromosomes (unknown chromosomes are NaN, sorted last)
+    df = df.assign(__chr_order__=pd.Categorical(df['chr'], categories=order, ordered=True))
+    df = df.sort_values(by=['__chr_order__', *args])
+    df = df.drop(columns=['__chr_order__'])
     df.index = range(len(df))
     return df
 
@@ -94,9 +119,13 @@ def transform_data(data: np.array, y_max: float, user_y_max: float, y_min: float
 
 def uploaded_files():
     """List the files in the upload directory."""
-    files = []
-    for filename in os.listdir(__CACHE_DIR__):
-        path = join(__CACHE_DIR__, filename)
-        if os.path.isfile(path):
-            files.append(filename)
-    return files
+    with os.scandir(__CACHE_DIR__) as entries:
+        return [entry.name for entry in entries if entry.is_file()]
+
+
+def clear_uploaded_files():
+    """Remove the files of the upload directory."""
+    with os.scandir(__CACHE_DIR__) as entries:
+        for entry in entries:
+            if entry.is_file():
+                Path(entry.path).unlink(missing_ok=True)
@@ -15,61 +15,120 @@ import sshicstuff.colors as colors
 """
 
 
+# Layout fields shared by all the figures, only the varying ones are set in figure_maker
+BASE_LAYOUT = dict(
+    xaxis=dict(tickformat='d', showgrid=False),
+    yaxis=dict(title="Contact frequency", showgrid=False),
+    xaxis_type='linear',
+    plot_bgcolor='white',
+    paper_bgcolor='white',
+)
+
+
 def build_bins_template(df_coords: pd.DataFrame, bin_size: int) -> pd.DataFrame:
+    """
+    Bins of all the chromosomes at the bin_size resolution, in the order of the coordinates.
+    The chr column is a categorical (one code per chromosome) rather than one string per bin.
+    """
     chr_sizes = dict(zip(df_coords.chr, df_coords.length))
-    chr_list, chr_bins = [], []
+    nb_bins_per_chr = np.fromiter(chr_sizes.values(), dtype=np.int64) // bin_size + 1
+    chr_first_bin = np.cumsum(nb_bins_per_chr) - nb_bins_per_chr
+    n_bins = nb_bins_per_chr.sum()
 
-    for c, l in chr_sizes.items():
-        chr_list.append([c] * (l // bin_size + 1))
-        chr_bins.append(np.arange(0, (l // bin_size + 1) * bin_size, bin_size))
-
-    chr_list = np.concatenate(chr_list)
-    chr_bins = np.concatenate(chr_bins)
+    chr_codes = np.repeat(np.arange(len(chr_sizes)), nb_bins_per_chr)
+    chr_bins = (np.arange(n_bins) - np.repeat(chr_first_bin, nb_bins_per_chr)) * bin_size
     df_template = pd.DataFrame({
-        'chr': chr_list,
+        'chr': pd.Categorical.from_codes(chr_codes, categories=list(chr_sizes.keys())),
         'chr_bins': chr_bins,
-        'genome_bins': np.arange(0, len(chr_bins)*bin_size, bin_size)
+        'genome_bins': np.arange(n_bins) * bin_size
     })
     return df_template
 
 
-def rebin_live(df: pd.DataFrame, df_template: pd.DataFrame, bin_size: int):
+def rebin_live(df: pd.DataFrame, df_template: pd.DataFrame, bin_size: int, fragments_columns: list[str] = None):
     """
     Rebin function for the GUI to change resolution of contacts in live mode.
+    The pieces of fragments are summed directly into the rows of the template (that may be restricted
+    to a region), so neither a copy of the contacts nor a sort / merge with the template is needed.
+    Only the fragments_columns are rebinned (by default all the fragments and groups columns).
     """
 
-    chr_list = df_template["chr"]
-    df["end"] = df["start"] + df["sizes"]
-    df["start_bin"] = df["start"] // bin_size * bin_size
-    df["end_bin"] = df["end"] // bin_size * bin_size
-    df.drop(columns=["genome_start"], inplace=True)
+    if fragments_columns is None:
+        fragments_columns = [c for c in df.columns if c.isdigit() or c.startswith("$")]
+    starts = df["start"].to_numpy()
+    ends = starts + df["sizes"].to_numpy()
+    start_bins = starts // bin_size * bin_size
+    end_bins = ends // bin_size * bin_size
+    cross_bins = start_bins != end_bins
+
+    # A fragment crossing two bins is split in two pieces, in proportion of its length in each bin
+    correction_factors = (ends[cross_bins] - end_bins[cross_bins]) / df["sizes"].to_numpy()[cross_bins]
+    weights_a = np.ones(len(df))
+    weights_a[cross_bins] = 1 - correction_factors
+    values = df[fragments_columns].to_numpy(dtype=float)
+    piece_values = np.concatenate([values * weights_a[:, None], values[cross_bins] * correction_factors[:, None]])
+    piece_chr = np.concatenate([df["chr"].to_numpy(), df["chr"].to_numpy()[cross_bins]])
+    piece_bins = np.concatenate([start_bins, end_bins[cross_bins]])
+
+    # Row of the template of each piece : the template holds consecutive bins for each of its chromosomes
+    template_chr = df_template["chr"].to_numpy()
+    template_bins = df_template["chr_bins"].to_numpy()
+    chr_names, chr_first_row, chr_n_rows = np.unique(template_chr, return_index=True, return_counts=True)
+    first_row = pd.Series(chr_first_row, index=chr_names)
+    n_rows = pd.Series(chr_n_rows, index=chr_names)
+    first_bin = pd.Series(template_bins[chr_first_row], index=chr_names)
+
+    piece_offsets = (piece_bins - first_bin.reindex(piece_chr).to_numpy()) // bin_size
+    in_template = (piece_offsets >= 0) & (piece_offsets < n_rows.reindex(piece_chr).to_numpy())
+    template_rows = (first_row.reindex(piece_chr).to_numpy() + piece_offsets)[in_template].astype(np.int64)
+    piece_values = piece_values[in_template]
+
+    # Sum the pieces per template row : sort the rows once, then reduce each run of equal rows
+    order = np.argsort(template_rows, kind="stable")
+    sorted_rows = template_rows[order]
+    run_starts = np.flatnonzero(np.diff(sorted_rows, prepend=-1))
+    binned_values = np.zeros((len(df_template), len(fragments_columns)))
+    if len(run_starts) > 0:
+        binned_values[sorted_rows[run_starts]] = np.add.reduceat(piece_values[order], run_starts, axis=0)
+
+    df_binned = pd.concat([
+        df_template.reset_index(drop=True),
+        pd.DataFrame(binned_values, columns=fragments_columns)
+    ], axis=1)
 
-    df_cross_bins = df[df["start_bin"] != df["end_bin"]].copy()
-    df_in_bin = df.drop(df_cross_bins.index)
-    df_in_bin["chr_bins"] = df_in_bin["start_bin"]
+    return df_binned
 
-    df_cross_bins_a = df_cross_bins.copy()
-    df_cross_bins_b = df_cross_bins.copy()
-    df_cross_bins_a["chr_bins"] = df_cross_bins["start_bin"]
-    df_cross_bins_b["chr_bins"] = df_cross_bins["end_bin"]
 
-    fragments_columns = df.filter(regex=r'^\d+$|^\$').columns.to_list()
+def as_float(value, default):
+    """Convert a user input of the interface to float, default if it is empty or not a number."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
 
-    correction_factors = (df_cross_bins_b["end"] - df_cross_bins_b["chr_bins"]) / df_cross_bins_b["sizes"]
-    for c in fragments_columns:
-        df_cross_bins_a[c] *= (1 - correction_factors)
-        df_cross_bins_b[c] *= correction_factors
 
-    df_binned = pd.concat([df_cross_bins_a, df_cross_bins_b, df_in_bin])
-    df_binned.drop(columns=["start_bin", "end_bin"], inplace=True)
+def downsample(x: np.ndarray, y: np.ndarray, max_points: int = 4000):
+    """
+    Reduce a trace to about max_points points before sending it to the browser.
+    The points are grouped in consecutive buckets, and only the minimum and the maximum of each bucket are kept,
+    so that the peaks of the profile are still visible once downsampled.
+    """
+    n = len(y)
+    if n <= max_points:
+        return x, y
 
-    df_binned = df_binned.groupby(["chr", "chr_bins"]).sum().reset_index()
-    df_binned = sort_by_chr(df_binned, chr_list, 'chr_bins')
-    df_binned = pd.merge(df_template, df_binned,  on=['chr', 'chr_bins'], how='left')
-    df_binned.drop(columns=["start", "end", "sizes"], inplace=True)
-    df_binned.fillna(0, inplace=True)
+    bucket = -(-2 * n // max_points)
+    n_buckets = -(-n // bucket)
+    padded = np.full(n_buckets * bucket, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(n_buckets, bucket)
+    bucket_starts = np.arange(0, n, bucket)
 
-    return df_binned
+    # NaN (padding or zeros in log scale) are never selected unless the whole bucket is NaN
+    idx_min = bucket_starts + np.argmin(np.where(np.isnan(padded), np.inf, padded), axis=1)
+    idx_max = bucket_starts + np.argmax(np.where(np.isnan(padded), -np.inf, padded), axis=1)
+    keep = np.unique(np.minimum(np.concatenate([idx_min, idx_max]), n - 1))
+    return x[keep], y[keep]
 
 
 def colorbar_maker(df_bins: pd.DataFrame):
@@ -140,10 +199,10 @@ def figure_maker(
     if chr_region:
         coord_mode[0] = "chromosomal"
         max_chr_region_len = df_coords.loc[df_coords.chr == chr_region, 'length'].values[0]
-        x_min = float(user_x_min) if user_x_min else 0
-        x_max = float(user_x_max) if user_x_max else max_chr_region_len
-        df = df[df['chr'] == chr_region]
-        df = df[(df['start'] >= x_min) & (df['start'] <= x_max)]
+        x_min = as_float(user_x_min, 0)
+        x_max = as_float(user_x_max, max_chr_region_len)
+        starts = df['start'].to_numpy()
+        df = df[(df['chr'].to_numpy() == chr_region) & (starts >= x_min) & (starts <= x_max)]
         x_col = "start" if binsize == 0 else "chr_bins"
 
     if binsize > 0:
@@ -158,67 +217,64 @@ def figure_maker(
         x_min = x_min // binsize * binsize
         x_max = x_max // binsize * binsize + binsize
         df_bins = df_bins[(df_bins['chr_bins'] >= x_min) & (df_bins['chr_bins'] <= x_max)]
-        df = rebin_live(df, df_bins, binsize)
+        df = rebin_live(df, df_bins, binsize, probes)
 
         if rolling_window > 1:
             for chr_ in chr_list_unique:
                 df.loc[df['chr'] == chr_, probes] = (
                     df.loc[df['chr'] == chr_, probes].rolling(window=rolling_window, min_periods=1).mean())
 
-    y_min = float(user_y_min) if user_y_min else 0.
-    y_max = float(user_y_max) if user_y_max else df[probes].max().max()
+    # The probe columns are taken once as a numpy array, used for the y range and the traces
+    probes_values = df[probes].to_numpy(dtype=float)
+    user_y_min = as_float(user_y_min, None)
+    user_y_max = as_float(user_y_max, None)
+
+    def nan_extremum(func, values):
+        return func(values) if np.any(~np.isnan(values)) else np.nan
+
+    y_min = user_y_min if user_y_min is not None else 0.
+    y_max = user_y_max if user_y_max is not None else nan_extremum(np.nanmax, probes_values)
 
     if log_scale:
-        data = df[probes].values
-        data[data == 0] = np.nan
-        new_data = np.log10(data)
-        y_min = np.nanmin(new_data) if not user_y_max else float(user_y_max)
-        y_max = np.nanmax(new_data) if not user_y_min else float(user_y_min)
-        df[probes] = new_data
+        with np.errstate(divide='ignore'):
+            probes_values = np.log10(np.where(probes_values == 0, np.nan, probes_values))
+        y_min = nan_extremum(np.nanmin, probes_values) if user_y_max is None else user_y_max
+        y_max = nan_extremum(np.nanmax, probes_values) if user_y_min is None else user_y_min
 
     y_ticks = np.linspace(y_min, y_max, 5)
     y_tick_text = [f"{tick:.3f}" for tick in y_ticks]
 
     colors_rgba = colors.generate('rgba', len(probes))
 
+    # One trace per probe, downsampled and all built before being added at once to the figure
+    x_values = df[x_col].to_numpy()
+    traces = []
+    for j, frag in enumerate(probes):
+        x_trace, y_trace = downsample(x_values, probes_values[:, j])
+        traces.append(
+            go.Scattergl(
+                x=x_trace,
+                y=y_trace,
+                name=frag,
+                mode='lines',
+                line=dict(width=1, color=colors_rgba[j]),
+                marker=dict(size=4)
+            )
+        )
+
     # Making the figure(s)
     if chr_region:
-        fig = go.Figure()
-        for j in range(len(probes)):
-            frag = probes[j]
-            trace_id = j
-            fig.add_trace(
-                go.Scattergl(
-                    x=df[x_col],
-                    y=df[frag],
-                    name=frag,
-                    mode='lines',
-                    line=dict(width=1, color=colors_rgba[trace_id]),
-                    marker=dict(size=4)
-                )
-            )
+        fig = go.Figure(data=traces)
         fig.update_layout(
-            title=f"{sample_name}",
-            xaxis=dict(
-                title=f"{chr_region} coordinates",
-                tickformat='d',
-                range=[x_min, x_max],
-                showgrid=False,
-            ),
-            yaxis=dict(
-                title="Contact frequency",
-                tickvals=y_ticks,
-                ticktext=y_tick_text,
-                range=[y_min, y_max],
-                showgrid=False,
-            ),
-            xaxis_type='linear',
-            xaxis_tickformat="d",
-            yaxis_tickformat='%.4e' if log_scale else '%.4d',
-            plot_bgcolor='white',
-            paper_bgcolor='white',
+            **BASE_LAYOUT,
+            title=sample_name,
             width=width,
             height=height,
+            yaxis_tickformat='%.4e' if log_scale else '%.4d',
+        )
+        fig.update_layout(
+            xaxis=dict(title=f"{chr_region} coordinates", range=[x_min, x_max]),
+            yaxis=dict(tickvals=y_ticks, ticktext=y_tick_text, range=[y_min, y_max]),
         )
 
     else:
@@ -231,52 +287,26 @@ def figure_maker(
             specs=[[{'type': 'scatter'}], [{'type': 'bar'}]]
         )
 
-        for j in range(len(probes)):
-            frag = probes[j]
-            trace_id = j
-            fig.add_trace(
-                go.Scattergl(
-                    x=df[x_col],
-                    y=df[frag],
-                    name=frag,
-                    mode='lines',
-                    line=dict(width=1, color=colors_rgba[trace_id]),
-                    marker=dict(size=4)
-                ),
-                row=1, col=1
-            )
-            fig.add_trace(colorbar, row=2, col=1)
-
-            fig.update_layout(
-                title=f"{sample_name}",
-                xaxis=dict(
-                    title=dict(text="Genomic coordinates", standoff=80),
-                    tickformat='d',
-                    range=[x_min, x_max],
-                    showgrid=False,
-                ),
-                xaxis2=dict(
-                    tickmode='array',
-                    tickvals=chr_ticks_pos,
-                    ticktext=df['chr'].unique(),
-                    tickfont=dict(size=12),
-                ),
-                yaxis=dict(
-                    title="Contact frequency",
-                    tickvals=y_ticks,
-                    ticktext=y_tick_text,
-                    range=[y_min, y_max],
-                    showgrid=False,
-                ),
-                yaxis2=dict(
-                    showticklabels=False,
-                ),
-                xaxis_type='linear',
-                hovermode='closest',
-                plot_bgcolor='white',
-                paper_bgcolor='white',
-                width=width,
-                height=height,
-            )
+        fig.add_traces(traces, rows=1, cols=1)
+        fig.add_trace(colorbar, row=2, col=1)
+
+        fig.update_layout(
+            **BASE_LAYOUT,
+            title=sample_name,
+            width=width,
+            height=height,
+            hovermode='closest',
+            xaxis2=dict(
+                tickmode='array',
+                tickvals=chr_ticks_pos,
+                ticktext=df['chr'].unique(),
+                tickfont=dict(size=12),
+            ),
+            yaxis2=dict(showticklabels=False),
+        )
+        fig.update_layout(
+            xaxis=dict(title=dict(text="Genomic coordinates", standoff=80), range=[x_min, x_max]),
+            yaxis=dict(tickvals=y_ticks, ticktext=y_tick_text, range=[y_min, y_max]),
+        )
 
     return fig
@@ -7,11 +7,12 @@
 Single Stranded DNA Hi-C pipeline for generating oligo 4-C profiles and aggregated contact matrices.
 
 usage:
-    sshicstuff [-hv] <command> [<args>...]
+    sshicstuff [-hv] [--dry-run] <command> [<args>...]
 
 options:
     -h, --help                  shows the help
     -v, --version               shows the version
+    --dry-run                   only log the calls the command would make, without running them
 
 The subcommands are:
     aggregate           Aggregate all 4C-like profiles on centromeric or telomeric regions.
@@ -52,7 +53,6 @@ The subcommands are:
 
 """
 
-from docopt import docopt
 from docopt import DocoptExit
 import sshicstuff.commands as commands
 
@@ -61,7 +61,7 @@ __version__ = importlib.metadata.version("sshicstuff")
 
 
 def main():
-    args = docopt(__doc__, version=__version__, options_first=True)
+    args = commands.parse_args(__doc__, version=__version__, options_first=True)
     # Retrieve the command to execute.
     command_name = args.pop("<command>").capitalize()
 
@@ -72,10 +72,9 @@ def main():
     # After 'popping' '<command>' and '<args>', what is left in the
     # args dictionary are the global arguments.
 
-    # Retrieve the class from the 'commands' module.
-    try:
-        command_class = getattr(commands, command_name)
-    except AttributeError:
+    # Retrieve the class from the 'commands' module, only the commands classes are accepted.
+    command_class = getattr(commands, command_name, None)
+    if not (isinstance(command_class, type) and issubclass(command_class, commands.AbstractCommand)):
         print("Unknown command.")
         raise DocoptExit()
     # Create an instance of the command.
@@ -1,10 +1,13 @@
 import os
 import re
+import shutil
 import subprocess
 import datetime
+import multiprocessing as mp
 
 import numpy as np
 import pandas as pd
+from scipy.sparse import coo_matrix
 
 import plotly.graph_objs as go
 import plotly.io as pio
@@ -35,7 +38,8 @@ def aggregate(
         excluded_chr_list: list[str] = None,
         inter_only: bool = True,
         normalize: bool = True,
-        arm_length_classification: bool = False
+        arm_length_classification: bool = False,
+        bin_size: int = None
 ) -> None:
     """
     Aggregate the contacts around centromeres within defined regions.
@@ -67,6 +71,8 @@ def aggregate(
         Whether to normalize the contacts by the total number of contacts remaining.
     arm_length_classification : bool, default=False
         Whether to classify the contacts by chromosome arm lengths.
+    bin_size : int, default=None
+        Resolution of the binned profile in bp. If None, it is inferred from the chr_bins column.
 
     Returns
     -------
@@ -90,9 +96,19 @@ def aggregate(
     coords_delim = "\t" if chr_coord_path.endswith(".tsv") else ","
     df_coords: pd.DataFrame = pd.read_csv(chr_coord_path, sep=coords_delim, index_col=None)
     df_oligo: pd.DataFrame = pd.read_csv(oligo_capture_with_frag_path, sep=oligo_delim)
-    df_contacts: pd.DataFrame = pd.read_csv(binned_contacts_path, sep='\t')
-
-    binsize = int(df_contacts.loc[2, 'chr_bins'] - df_contacts.loc[1, 'chr_bins'])
+    # Read the header first to give every column an explicit dtype, spares the type inference on the full table
+    # Probes and groups columns are frequencies, float32 is precise enough and halves the memory of the reductions
+    contacts_columns = pd.read_csv(binned_contacts_path, sep='\t', nrows=0).columns
+    contacts_dtypes = {c: 'float32' for c in contacts_columns}
+    contacts_dtypes.update({'chr': str, 'chr_bins': 'int64', 'genome_bins': 'int64'})
+    df_contacts: pd.DataFrame = pd.read_csv(
+        binned_contacts_path, sep='\t', dtype=contacts_dtypes, engine='c', memory_map=True)
+
+    if bin_size is None:
+        chr_bins = df_contacts['chr_bins'].to_numpy()
+        binsize = int(chr_bins[2] - chr_bins[1])
+    else:
+        binsize = int(bin_size)
     logger.info(f"[Aggregate] : Contacts binned profile with resolution of : {binsize} bp")
 
     chr_list = list(df_coords['chr'].unique())
@@ -104,53 +120,74 @@ def aggregate(
         df_contacts = df_contacts[~df_contacts['chr'].isin(excluded_chr_list)]
         df_coords = df_coords[~df_coords['chr'].isin(excluded_chr_list)]
 
+    # Chromosomes of the bins encoded once as integer codes, the masks and the per chromosome lookups
+    # below compare integers instead of strings
+    bins_chr_codes, bins_chr_names = pd.factorize(df_contacts['chr'], use_na_sentinel=False)
+
+    # The fragments columns are taken once as a numpy matrix (bins x fragments) for the masking
+    # of the intra-chr contacts and the normalization, then assigned back once
+    unique_fragments = list(dict.fromkeys(fragments))
+    if inter_only or normalize:
+        contacts_matrix = df_contacts[unique_fragments].to_numpy(copy=True)
+
     if inter_only:
         #   We need to remove for each oligo the number of contact it makes with its own chr.
         #   Because we know that the frequency of intra-chr contact is higher than inter-chr
         #   We have to set them as NaN to not bias the average
         logger.info("[Aggregate] : Excluding intra-chr contacts")
-        for frag in fragments:
-            ii_frag = df_oligo.loc[df_oligo["fragment"] == int(frag)].index[0]
-            probe_chr_ori = df_oligo.loc[ii_frag, 'chr_ori']
-            if probe_chr_ori not in excluded_chr_list:
-                df_contacts.loc[df_contacts['chr'] == probe_chr_ori, frag] = np.nan
+        df_frag_chr = df_oligo.drop_duplicates(subset="fragment")
+        frag_to_chr_ori = dict(zip(df_frag_chr["fragment"].astype(str), df_frag_chr["chr_ori"]))
+        probes_chr_ori = np.array([frag_to_chr_ori[frag] for frag in unique_fragments])
+        probes_chr_codes = pd.Index(bins_chr_names).get_indexer(probes_chr_ori)
+
+        # (bins x fragments) boolean mask, True where the bin lies on the chromosome of the probe
+        self_chr_mask = bins_chr_codes[:, None] == probes_chr_codes[None, :]
+        contacts_matrix[self_chr_mask] = np.nan
 
         output_prefix += "_inter"
 
     if normalize:
         logger.info("[Aggregate] : Normalizing the contacts")
-        df_contacts.loc[:, fragments] = df_contacts[fragments].div(df_contacts[fragments].sum(axis=0))
+        # All the fragments columns are divided by their sums at once (NaN skipped in the sums)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            contacts_matrix /= np.nansum(contacts_matrix, axis=0)
         output_prefix += "_norm"
 
+    if inter_only or normalize:
+        df_contacts[unique_fragments] = contacts_matrix
+
     if centromeres:
         logger.info(f"[Aggregate] : Aggregating contacts around centromeres")
         logger.info(f"[Aggregate] : Window size: {window_size} bp on each side of the centromere")
 
-        df_merged: pd.DataFrame = pd.merge(df_contacts, df_coords, on='chr')
-        df_merged_cen_areas: pd.DataFrame = df_merged[
-            (df_merged.chr_bins > (df_merged.left_arm_length - window_size - binsize)) &
-            (df_merged.chr_bins < (df_merged.left_arm_length + window_size))]
-        df_merged_cen_areas['chr_bins'] = \
-            abs(df_merged_cen_areas['chr_bins'] - (df_merged_cen_areas['left_arm_length'] // binsize) * binsize)
-        df_grouped: pd.DataFrame = df_merged_cen_areas.groupby(['chr', 'chr_bins'], as_index=False).mean(
-            numeric_only=True)
-        df_grouped.drop(columns=['length', 'left_arm_length', 'right_arm_length', 'genome_bins'], axis=1, inplace=True)
+        # Per bin lookup of its chromosome coordinates, avoids merging the whole table with df_coords
+        chr_bins = df_contacts['chr_bins'].to_numpy()
+        chr_left_arm = dict(zip(df_coords['chr'], df_coords['left_arm_length']))
+        left_arm = pd.Series(bins_chr_names).map(chr_left_arm).to_numpy()[bins_chr_codes]
+        in_cen_area = (chr_bins > (left_arm - window_size - binsize)) & (chr_bins < (left_arm + window_size))
+        df_cen_areas: pd.DataFrame = df_contacts[in_cen_area].copy()
+        df_cen_areas['chr_bins'] = abs(chr_bins[in_cen_area] - (left_arm[in_cen_area] // binsize) * binsize)
+        df_grouped: pd.DataFrame = df_cen_areas.groupby(['chr', 'chr_bins'], as_index=False).mean(numeric_only=True)
+        df_grouped.drop(columns=['genome_bins'], axis=1, inplace=True)
 
     elif telomeres:
         df_telos: pd.DataFrame = pd.DataFrame({'chr': df_coords['chr'], 'telo_l': 0, 'telo_r': df_coords['length']})
-        df_merged: pd.DataFrame = pd.merge(df_contacts, df_telos, on='chr')
-        df_merged_telos_areas_part_a: pd.DataFrame = \
-            df_merged[df_merged.chr_bins < (df_merged.telo_l + window_size + binsize)]
-        df_merged_telos_areas_part_b: pd.DataFrame = \
-            df_merged[df_merged.chr_bins > (df_merged.telo_r - window_size - binsize)]
-        df_merged_telos_areas_part_b['chr_bins'] = \
-            abs(df_merged_telos_areas_part_b['chr_bins'] - (
-                        df_merged_telos_areas_part_b['telo_r'] // binsize) * binsize)
-        df_merged_telos_areas: pd.DataFrame = pd.concat((df_merged_telos_areas_part_a, df_merged_telos_areas_part_b))
-        df_grouped: pd.DataFrame = df_merged_telos_areas.groupby(['chr', 'chr_bins'], as_index=False).mean(
+        chr_bins = df_contacts['chr_bins'].to_numpy()
+        chr_telo_r = dict(zip(df_telos['chr'], df_telos['telo_r']))
+        telo_r = pd.Series(bins_chr_names).map(chr_telo_r).to_numpy()[bins_chr_codes]
+        in_telo_a = chr_bins < (window_size + binsize)
+        in_telo_a &= ~np.isnan(telo_r)
+        in_telo_b = chr_bins > (telo_r - window_size - binsize)
+        # Both telomeric sides taken in a single pass: rows of the left side then rows of the right side
+        # (a bin within the window of both telomeres of a small chromosome is kept once per side),
+        # the right side bins being counted from the right telomere
+        telos_rows = np.concatenate((np.flatnonzero(in_telo_a), np.flatnonzero(in_telo_b)))
+        df_telos_areas: pd.DataFrame = df_contacts.take(telos_rows)
+        df_telos_areas['chr_bins'] = np.concatenate((
+            chr_bins[in_telo_a], abs(chr_bins[in_telo_b] - (telo_r[in_telo_b] // binsize) * binsize)))
+        df_grouped: pd.DataFrame = df_telos_areas.groupby(['chr', 'chr_bins'], as_index=False).mean(
             numeric_only=True)
-        df_grouped.drop(columns=['telo_l', 'telo_r', 'genome_bins'], axis=1, inplace=True)
-        del df_merged, df_merged_telos_areas_part_a, df_merged_telos_areas_part_b
+        df_grouped.drop(columns=['genome_bins'], axis=1, inplace=True)
 
         if arm_length_classification:
             if "category" not in df_coords.columns:
@@ -161,15 +198,19 @@ def aggregate(
             else:
                 logger.info("[Aggregate] : Classifying the contacts by chromosome arm lengths")
 
-                df_arms_size: pd.DataFrame = pd.DataFrame(columns=["chr", "arm", "size", "category"])
-                for _, row in df_coords.iterrows():
-                    chr_ = row["chr"]
-                    if chr_ not in excluded_chr_list:
-                        left_, right_, category_ = row["left_arm_length"], row["right_arm_length"], row["category"]
-                        if pd.isna(left_) or pd.isna(right_) or pd.isna(category_):
-                            continue
-                        df_arms_size.loc[len(df_arms_size)] = chr_, "left", left_, category_.split("_")[0]
-                        df_arms_size.loc[len(df_arms_size)] = chr_, "right", right_, category_.split("_")[1]
+                # Size and category (e.g. small_long -> small on the left arm, long on the right arm)
+                # of both arms of each chromosome, chromosomes with a missing value are skipped
+                arms_columns = ["left_arm_length", "right_arm_length", "category"]
+                has_arms = ~df_coords["chr"].isin(excluded_chr_list) & df_coords[arms_columns].notna().all(axis=1)
+                df_arms = df_coords.loc[has_arms]
+                arms_categories = df_arms["category"].str.split("_")
+                df_arms_size: pd.DataFrame = pd.concat([
+                    pd.DataFrame({
+                        "chr": df_arms["chr"], "arm": arm, "size": df_arms[f"{arm}_arm_length"],
+                        "category": arms_categories.str[i]
+                    })
+                    for i, arm in enumerate(["left", "right"])
+                ], ignore_index=True)
 
                 df_merged2 = pd.merge(df_contacts, df_telos, on='chr')
                 df_merged_telos_areas_part_a = df_merged2[df_merged2.chr_bins < (df_merged2.telo_l + 3000 + 1000)]
@@ -193,23 +234,28 @@ def aggregate(
     df_grouped['chr_bins'] = df_grouped['chr_bins'].astype('int64')
 
     logger.info(f"[Aggregate] : Compute mean, median, std on the aggregated contacts per probe or group of probes, per chromosome")
-    df_aggregated_mean: pd.DataFrame = df_grouped.groupby(by="chr_bins", as_index=False).mean(numeric_only=True)
-    df_aggregated_mean.to_csv(output_prefix + "_mean.tsv", sep="\t")
-    df_aggregated_std: pd.DataFrame = df_grouped.groupby(by="chr_bins", as_index=False).std(numeric_only=True)
-    df_aggregated_std.to_csv(output_prefix + "_std.tsv", sep="\t")
-    df_aggregated_median: pd.DataFrame = df_grouped.groupby(by="chr_bins", as_index=False).median(numeric_only=True)
-    df_aggregated_median.to_csv(output_prefix + "_median.tsv", sep="\t")
-
-    for col in fragments + groups:
+    # The groups of chr_bins are computed once and shared by the three statistics, each of them is a single
+    # reduction over all the columns (agg with a list of functions would run them column by column)
+    value_columns = df_grouped.columns.drop(['chr', 'chr_bins'])
+    df_grouped_by_bins = df_grouped.groupby(by="chr_bins")[value_columns]
+    for stat in ['mean', 'std', 'median']:
+        df_aggregated_stat: pd.DataFrame = getattr(df_grouped_by_bins, stat)().reset_index()
+        df_aggregated_stat.to_csv(output_prefix + f"_{stat}.tsv", sep="\t")
+
+    # Pivot every probe / group at once (chr_bins x (column, chr)), then only slice it per column.
+    # (chr, chr_bins) is unique in df_grouped, so a plain unstack is enough (no re-grouping as in pivot_table)
+    # Probes / groups without any contact have no per chr table, they are left out of the pivot
+    columns_to_pivot = list(pd.unique(np.array(fragments + groups)))
+    columns_sums = df_grouped[columns_to_pivot].sum()
+    columns_to_pivot = [col for col in columns_to_pivot if columns_sums[col] != 0]
+    df_chr_pivot = df_grouped.set_index(['chr_bins', 'chr'])[columns_to_pivot].unstack('chr')
+    for col in columns_to_pivot:
         if col in fragments:
             name = col
         else:
             name = col[1:]
 
-        if df_grouped[col].sum() == 0:
-            continue
-
-        df_chr_centros_pivot = df_grouped.pivot_table(index='chr_bins', columns='chr', values=col, fill_value=0)
+        df_chr_centros_pivot = df_chr_pivot[col].dropna(how='all').dropna(axis=1, how='all').fillna(0)
         df_chr_centros_pivot.to_csv(output_prefix + f"_{name}_per_chr.tsv", sep='\t')
 
 
@@ -255,33 +301,31 @@ def associate_oligo_to_frag(
     oligo_delim = "," if oligo_capture_path.endswith(".csv") else "\t"
     df_oligo = pd.read_csv(oligo_capture_path, sep=oligo_delim)
 
-    df_fragments = pd.read_csv(fragments_path, sep='\t')
+    df_fragments = utils.read_fragments_list(fragments_path)
     df_fragments['frag'] = [k for k in range(len(df_fragments))]
 
-    fragments_id = []
-    fragments_start = []
-    fragments_end = []
-    for index, row in df_oligo.iterrows():
-        (chr_, probe_start, probe_end, probe_chr_ori, probe_start_ori,
-         probe_end_ori, probe_type, probe, probe_seq) = row[:9]
-        df_sub_fragments = df_fragments[df_fragments['chrom'] == chr_]
-        df_sub_fragment_sorted_start = np.sort(df_sub_fragments['start_pos'].to_numpy())
-
-        probe_middle = int(probe_start + (probe_end - probe_start) / 2)
-
-        idx = np.searchsorted(df_sub_fragment_sorted_start, probe_middle, side="left")
-        nearest_frag_start = df_sub_fragment_sorted_start[idx - 1]
-
-        frag_id = df_sub_fragments.index[df_sub_fragments['start_pos'] == nearest_frag_start].tolist()[0]
-        frag_start = df_sub_fragments.loc[frag_id, 'start_pos']
-        frag_end = df_sub_fragments.loc[frag_id, 'end_pos']
-        fragments_id.append(frag_id)
-        fragments_start.append(frag_start)
-        fragments_end.append(frag_end)
-
-    df_oligo['fragment'] = fragments_id
-    df_oligo['fragment_start'] = fragments_start
-    df_oligo['fragment_end'] = fragments_end
+    # All the oligos of a chromosome are looked up at once in the sorted starts of its fragments
+    probe_starts = df_oligo.iloc[:, 1].to_numpy()
+    probe_ends = df_oligo.iloc[:, 2].to_numpy()
+    probe_middles = (probe_starts + (probe_ends - probe_starts) / 2).astype(np.int64)
+    probe_chrs = df_oligo.iloc[:, 0].to_numpy()
+
+    frag_starts = df_fragments['start_pos'].to_numpy()
+    fragments_rows = np.empty(len(df_oligo), dtype=np.int64)
+    fragments_per_chr = df_fragments.groupby('chrom', sort=False).indices
+    for chr_ in pd.unique(probe_chrs):
+        is_chr = probe_chrs == chr_
+        chr_rows = fragments_per_chr[chr_]
+        chr_rows = chr_rows[np.argsort(frag_starts[chr_rows], kind='stable')]
+        chr_sorted_starts = frag_starts[chr_rows]
+        idx = np.searchsorted(chr_sorted_starts, probe_middles[is_chr], side="left")
+        nearest_frag_starts = chr_sorted_starts[idx - 1]
+        # first fragment (in the fragments list order) starting at the nearest start
+        fragments_rows[is_chr] = chr_rows[np.searchsorted(chr_sorted_starts, nearest_frag_starts, side="left")]
+
+    df_oligo['fragment'] = df_fragments.index.to_numpy()[fragments_rows]
+    df_oligo['fragment_start'] = frag_starts[fragments_rows]
+    df_oligo['fragment_end'] = df_fragments['end_pos'].to_numpy()[fragments_rows]
     df_oligo.to_csv(output_path, sep=",", index=False)
 
     logger.info("[Associate] : oligos associated to fragments successfully.")
@@ -322,29 +366,20 @@ def compare_with_wt(
     df_sample: pd.DataFrame = pd.read_csv(stats1_path, header=0, sep="\t")
     df_wt: pd.DataFrame = pd.read_csv(stats2_path, sep='\t')
 
-    df_cap_eff = pd.DataFrame(columns=[
-        "probe",
-        "capture_efficiency",
-        f"capture_efficiency_{ref_name}",
-        f"ratio_sample_vs_wt"
-    ])
-
-    for index, row in df_sample.iterrows():
-        probe = row['probe']
-        cap_eff = row['dsdna_norm_capture_efficiency']
-
-        if probe in df_wt['probe'].tolist():
-            cap_eff_wt = df_wt.loc[df_wt['probe'] == probe, "dsdna_norm_capture_efficiency"].tolist()[0]
-            ratio = cap_eff / cap_eff_wt if cap_eff_wt != 0 else np.nan
-
-        else:
-            cap_eff_wt = np.nan
-            ratio = np.nan
-
-        df_cap_eff.loc[index, "probe"] = probe
-        df_cap_eff.loc[index, "capture_efficiency"] = cap_eff
-        df_cap_eff.loc[index, f"capture_efficiency_{ref_name}"] = cap_eff_wt
-        df_cap_eff.loc[index, f"ratio_sample_vs_{ref_name}"] = ratio
+    # Capture efficiency of the reference for each probe of the sample (first row of the probe in the reference,
+    # NaN if the probe is missing), the ratio is NaN where the reference capture efficiency is 0
+    df_wt_cap_eff = df_wt.drop_duplicates(subset="probe")[["probe", "dsdna_norm_capture_efficiency"]]
+    df_merged = df_sample[["probe", "dsdna_norm_capture_efficiency"]].merge(
+        df_wt_cap_eff, on="probe", how="left", suffixes=("", "_wt"))
+    cap_eff = df_merged["dsdna_norm_capture_efficiency"]
+    cap_eff_wt = df_merged["dsdna_norm_capture_efficiency_wt"]
+
+    df_cap_eff = pd.DataFrame({
+        "probe": df_merged["probe"],
+        "capture_efficiency": cap_eff,
+        f"capture_efficiency_{ref_name}": cap_eff_wt,
+        f"ratio_sample_vs_{ref_name}": (cap_eff / cap_eff_wt).where(cap_eff_wt != 0)
+    })
 
     if output_dir is None:
         output_dir = os.path.dirname(stats1_path)
@@ -396,31 +431,25 @@ def coverage(
         logger.warning("Use the --force / -F flag to overwrite the existing file.")
         return
 
-    df_fragments: pd.DataFrame = pd.read_csv(fragments_list_path, sep='\t')
+    df_fragments: pd.DataFrame = utils.read_fragments_list(fragments_list_path)
     df_fragments.rename(columns={'chrom': 'chr', 'start_pos': 'start', 'end_pos': 'end'}, inplace=True)
     df_fragments['id'] = list(range(len(df_fragments)))
 
     df_hic_contacts: pd.DataFrame = pd.read_csv(
-        sparse_mat_path, header=0, sep="\t", names=['frag_a', 'frag_b', 'contacts'])
-
-    df_merged_a: pd.DataFrame = df_hic_contacts.merge(
-        df_fragments[['id', 'chr', 'start', 'end']],
-        left_on='frag_a',
-        right_on='id',
-        suffixes=('', '_a')).drop(columns=['frag_a', 'frag_b'])
-
-    df_merged_b: pd.DataFrame = df_hic_contacts.merge(
-        df_fragments[['id', 'chr', 'start', 'end']],
-        left_on='frag_b',
-        right_on='id',
-        suffixes=('', '_b')).drop(columns=['frag_a', 'frag_b'])
-
-    df_grouped_a: pd.DataFrame = df_merged_a.groupby(by=['id', 'chr', 'start', 'end'], as_index=False).sum()
-    df_grouped_b: pd.DataFrame = df_merged_b.groupby(by=['id', 'chr', 'start', 'end'], as_index=False).sum()
-
-    df_contacts_cov: pd.DataFrame = pd.concat(
-        (df_grouped_a, df_grouped_b)).groupby(by=['id', 'chr', 'start', 'end'], as_index=False).sum()
-
+        sparse_mat_path, header=0, sep="\t", names=['frag_a', 'frag_b', 'contacts'], memory_map=True)
+
+    # Accumulate the contacts of each fragment (as frag_a and as frag_b) in a sparse
+    # (fragments x fragments) matrix instead of merging and grouping the whole table twice
+    n_frags = len(df_fragments)
+    contacts_mat = coo_matrix(
+        (df_hic_contacts['contacts'], (df_hic_contacts['frag_a'], df_hic_contacts['frag_b'])),
+        shape=(n_frags, n_frags)
+    ).tocsr()
+    frags_coverage = np.asarray(contacts_mat.sum(axis=1)).ravel() + np.asarray(contacts_mat.sum(axis=0)).ravel()
+    frags_in_contacts = (contacts_mat.getnnz(axis=1) + contacts_mat.getnnz(axis=0)) > 0
+
+    df_contacts_cov: pd.DataFrame = df_fragments.loc[frags_in_contacts, ['id', 'chr', 'start', 'end']]
+    df_contacts_cov['contacts'] = frags_coverage[frags_in_contacts]
     df_contacts_cov.index = df_contacts_cov.id
     df_contacts_cov.drop(columns=['id'], inplace=True)
     output_path = output_path + "_contacts_coverage.bedgraph"
@@ -432,22 +461,22 @@ def coverage(
 
         chr_list = df_contacts_cov['chr'].unique()
 
-        df_bins_all: pd.DataFrame = df_contacts_cov.copy(deep=True)
+        # df_contacts_cov is replaced by its binned version below, its columns are added in place
+        df_bins_all: pd.DataFrame = df_contacts_cov
         df_bins_all["size"] = df_bins_all["end"] - df_bins_all["start"]
         df_bins_all['start_bin'] = df_bins_all['start'] // bin_size * bin_size
         df_bins_all['end_bin'] = df_bins_all['end'] // bin_size * bin_size
 
-        df_cross_bins = df_bins_all[df_bins_all["start_bin"] != df_bins_all["end_bin"]].copy()
-        df_in_bin = df_bins_all.drop(df_cross_bins.index)
+        is_cross_bins = (df_bins_all["start_bin"] != df_bins_all["end_bin"]).to_numpy()
+        df_in_bin = df_bins_all[~is_cross_bins]
 
-        df_cross_bins_a = df_cross_bins.copy()
-        df_cross_bins_b = df_cross_bins.copy()
-        df_cross_bins_a["start_bin"] = df_cross_bins["start_bin"]
-        df_cross_bins_b["start_bin"] = df_cross_bins["end_bin"]
+        # the a pieces stay in their start bin, the b pieces are moved to their end bin
+        df_cross_bins_a = df_bins_all[is_cross_bins]
+        df_cross_bins_b = df_cross_bins_a.assign(start_bin=df_cross_bins_a["end_bin"])
 
         correction_factors_b = (df_cross_bins_b["end"] - df_cross_bins_b["start_bin"]) / df_cross_bins_b["size"]
         correction_factors_a = 1 - correction_factors_b
-        df_cross_bins_a["contacts"] *= correction_factors_a
+        df_cross_bins_a = df_cross_bins_a.assign(contacts=df_cross_bins_a["contacts"] * correction_factors_a)
         df_cross_bins_b["contacts"] *= correction_factors_b
 
         df_bins_all_corrected = pd.concat((df_in_bin, df_cross_bins_a, df_cross_bins_b))
@@ -471,8 +500,8 @@ def coverage(
     if normalize:
         output_path = output_path.replace("_contacts_", "_frequencies_")
         logger.info("[Coverage] : Normalizing coverage by the total number of contacts.")
-        df_frequencies_cov: pd.DataFrame = df_contacts_cov.copy(deep=True)
-        df_frequencies_cov["contacts"] /= sum(df_frequencies_cov["contacts"])
+        df_frequencies_cov: pd.DataFrame = df_contacts_cov.assign(
+            contacts=df_contacts_cov["contacts"] / sum(df_contacts_cov["contacts"]))
         df_frequencies_cov.rename(columns={"contacts": "frequencies"})
         df_frequencies_cov.to_csv(output_path, sep='\t', index=False, header=False)
 
@@ -647,94 +676,104 @@ def get_stats(
 
     chr_size_dict = {k: v for k, v in zip(df_coords['chr'], df_coords['length'])}
     chr_list = list(chr_size_dict.keys())
+    chr_sizes = np.array(list(chr_size_dict.values()), dtype=np.int64)
+    #   genome size without each chromosome, looked up per probe instead of re-summed for every (probe, chr)
+    genome_size_total = sum(chr_size_dict.values())
+    genome_size_without_chr = {c: genome_size_total - s for c, s in chr_size_dict.items()}
+
+    # Every column of the profile is given its dtype at parsing (no type inference nor conversion afterwards),
+    # the contacts are parsed in float32 as they are written by profile_contacts, the sums are done in float64.
+    # Only the coordinates and the probes fragments are parsed, the groups columns and genome_start are skipped
+    unbinned_columns = pd.read_csv(contacts_unbinned_path, sep='\t', nrows=0).columns
+    unbinned_usecols = ['chr', 'start', 'sizes'] + list(dict.fromkeys(df_oligo['fragment'].astype(str)))
+    unbinned_dtypes = {c: 'float32' for c in unbinned_columns}
+    unbinned_dtypes.update({'chr': str, 'start': 'int64', 'sizes': 'int64', 'genome_start': 'int64'})
+    df_unbinned_contacts: pd.DataFrame = pd.read_csv(
+        contacts_unbinned_path, sep='\t', usecols=unbinned_usecols, dtype=unbinned_dtypes, memory_map=True)
 
-    df_unbinned_contacts: pd.DataFrame = pd.read_csv(contacts_unbinned_path, sep='\t')
-    df_unbinned_contacts = df_unbinned_contacts.astype(dtype={'chr': str, 'start': int, 'sizes': int})
-
-    df_sparse_contacts: pd.DataFrame = \
-        pd.read_csv(sparse_mat_path, header=0, sep="\t", names=['frag_a', 'frag_b', 'contacts'])
     #   from sparse_matrix (hicstuff results): get total contacts from which probes enrichment is calculated
-    total_sparse_contacts = sum(df_sparse_contacts["contacts"])
-
-    chr_contacts_nrm = {k: [] for k in chr_size_dict}
-    chr_inter_only_contacts_nrm = {k: [] for k in chr_size_dict}
-
-    df_stats: pd.DataFrame = pd.DataFrame(columns=[
-        "probe", "chr", "fragment", "type", "contacts",
-        "coverage_over_hic_contacts", "cis", "trans",
-        "intra_chr", "inter_chr"])
+    #   only the contacts column is needed, stream it by chunks to keep memory bounded on large matrices
+    total_sparse_contacts = 0
+    for chunk in pd.read_csv(sparse_mat_path, header=0, sep="\t", names=['frag_a', 'frag_b', 'contacts'],
+                             usecols=['contacts'], chunksize=1_000_000, memory_map=True):
+        total_sparse_contacts += chunk["contacts"].sum()
 
     probes = df_oligo['name'].to_list()
     fragments = df_oligo['fragment'].astype(str).to_list()
-    for index, (probe, frag) in enumerate(zip(probes, fragments)):
-        df_stats.loc[index, "probe"] = probe
-        df_stats.loc[index, "fragment"] = frag
-        df_stats.loc[index, "type"] = df_oligo.loc[index, "type"]
-
-        #  get the probe's original coordinates
-        self_chr_ori = df_oligo.loc[index, "chr_ori"]
-        self_start_ori = df_oligo.loc[index, "start_ori"]
-        self_stop_ori = df_oligo.loc[index, "stop_ori"]
-
-        df_stats.loc[index, "chr"] = self_chr_ori
-
-        sub_df = df_unbinned_contacts[['chr', 'start', 'sizes', frag]]
-        sub_df.insert(3, 'end', sub_df['start'] + sub_df['sizes'])
-        cis_start = self_start_ori - cis_range
-        cis_stop = self_stop_ori + cis_range
-
-        probe_contacts = sub_df[frag].sum()
-        df_stats.loc[index, "contacts"] = probe_contacts
-        df_stats.loc[index, 'coverage_over_hic_contacts'] = probe_contacts / total_sparse_contacts
-        probes_contacts_inter = sub_df.query("chr != @self_chr_ori")[frag].sum()
-
-        if probe_contacts > 0:
-            cis_freq = sub_df.query("chr == @self_chr_ori & start >= @cis_start & end <= @cis_stop")[frag].sum()
-            cis_freq /= probe_contacts
-
-            trans_freq = 1 - cis_freq
-            inter_chr_freq = probes_contacts_inter / probe_contacts
-            intra_chr_freq = 1 - inter_chr_freq
-        else:
-            cis_freq = 0
-            trans_freq = 0
-            inter_chr_freq = 0
-            intra_chr_freq = 0
-
-        df_stats.loc[index, "cis"] = cis_freq
-        df_stats.loc[index, "trans"] = trans_freq
-        df_stats.loc[index, "intra_chr"] = intra_chr_freq
-        df_stats.loc[index, "inter_chr"] = inter_chr_freq
-
-        for chrom in chr_list:
-            #   n1: sum contacts chr_i
-            #   d1: sum contacts all chr
-            #   chrom_size: chr_i's size
-            #   genome_size: sum of sizes for all chr except frag_chr
-            #   c1: normalized contacts on chr_i for frag_j
-            chrom_size = chr_size_dict[chrom]
-            genome_size = sum([s for c, s in chr_size_dict.items() if c != self_chr_ori])
-            n1 = sub_df.loc[sub_df['chr'] == chrom, frag].sum()
-            if n1 == 0:
-                chr_contacts_nrm[chrom].append(0)
-            else:
-                d1 = probe_contacts
-                c1 = (n1 / d1) / (chrom_size / genome_size)
-                chr_contacts_nrm[chrom].append(c1)
-
-            #   n2: sum contacts chr_i if chr_i != probe_chr
-            #   d2: sum contacts all inter chr (exclude the probe_chr)
-            #   c2: normalized inter chr contacts on chr_i for frag_j
-            n2 = sub_df.loc[
-                (sub_df['chr'] == chrom) &
-                (sub_df['chr'] != self_chr_ori), frag].sum()
-
-            if n2 == 0:
-                chr_inter_only_contacts_nrm[chrom].append(0)
-            else:
-                d2 = probes_contacts_inter
-                c2 = (n2 / d2) / (chrom_size / genome_size)
-                chr_inter_only_contacts_nrm[chrom].append(c2)
+    probes_chr_ori = df_oligo['chr_ori'].to_numpy()
+    cis_starts = df_oligo['start_ori'].to_numpy() - cis_range
+    cis_stops = df_oligo['stop_ori'].to_numpy() + cis_range
+
+    #   contacts of all the probes as one (fragments x probes) matrix, every statistic is a column sum
+    contacts_matrix = df_unbinned_contacts[fragments].to_numpy(dtype=float)
+    #   chromosomes encoded once as integer codes, for the contacts and for the probes (-1 if absent from the contacts)
+    contacts_chr_codes, contacts_chr_names = pd.factorize(df_unbinned_contacts['chr'])
+    probes_chr_codes = pd.Index(contacts_chr_names).get_indexer(probes_chr_ori)
+    contacts_start = df_unbinned_contacts['start'].to_numpy()
+    contacts_end = contacts_start + df_unbinned_contacts['sizes'].to_numpy()
+
+    #   contacts of each probe on each chromosome (chromosomes x probes), as a single one-hot matrix product
+    #   (counts are integers, exact in float64 whatever the summation order),
+    #   the inter-chr contacts of a probe are its contacts minus the ones on its own chromosome
+    chr_one_hot = (np.arange(len(contacts_chr_names))[:, None] == contacts_chr_codes[None, :]).astype(float)
+    all_chr_sums = pd.DataFrame(chr_one_hot @ contacts_matrix, index=contacts_chr_names)
+    probes_contacts = contacts_matrix.sum(axis=0)
+    self_chr_sums = all_chr_sums.to_numpy()[probes_chr_codes, np.arange(len(probes))]
+    probes_contacts_inter = probes_contacts - np.where(probes_chr_codes >= 0, self_chr_sums, 0.)
+
+    #   cis contacts : the masks are made once per chromosome of the probes, on the rows of this chromosome only,
+    #   the (rows x probes) block of the chromosome is taken from the matrix in a single indexing
+    probes_contacts_cis = np.zeros(len(probes))
+    for chr_code in np.unique(probes_chr_codes[probes_chr_codes >= 0]):
+        on_chr = np.flatnonzero(probes_chr_codes == chr_code)
+        chr_rows = np.flatnonzero(contacts_chr_codes == chr_code)
+        in_cis = (
+            (contacts_start[chr_rows, None] >= cis_starts[None, on_chr]) &
+            (contacts_end[chr_rows, None] <= cis_stops[None, on_chr])
+        )
+        probes_contacts_cis[on_chr] = np.where(in_cis, contacts_matrix[np.ix_(chr_rows, on_chr)], 0.).sum(axis=0)
+
+    has_contacts = probes_contacts > 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cis_freq = np.where(has_contacts, probes_contacts_cis / probes_contacts, 0.)
+        inter_chr_freq = np.where(has_contacts, probes_contacts_inter / probes_contacts, 0.)
+
+    df_stats: pd.DataFrame = pd.DataFrame({
+        "probe": probes,
+        "chr": probes_chr_ori,
+        "fragment": fragments,
+        "type": df_oligo["type"].to_numpy(),
+        "contacts": probes_contacts,
+        "coverage_over_hic_contacts": probes_contacts / total_sparse_contacts,
+        "cis": cis_freq,
+        "trans": np.where(has_contacts, 1 - cis_freq, 0.),
+        "intra_chr": np.where(has_contacts, 1 - inter_chr_freq, 0.),
+        "inter_chr": inter_chr_freq
+    })
+
+    #   Normalized contacts of each probe j on each chromosome i, as (chromosomes x probes) matrices :
+    #   n1: sum contacts chr_i
+    #   d1: sum contacts all chr
+    #   chrom_size: chr_i's size
+    #   genome_size: sum of sizes for all chr except frag_chr
+    #   c1 = (n1 / d1) / (chrom_size / genome_size), 0 where n1 is 0
+    #   n2: sum contacts chr_i if chr_i != probe_chr
+    #   d2: sum contacts all inter chr (exclude the probe_chr)
+    #   c2 = (n2 / d2) / (chrom_size / genome_size), 0 where n2 is 0
+    chr_sums = all_chr_sums.reindex(chr_list, fill_value=0.).to_numpy()
+    genome_sizes = np.array([genome_size_without_chr.get(c, genome_size_total) for c in probes_chr_ori])
+    chr_size_ratios = chr_sizes[:, None] / genome_sizes[None, :]
+    is_self_chr = np.array(chr_list)[:, None] == probes_chr_ori[None, :]
+    inter_chr_sums = np.where(is_self_chr, 0., chr_sums)
+    #   preallocated with zeros, only the entries with contacts are divided (in place, no full-size temporaries)
+    chr_contacts_nrm = np.zeros_like(chr_sums)
+    chr_inter_only_contacts_nrm = np.zeros_like(chr_sums)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for nrm, sums, totals in ((chr_contacts_nrm, chr_sums, probes_contacts),
+                                  (chr_inter_only_contacts_nrm, inter_chr_sums, probes_contacts_inter)):
+            has_sums = sums != 0
+            np.divide(sums, totals, out=nrm, where=has_sums)
+            np.divide(nrm, chr_size_ratios, out=nrm, where=has_sums)
 
     #  capture_efficiency_vs_dsdna: amount of contact for one oligo divided
     #  by the mean of all other 'ds' oligo in the genome
@@ -742,15 +781,10 @@ def get_stats(
     d3 = np.mean(df_stats.loc[df_stats['type'] == 'ds', 'contacts'])
     df_stats['dsdna_norm_capture_efficiency'] = n3 / d3
 
-    df_chr_nrm = pd.DataFrame({
-        "probe": probes, "fragment": fragments, "type": df_oligo["type"].values
-    })
-
-    df_chr_inter_only_nrm = df_chr_nrm.copy(deep=True)
-
-    for chr_id in chr_list:
-        df_chr_nrm[chr_id] = chr_contacts_nrm[chr_id]
-        df_chr_inter_only_nrm[chr_id] = chr_inter_only_contacts_nrm[chr_id]
+    df_probes = pd.DataFrame({"probe": probes, "fragment": fragments, "type": df_oligo["type"].values})
+    df_chr_nrm = pd.concat([df_probes, pd.DataFrame(chr_contacts_nrm.T, columns=chr_list)], axis=1)
+    df_chr_inter_only_nrm = pd.concat(
+        [df_probes, pd.DataFrame(chr_inter_only_contacts_nrm.T, columns=chr_list)], axis=1)
 
     df_stats.to_csv(out_stats_path, sep='\t', index=False)
     df_chr_nrm.to_csv(out_chr_freq_path, sep='\t', index=False)
@@ -846,11 +880,14 @@ def filter_contacts(
     """
 
     df_oligo_fragments = oligo_fragments_joining(df_fragments, df_oligo)
-    df1 = second_join('a', df_fragments, df_oligo_fragments, df_contacts)
-    df2 = second_join('b', df_fragments, df_oligo_fragments, df_contacts)
-    df_contacts_joined = pd.concat([df1, df2])
-    df_contacts_joined.drop("frag", axis=1, inplace=True)
-    df_contacts_joined.sort_values(by=['frag_a', 'frag_b', 'start_a', 'start_b'], inplace=True)
+    df_contacts_joined = oligo_contacts_joining(df_fragments, df_oligo_fragments, df_contacts)
+
+    # Sort the contacts by (frag_a, frag_b) on a single int64 key, with a stable argsort.
+    # The starts of the fragments follow their ids, so they are not needed as extra sort keys.
+    frag_a = df_contacts_joined['frag_a'].to_numpy(dtype=np.int64)
+    frag_b = df_contacts_joined['frag_b'].to_numpy(dtype=np.int64)
+    sort_key = frag_a * (frag_b.max(initial=0) + 1) + frag_b
+    df_contacts_joined = df_contacts_joined.take(np.argsort(sort_key, kind='stable'))
     df_contacts_filtered = df_contacts_joined.convert_dtypes().reset_index(drop=True)
 
     df_contacts_filtered.to_csv(output_path, sep='\t', index=False)
@@ -858,32 +895,8 @@ def filter_contacts(
     logger.info(f"[Filter] : Filtered contacts saved to {output_path}")
 
 
-def first_join(x: str, oligo_fragments: pd.DataFrame, contacts: pd.DataFrame) -> pd.DataFrame:
-    """
-    Join the contacts and oligo_fragments DataFrames, keeping only the rows that have their 'x' fragment
-    (either 'frag_a' or 'frag_b', see contacts_correction function).
-
-    Parameters
-    ----------
-    x : str
-        Either 'a' or 'b', indicating whether to join on 'frag_a' or 'frag_b'.
-    oligo_fragments : pd.DataFrame
-        The joined oligo and fragments DataFrame.
-    contacts : pd.DataFrame
-        The corrected contacts DataFrame.
-
-    Returns
-    -------
-    pd.DataFrame
-        The joined contacts and oligo_fragments DataFrame.
-    """
-
-    joined = contacts.merge(oligo_fragments, left_on='frag_'+x, right_on='frag', how='inner')
-    return joined
-
-
 def fragments_correction(fragments_path):
-    fragments = pd.read_csv(fragments_path, sep='\t')
+    fragments = utils.read_fragments_list(fragments_path)
     fragments = pd.DataFrame(
         {'frag': [k for k in range(len(fragments))],
          'chr': fragments['chrom'],
@@ -917,7 +930,7 @@ def merge_sparse_mat(output_path: str = None, force: bool = False, matrices: lis
         output_path = os.path.join(os.path.dirname(matrices[0]), f"{now_}_merged_sparse_contacts.tsv")
 
     df_sparses: list[pd.DataFrame] = [
-        pd.read_csv(matrix, sep='\t', header=0) for matrix in matrices
+        pd.read_csv(matrix, sep='\t', header=0, memory_map=True) for matrix in matrices
     ]
 
     n_frags = int(df_sparses[0].columns[0])
@@ -937,6 +950,58 @@ def merge_sparse_mat(output_path: str = None, force: bool = False, matrices: lis
     logger.info(f"Merged sparse matrix saved to {output_path}")
 
 
+def oligo_contacts_joining(
+        fragments: pd.DataFrame, oligo_fragments: pd.DataFrame, contacts: pd.DataFrame) -> pd.DataFrame:
+    """
+    Join the contacts with the oligo_fragments and fragments DataFrames, keeping only the contacts
+    that have an oligo on frag_a or on frag_b (a contact with an oligo on both sides is kept twice).
+
+    Both sides are joined at once : the contacts are stacked a first time with the oligo on frag_a,
+    a second time with the oligo on frag_b, joined once with oligo_fragments on the fragment of the oligo
+    and once with fragments on the other fragment. The columns are then put back on their side (_a or _b).
+
+    Parameters
+    ----------
+    fragments : pd.DataFrame
+        The corrected fragments DataFrame.
+    oligo_fragments : pd.DataFrame
+        The joined oligo and fragments DataFrame.
+    contacts : pd.DataFrame
+        The corrected contacts DataFrame.
+
+    Returns
+    -------
+    pd.DataFrame
+        The contacts with the fragments information of both sides, and the oligo information of its side.
+    """
+    n_contacts = len(contacts)
+    frag_a = contacts['frag_a'].to_numpy()
+    frag_b = contacts['frag_b'].to_numpy()
+    df_long = pd.DataFrame({
+        'frag_a': np.concatenate([frag_a, frag_a]),
+        'frag_b': np.concatenate([frag_b, frag_b]),
+        'contacts': np.concatenate([contacts['contacts'].to_numpy()] * 2),
+        'frag_oligo': np.concatenate([frag_a, frag_b]),
+        'frag_other': np.concatenate([frag_b, frag_a]),
+        'oligo_on_a': np.repeat([True, False], n_contacts),
+    })
+
+    joined = df_long.merge(oligo_fragments, left_on='frag_oligo', right_on='frag', how='inner')
+    joined = joined.join(fragments.drop("frag", axis=1), on='frag_other', lsuffix='_oligo', rsuffix='_other')
+    oligo_on_a = joined['oligo_on_a'].to_numpy()
+
+    fragments_columns = [c for c in fragments.columns if c != "frag"]
+    oligo_columns = [c for c in oligo_fragments.columns if c not in fragments.columns]
+    df_joined = joined[['frag_a', 'frag_b', 'contacts']].copy()
+    for x, oligo_side in (('a', oligo_on_a), ('b', ~oligo_on_a)):
+        for c in fragments_columns:
+            df_joined[f'{c}_{x}'] = joined[f'{c}_oligo'].where(oligo_side, joined[f'{c}_other'])
+        for c in oligo_columns:
+            df_joined[f'{c}_{x}'] = joined[c].where(oligo_side)
+
+    return df_joined
+
+
 def oligo_correction(oligo_path):
     delim = "," if oligo_path.endswith(".csv") else "\t"
     oligo = pd.read_csv(oligo_path, sep=delim)
@@ -968,14 +1033,24 @@ def oligo_fragments_joining(fragments: pd.DataFrame, oligo: pd.DataFrame) -> pd.
         The joined oligo and fragments DataFrame.
     """
     oligo = starts_match(fragments, oligo)
-    oligo.set_index(['chr', 'start'])
     oligo.pop("end")
-    fragments.set_index(['chr', 'start'])
-    oligo_fragments = fragments.merge(oligo, on=['chr', 'start'])
-    oligo_fragments.sort_values(by=['chr', 'start'])
+
+    # Join on the codes of a chromosome categorical shared by both tables instead of the strings
+    chr_dtype = pd.CategoricalDtype(categories=sorted(set(fragments['chr']) | set(oligo['chr'])))
+    oligo_fragments = fragments.astype({'chr': chr_dtype}).merge(
+        oligo.astype({'chr': chr_dtype}), on=['chr', 'start'])
+    oligo_fragments['chr'] = oligo_fragments['chr'].astype(fragments['chr'].dtype)
     return oligo_fragments
 
 
+def _write_figure(args: tuple) -> None:
+    """
+    Write one plotly figure to an image file (Pool worker of plot_profiles).
+    """
+    fig, output_path = args
+    pio.write_image(fig, output_path, engine="kaleido")
+
+
 def plot_profiles(
         profile_contacts_path: str,
         oligo_capture_path: str,
@@ -988,15 +1063,16 @@ def plot_profiles(
         user_y_min: float = None,
         user_y_max: float = None,
         width: int = 1200,
-        height: int = 600
+        height: int = 600,
+        n_jobs: int = 1
 ):
 
     profile_type = 'contacts'
     if 'frequencies' in profile_contacts_path:
         profile_type = 'frequencies'
 
-    df: pd.DataFrame = pd.read_csv(profile_contacts_path, sep='\t')
-    frags_col = df.filter(regex=r'^\d+$|^\$').columns.to_list()
+    df: pd.DataFrame = pd.read_csv(profile_contacts_path, sep='\t', memory_map=True)
+    frags_col = [c for c in df.columns if c.isdigit() or c.startswith("$")]
     df_oligo: pd.DataFrame = pd.read_csv(oligo_capture_path, sep=',')
     probes_to_frag = dict(zip(df_oligo['fragment'].astype(str), df_oligo['name'].astype(str)))
     df_coords = pd.read_csv(chr_coord_path, sep='\t')
@@ -1095,6 +1171,9 @@ def plot_profiles(
 
     colors_rgba = colors.generate('rgba', len(frags_col))
 
+    # Each figure is written as soon as it is built, with several jobs the (figure, output_path)
+    # pairs are collected and written at the end by a process pool
+    figures = []
     if region:
         for ii_f, frag in enumerate(frags_col):
             fig = go.Figure()
@@ -1140,7 +1219,10 @@ def plot_profiles(
                 height=height,
             )
 
-            pio.write_image(fig, output_path, engine="kaleido")
+            if n_jobs > 1:
+                figures.append((fig, output_path))
+            else:
+                _write_figure((fig, output_path))
 
     else:
         df_10kb_tmp = graph.build_bins_template(df_coords=df_coords, bin_size=10000)
@@ -1211,7 +1293,17 @@ def plot_profiles(
                 height=height,
             )
 
-            pio.write_image(fig, output_path, engine="kaleido")
+            if n_jobs > 1:
+                figures.append((fig, output_path))
+            else:
+                _write_figure((fig, output_path))
+
+    if len(figures) > 1:
+        with mp.Pool(processes=min(n_jobs, len(figures))) as pool:
+            pool.map(_write_figure, figures)
+    elif figures:
+        _write_figure(figures[0])
+
 
 def profile_contacts(
         filtered_table_path: str,
@@ -1265,60 +1357,87 @@ def profile_contacts(
     df_coords: pd.DataFrame = pd.read_csv(chromosomes_coord_path, sep=chr_coord_delim, index_col=None)
     df_chr_len = df_coords[["chr", "length"]]
     chr_list = list(df_chr_len['chr'].unique())
-    df_chr_len["chr_start"] = df_chr_len["length"].shift().fillna(0).astype("int64")
-    df_chr_len["cumu_start"] = df_chr_len["chr_start"].cumsum()
+    chr_lengths = df_chr_len["length"].to_numpy(dtype=np.int64)
+    cumu_start = np.zeros_like(chr_lengths)
+    np.cumsum(chr_lengths[:-1], out=cumu_start[1:])
+    df_chr_len = df_chr_len.assign(cumu_start=cumu_start)
 
     oligo_delim = "," if oligo_capture_with_frag_path.endswith(".csv") else "\t"
     df_oligo: pd.DataFrame = pd.read_csv(oligo_capture_with_frag_path, sep=oligo_delim)
     probes = df_oligo['name'].to_list()
     fragments = df_oligo['fragment'].astype(str).to_list()
 
-    df: pd.DataFrame = pd.read_csv(filtered_table_path, sep='\t')
-    df_contacts: pd.DataFrame = pd.DataFrame(columns=['chr', 'start', 'sizes'])
-    df_contacts: pd.DataFrame = df_contacts.astype(dtype={'chr': str, 'start': int, 'sizes': int})
-
+    # Only parse the columns used below (the filtered table also holds the oligo sequences, gc content etc.),
+    # with their dtypes given up front
+    profile_dtypes = {'contacts': 'int64'}
     for x in ['a', 'b']:
-        y = utils.frag2(x)
-        df2 = df[~pd.isna(df['name_' + x])]
-
-        for probe in probes:
-            if probe not in pd.unique(df2['name_' + x]):
-                tmp = pd.DataFrame({
-                    'chr': [np.nan],
-                    'start': [np.nan],
-                    'sizes': [np.nan],
-                    probe: [np.nan]})
-
-            else:
-                df3 = df2[df2['name_' + x] == probe]
-                tmp = pd.DataFrame({
-                    'chr': df3['chr_' + y],
-                    'start': df3['start_' + y],
-                    'sizes': df3['size_' + y],
-                    probe: df3['contacts']})
-
-            df_contacts = pd.concat([df_contacts, tmp])
+        profile_dtypes.update({f'name_{x}': str, f'chr_{x}': str, f'start_{x}': 'int64', f'size_{x}': 'int64'})
+    df: pd.DataFrame = pd.read_csv(
+        filtered_table_path, sep='\t', usecols=list(profile_dtypes), dtype=profile_dtypes, memory_map=True)
+
+    # Stack the a-side and b-side views into one long table (probe on x, contacted fragment on y),
+    # then sum the contacts per (fragment, probe) pair in a single groupby.
+    df_long: pd.DataFrame = pd.concat([
+        df.loc[df['name_' + x].notna(), ['name_' + x, 'chr_' + y, 'start_' + y, 'size_' + y, 'contacts']]
+        .set_axis(['probe', 'chr', 'start', 'sizes', 'contacts'], axis=1)
+        for x, y in [('a', 'b'), ('b', 'a')]
+    ])
 
-    group = df_contacts.groupby(by=['chr', 'start', 'sizes'], as_index=False)
-    df_contacts: pd.DataFrame = group.sum()
+    # Factorize the contacted fragments and the probes to integer codes and accumulate
+    # the contacts of each (fragment, probe) cell of the dense output with one bincount
+    unique_probes = pd.unique(np.array(probes))
+    probe_codes = pd.Categorical(df_long['probe'], categories=unique_probes).codes
+    df_long = df_long[probe_codes >= 0]
+    probe_codes = probe_codes[probe_codes >= 0]
+    # The contacted fragments are the sorted unique (chr, start, sizes) rows, np.unique gives them with their codes
+    chr_codes, chr_names = pd.factorize(df_long['chr'], sort=True)
+    frag_table = np.column_stack([chr_codes, df_long['start'].to_numpy(), df_long['sizes'].to_numpy()])
+    frag_keys, frag_codes = np.unique(frag_table.astype('int64'), axis=0, return_inverse=True)
+    frag_codes = frag_codes.ravel()
+
+    # The counts are integers, stored in float32 (exact up to 2**24) to halve the memory of the profiles
+    n_probes = len(unique_probes)
+    counts = np.bincount(
+        frag_codes * n_probes + probe_codes,
+        weights=df_long['contacts'].to_numpy(dtype=float),
+        minlength=len(frag_keys) * n_probes
+    ).reshape(len(frag_keys), n_probes).astype(np.float32)
+
+    # Name the columns after the fragment of each probe (the first one listed for a probe),
+    # probes sharing a fragment only keep the column of the first of them
+    probe_to_frag = {}
+    for probe, frag in zip(probes, fragments):
+        probe_to_frag.setdefault(probe, frag)
+    frag_columns = pd.Index([probe_to_frag[p] for p in unique_probes])
+    keep_columns = ~frag_columns.duplicated()
+
+    df_contacts: pd.DataFrame = pd.concat([
+        pd.DataFrame({'chr': chr_names[frag_keys[:, 0]], 'start': frag_keys[:, 1], 'sizes': frag_keys[:, 2]}),
+        pd.DataFrame(counts[:, keep_columns], columns=frag_columns[keep_columns])
+    ], axis=1)
     df_contacts = utils.sort_by_chr(df_contacts, chr_list, 'chr', 'start')
     df_contacts.index = range(len(df_contacts))
 
-    for probe, frag in zip(probes, fragments):
-        df_contacts.rename(columns={probe: frag}, inplace=True)
-
-    df_contacts: pd.DataFrame = df_contacts.loc[:, ~df_contacts.columns.duplicated()]
-
-    df_merged: pd.DataFrame = df_contacts.merge(df_chr_len, on="chr")
-    df_merged["genome_start"] = df_merged["cumu_start"] + df_merged["start"]
-    df_contacts.insert(3, "genome_start", df_merged["genome_start"])
+    # Genomic start : look up the cumulative start of each chromosome on the chr index (no merge)
+    cumu_start = df_chr_len.set_index("chr")["cumu_start"]
+    genome_start = cumu_start.reindex(df_contacts["chr"]).to_numpy() + df_contacts["start"].to_numpy()
+    df_contacts.insert(3, "genome_start", genome_start)
 
     if normalize:
-        df_frequencies = df_contacts.copy(deep=True)
-        for frag in fragments:
-            frag_sum = df_frequencies[frag].sum()
-            if frag_sum > 0:
-                df_frequencies[frag] /= frag_sum
+        # Normalize every fragment column at once, columns without any contact are left to 0.
+        # The frequencies are computed in a new float64 buffer and stored in float32, as the contacts,
+        # only the other columns are copied from the contacts
+        fragments_set = set(fragments)
+        frag_columns = [c for c in df_contacts.columns if c in fragments_set]
+        other_columns = [c for c in df_contacts.columns if c not in fragments_set]
+        contacts_matrix = df_contacts[frag_columns].to_numpy(dtype=float)
+        frag_sums = contacts_matrix.sum(axis=0, keepdims=True)
+        frequencies_matrix = np.zeros_like(contacts_matrix)
+        np.divide(contacts_matrix, frag_sums, out=frequencies_matrix, where=frag_sums > 0)
+        df_frequencies = pd.concat([
+            df_contacts[other_columns],
+            pd.DataFrame(frequencies_matrix.astype(np.float32), columns=frag_columns, index=df_contacts.index)
+        ], axis=1)
 
     if additional_groups_path:
         df_additional: pd.DataFrame = pd.read_csv(additional_groups_path, sep='\t')
@@ -1380,19 +1499,25 @@ def rebin_profile(
         logger.warning("[Rebin] : Use the --force / -F flag to overwrite the existing file.")
         return
 
-    df = pd.read_csv(contacts_unbinned_path, sep='\t')
+    # genome_start is not needed to rebin, skip it at parsing.
+    # The header is read first to parse the fragments and groups columns directly in float32 (as they are written)
+    profile_columns = pd.read_csv(contacts_unbinned_path, sep='\t', nrows=0).columns
+    profile_dtypes = {c: 'float32' for c in profile_columns}
+    profile_dtypes.update({"chr": str, "start": "int64", "sizes": "int64"})
+    df = pd.read_csv(
+        contacts_unbinned_path, sep='\t',
+        usecols=lambda c: c != "genome_start", dtype=profile_dtypes, memory_map=True
+    )
     coord_delim = "," if chromosomes_coord_path.endswith(".csv") else "\t"
-    df_coords: pd.DataFrame = pd.read_csv(chromosomes_coord_path, sep=coord_delim, index_col=None)
+    df_coords: pd.DataFrame = pd.read_csv(
+        chromosomes_coord_path, sep=coord_delim, index_col=None, usecols=["chr", "length"])
 
     chr_sizes = dict(zip(df_coords.chr, df_coords.length))
-    chr_list, chr_bins = [], []
+    nb_bins_per_chr = np.array(list(chr_sizes.values())) // bin_size + 1
+    chr_first_bin = np.cumsum(nb_bins_per_chr) - nb_bins_per_chr
 
-    for c, l in chr_sizes.items():
-        chr_list.append([c] * (l // bin_size + 1))
-        chr_bins.append(np.arange(0, (l // bin_size + 1) * bin_size, bin_size))
-
-    chr_list = np.concatenate(chr_list)
-    chr_bins = np.concatenate(chr_bins)
+    chr_list = np.repeat(list(chr_sizes.keys()), nb_bins_per_chr)
+    chr_bins = (np.arange(nb_bins_per_chr.sum()) - np.repeat(chr_first_bin, nb_bins_per_chr)) * bin_size
 
     df_template = pd.DataFrame({
         'chr': chr_list,
@@ -1400,86 +1525,62 @@ def rebin_profile(
         'genome_bins': np.arange(0, len(chr_bins) * bin_size, bin_size)
     })
 
-    df["end"] = df["start"] + df["sizes"]
-    df["start_bin"] = df["start"] // bin_size * bin_size
-    df["end_bin"] = df["end"] // bin_size * bin_size
-    df.drop(columns=["genome_start"], inplace=True)
-
-    df_cross_bins = df[df["start_bin"] != df["end_bin"]].copy()
-    df_in_bin = df.drop(df_cross_bins.index)
-    df_in_bin["chr_bins"] = df_in_bin["start_bin"]
-
-    df_cross_bins_a = df_cross_bins.copy()
-    df_cross_bins_b = df_cross_bins.copy()
-    df_cross_bins_a["chr_bins"] = df_cross_bins["start_bin"]
-    df_cross_bins_b["chr_bins"] = df_cross_bins["end_bin"]
-
-    fragments_columns = df.filter(regex=r'^\d+$|^\$').columns.to_list()
-
-    correction_factors = (df_cross_bins_b["end"] - df_cross_bins_b["chr_bins"]) / df_cross_bins_b["sizes"]
-    for c in fragments_columns:
-        df_cross_bins_a[c] *= (1 - correction_factors)
-        df_cross_bins_b[c] *= correction_factors
-
-    df_binned = pd.concat([df_cross_bins_a, df_cross_bins_b, df_in_bin])
-    df_binned.drop(columns=["start_bin", "end_bin"], inplace=True)
-
-    df_binned = df_binned.groupby(["chr", "chr_bins"]).sum().reset_index()
-    df_binned = utils.sort_by_chr(df_binned, chr_list, 'chr_bins')
-    df_binned = pd.merge(df_template, df_binned, on=['chr', 'chr_bins'], how='left')
-    df_binned.drop(columns=["start", "end", "sizes"], inplace=True)
-    df_binned.fillna(0, inplace=True)
-
-    df_binned.to_csv(output_path, sep='\t', index=False)
-
-
-def second_join(
-        x: str, fragments: pd.DataFrame, oligo_fragments: pd.DataFrame, contacts: pd.DataFrame) -> pd.DataFrame:
-    """
-    Add the fragments DataFrame information (=columns) for the y fragment after the first join
-    (see first_join function). This is only for the y fragment, because the x fragments already have their
-    information in the oligo_fragments DataFrame.
-
-    Parameters
-    ----------
-    x : str
-        Either 'a' or 'b', indicating which fragment corresponds to an oligo.
-    fragments : pd.DataFrame
-        The corrected fragments DataFrame.
-    oligo_fragments : pd.DataFrame
-        The joined oligo and fragments DataFrame.
-    contacts : pd.DataFrame
-        The corrected contacts DataFrame.
-
-    Returns
-    -------
-    pd.DataFrame
-        The joined DataFrame with added fragment information for the y fragment.
-    """
-    new_contacts = first_join(x, oligo_fragments, contacts)
-    y = utils.frag2(x)
-    joined = new_contacts.join(fragments.drop("frag", axis=1),
-                               on='frag_'+y,
-                               lsuffix='_' + x[-1],
-                               rsuffix='_' + y[-1], how='left')
-
-    # puts a suffix to know what fragment corresponds to an oligo
-    joined.rename(columns={"type": "type_" + x[-1],
-                           "name": "name_" + x[-1],
-                           "sequence": "sequence_" + x[-1]
-                           },
-                  inplace=True)
-    return joined
+    fragments_columns = [c for c in profile_columns if c.isdigit() or c.startswith("$")]
+
+    # A fragment crossing two bins is split in two pieces (a and b), in proportion of its length in each bin.
+    # The pieces are made on the numpy matrix of the fragments columns, in the order
+    # cross pieces a, cross pieces b, then fragments inside a single bin.
+    starts = df["start"].to_numpy()
+    sizes = df["sizes"].to_numpy()
+    ends = starts + sizes
+    start_bins = starts // bin_size * bin_size
+    end_bins = ends // bin_size * bin_size
+    cross_bins = start_bins != end_bins
+
+    correction_factors = ((ends[cross_bins] - end_bins[cross_bins]) / sizes[cross_bins])[:, None]
+    fragments_values = df[fragments_columns].to_numpy(dtype=float)
+    cross_values = fragments_values[cross_bins]
+    values = np.concatenate([
+        cross_values * (1 - correction_factors),
+        cross_values * correction_factors,
+        fragments_values[~cross_bins]
+    ])
+    chrs = df["chr"].to_numpy()
+    pieces_chr = np.concatenate([chrs[cross_bins], chrs[cross_bins], chrs[~cross_bins]])
+    pieces_bins = np.concatenate([start_bins[cross_bins], end_bins[cross_bins], start_bins[~cross_bins]])
+
+    # Row of the template each piece of fragment falls into. Pieces on chromosomes absent from the
+    # coordinates file, or past the length of their chromosome, are dropped (as with the former template merge)
+    pieces_chr_codes = pd.Index(list(chr_sizes.keys())).get_indexer(pieces_chr)
+    pieces_offsets = pieces_bins // bin_size
+    in_template = (pieces_chr_codes >= 0) & (pieces_offsets < nb_bins_per_chr[pieces_chr_codes])
+    template_rows = chr_first_bin[pieces_chr_codes[in_template]] + pieces_offsets[in_template]
+    values = values[in_template]
+
+    # Sum the pieces per template row on the non-zero values only (a profile is mostly zeros) :
+    # the duplicated (row, fragment) entries of the sparse matrix are summed when it is made dense
+    pieces_idx, columns_idx = np.nonzero(values)
+    binned_values = coo_matrix(
+        (values[pieces_idx, columns_idx], (template_rows[pieces_idx], columns_idx)),
+        shape=(len(df_template), len(fragments_columns))
+    ).toarray()
+
+    # Sums are done in float64, the binned profiles are stored in float32 (as read by aggregate)
+    df_binned = pd.concat([
+        df_template,
+        pd.DataFrame(binned_values.astype(np.float32), columns=fragments_columns)
+    ], axis=1)
+
+    df_binned.to_csv(output_path, sep='\t', index=False, chunksize=50_000)
 
 
 def sparse_mat_correction(sparse_mat_path):
     """
     Re-organizes the sparse contacts matrix file
     """
-    contacts = pd.read_csv(sparse_mat_path, sep='\t', header=None)
-    contacts.drop([0], inplace=True)
-    contacts.reset_index(drop=True, inplace=True)
-    contacts.columns = ['frag_a', 'frag_b', 'contacts']
+    # the first line is the header of the sparse matrix (number of fragments and of contacts), skipped at parsing
+    contacts = pd.read_csv(
+        sparse_mat_path, sep='\t', header=None, skiprows=1, names=['frag_a', 'frag_b', 'contacts'], memory_map=True)
 
     return contacts
 
@@ -1536,39 +1637,48 @@ def sparse_with_dsdna_only(
     utils.check_file_extension(oligo_capture_with_frag_path, [".csv", ".tsv"])
 
     oligo_capture_delim = "," if oligo_capture_with_frag_path.endswith(".csv") else "\t"
-    df_sparse_mat = pd.read_csv(sample_sparse_mat, sep='\t', header=None)
     df_oligo = pd.read_csv(oligo_capture_with_frag_path, sep=oligo_capture_delim)
 
-    df_contacts_dsdna_only = df_sparse_mat.copy(deep=True)
-
     ssdna_frag = df_oligo.loc[df_oligo["type"] == "ss", "fragment"].tolist()
     df_ssdna = pd.DataFrame(ssdna_frag, columns=['fragments'])
 
-    dsdna_frag = df_oligo.loc[df_oligo["type"] == "ds", "fragment"].tolist()
-    dsdna_frag_flanking = []
-    for f in dsdna_frag:
-        for i in range(1, n_flanking_dsdna + 1):
-            dsdna_frag_flanking.append(f + i)
-            dsdna_frag_flanking.append(f - i)
-
-    dsdna_frag_all = np.unique(dsdna_frag + dsdna_frag_flanking)
+    dsdna_frag = df_oligo.loc[df_oligo["type"] == "ds", "fragment"].to_numpy()
+    #   each ds fragment shifted by -n, ..., -1, 0, 1, ..., n
+    flanking_offsets = np.arange(-n_flanking_dsdna, n_flanking_dsdna + 1)
+    dsdna_frag_all = np.unique(dsdna_frag[:, None] + flanking_offsets[None, :])
     df_dsdna = pd.DataFrame(dsdna_frag_all, columns=['fragments'])
 
     df_frag = pd.concat([df_ssdna, df_dsdna])
     del df_ssdna, df_dsdna
 
-    df_sparse_mat["index"] = df_sparse_mat.index
-    matches_a = pd.merge(df_sparse_mat, df_frag, left_on=0, right_on='fragments', how='inner', indicator=True)
-    matches_b = pd.merge(df_sparse_mat, df_frag, left_on=1, right_on='fragments', how='inner', indicator=True)
-    index_to_drop = np.unique(np.concatenate((matches_a['index'].to_numpy(), matches_b['index'].to_numpy())))
-
-    df_contacts_dsdna_only.drop(index_to_drop, inplace=True)
-
-    df_contacts_dsdna_only.iloc[0, 0] -= len(df_frag)
-    df_contacts_dsdna_only.iloc[0, 1] -= len(df_frag)
-    df_contacts_dsdna_only.iloc[0, 2] -= len(index_to_drop)
+    #   The sparse matrix is streamed by chunks : the contacts kept are written to a temporary file,
+    #   and the header (updated with the number of contacts dropped) is written before them at the end.
+    #   A single lookup over the stacked (frag_a, frag_b) pairs, instead of one merge per side
+    frags_removed = df_frag['fragments'].to_numpy()
+    with open(sample_sparse_mat) as sparse_file:
+        n_frags_a, n_frags_b, n_contacts = (int(v) for v in sparse_file.readline().split('\t'))
 
-    df_contacts_dsdna_only.to_csv(output_path, sep='\t', index=False, header=False)
+    n_dropped = 0
+    body_path = output_path + ".tmp"
+    try:
+        with open(body_path, 'w') as body_file:
+            for chunk in pd.read_csv(sample_sparse_mat, sep='\t', header=None, skiprows=1,
+                                     chunksize=1_000_000, memory_map=True):
+                frags_ab = chunk[[0, 1]].to_numpy()
+                has_frag_removed = np.isin(frags_ab.ravel(), frags_removed).reshape(frags_ab.shape).any(axis=1)
+                n_dropped += int(has_frag_removed.sum())
+                chunk[~has_frag_removed].to_csv(body_file, sep='\t', index=False, header=False)
+
+        with open(output_path, 'w') as output_file:
+            output_file.write(f"{n_frags_a - len(df_frag)}\t{n_frags_b - len(df_frag)}\t{n_contacts - n_dropped}\n")
+            with open(body_path) as body_file:
+                shutil.copyfileobj(body_file, output_file, 1 << 20)
+    except Exception:
+        #   the temporary file is not left behind on failure
+        if os.path.exists(body_path):
+            os.remove(body_path)
+        raise
+    os.remove(body_path)
 
     logger.info(f"[Sparse Matrix Graal (dsdna)] : dsDNA only contacts saved to {output_path}")
 
@@ -1619,15 +1729,14 @@ def sparse_with_ssdna_only(
     utils.check_file_extension(oligo_capture_with_frag_path, [".csv", ".tsv"])
 
     oligo_capture_delim = "," if oligo_capture_with_frag_path.endswith(".csv") else "\t"
-    df_sparse_mat = pd.read_csv(sample_sparse_mat, sep='\t', header=0)
+    df_sparse_mat = pd.read_csv(sample_sparse_mat, sep='\t', header=0, memory_map=True)
     df_oligo = pd.read_csv(oligo_capture_with_frag_path, sep=oligo_capture_delim)
 
-    df_contacts_ssdna_only = df_sparse_mat.copy(deep=True)
     ssdna_frag = pd.unique(df_oligo.loc[df_oligo["type"] == "ss", "fragment"]).tolist()
 
-    df_contacts_ssdna_only = df_contacts_ssdna_only[
-        df_contacts_ssdna_only.iloc[:, 0].isin(ssdna_frag) &
-        df_contacts_ssdna_only.iloc[:, 1].isin(ssdna_frag)
+    df_contacts_ssdna_only = df_sparse_mat[
+        df_sparse_mat.iloc[:, 0].isin(ssdna_frag) &
+        df_sparse_mat.iloc[:, 1].isin(ssdna_frag)
     ]
 
     df_contacts_ssdna_only.columns = [len(ssdna_frag), len(ssdna_frag), len(df_contacts_ssdna_only)+1]
@@ -1657,26 +1766,45 @@ def starts_match(fragments: pd.DataFrame, oligo: pd.DataFrame) -> pd.DataFrame:
     pd.DataFrame
         The updated oligo DataFrame.
     """
-    l_starts = []
-    for i in range(len(oligo)):
-        oligo_chr = oligo['chr'][i]
-        middle = int((oligo['end'][i] - oligo['start'][i] - 1) / 2 + oligo['start'][i] - 1)
+    oligo_starts = oligo['start'].to_numpy(dtype=np.int64)
+    oligo_ends = oligo['end'].to_numpy(dtype=np.int64)
+    middles = (oligo_ends - oligo_starts - 1) // 2 + oligo_starts - 1
+    oligo_chrs = oligo['chr'].to_numpy()
+
+    new_starts = np.full(len(oligo), -1, dtype=np.int64)
+    all_frag_starts = fragments['start'].to_numpy(dtype=np.int64)
+    all_frag_ends = fragments['end'].to_numpy(dtype=np.int64)
+    fragments_per_chr = fragments.groupby('chr', sort=False).indices
+    for oligo_chr in pd.unique(oligo_chrs):
+        is_chr = oligo_chrs == oligo_chr
+        frag_rows = fragments_per_chr.get(oligo_chr)
+        if frag_rows is None:
+            continue
+        chr_middles = middles[is_chr]
         if oligo_chr == 'chr_artificial':
-            for k in reversed(range(len(fragments))):
-                interval = range(fragments['start'][k], fragments['end'][k])
-                fragments_chr = fragments['chr'][k]
-                if middle in interval and fragments_chr == oligo_chr:
-                    l_starts.append(fragments['start'][k])
-                    break
+            # last fragment of the list such as start <= middle < end, evaluated for all the oligos at once
+            # on a (oligos x fragments) mask : the artificial chromosome only holds a few fragments
+            frag_starts = all_frag_starts[frag_rows]
+            frag_ends = all_frag_ends[frag_rows]
+            contains = (frag_starts <= chr_middles[:, None]) & (chr_middles[:, None] < frag_ends)
+            idx_ok = len(frag_rows) - 1 - np.argmax(contains[:, ::-1], axis=1)
+            found = contains.any(axis=1)
         else:
-            for k in range(len(fragments)):
-                interval = range(fragments['start'][k], fragments['end'][k] + 1)
-                fragments_chr = fragments['chr'][k]
-
-                if middle in interval and fragments_chr == oligo_chr:
-                    l_starts.append(fragments['start'][k])
-                    break
-    oligo['start'] = list(l_starts)
+            frag_rows = frag_rows[np.argsort(all_frag_starts[frag_rows], kind='stable')]
+            frag_starts = all_frag_starts[frag_rows]
+            frag_ends = all_frag_ends[frag_rows]
+            # first fragment such as start <= middle <= end
+            idx = np.searchsorted(frag_ends, chr_middles, side='left')
+            idx_ok = np.clip(idx, 0, len(frag_rows) - 1)
+            found = (idx < len(frag_rows)) & (frag_starts[idx_ok] <= chr_middles)
+        new_starts[is_chr] = np.where(found, frag_starts[idx_ok], -1)
+
+    if np.any(new_starts < 0):
+        missing = oligo.loc[new_starts < 0, 'name'].tolist()
+        logger.error(f"Oligos not contained in any fragment : {missing}")
+        raise ValueError(f"Oligos not contained in any fragment : {missing}")
+
+    oligo['start'] = new_starts
     return oligo
 
 
@@ -1,6 +1,13 @@
 import os
+import time
+import cProfile
+import hashlib
 from os.path import join
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 
 import sshicstuff.methods as sshic
 import sshicstuff.utils as shcu
@@ -11,6 +18,13 @@ logger = log.logger
 SEED = 1999
 CWD = os.getcwd()
 
+# Names of the steps run by full_pipeline, the ones accepted by --invalidate
+PIPELINE_STEPS = tuple(func.__name__ for func in (
+    sshic.associate_oligo_to_frag, sshic.sparse_with_dsdna_only, sshic.sparse_with_ssdna_only,
+    sshic.filter_contacts, sshic.coverage, sshic.profile_contacts, sshic.get_stats, sshic.rebin_profile,
+    sshic.aggregate
+))
+
 """
 Example of usage :
 
@@ -30,9 +44,181 @@ sshicstuff pipeline
 --window-size-cen 150000
 --window-size-telo 15000
 --copy-inputs
+-j 4
 """
 
 
+def input_files(kwargs: dict) -> list[str]:
+    """
+    Input files of a pipeline step, i.e., the existing files passed as parameters (outputs excluded).
+    """
+    return [
+        value for name, value in sorted(kwargs.items())
+        if name not in ("output_path", "output_dir") and isinstance(value, str) and os.path.isfile(value)
+    ]
+
+
+def stage_key(func, kwargs: dict) -> str:
+    """
+    Key of a pipeline step, made of the name of the method, its parameters,
+    and the modification time and size of its input files.
+    The force flag is left out, it does not change the outputs of the step.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for name, value in sorted(kwargs.items()):
+        if name == "force":
+            continue
+        digest.update(f"{name}={value!r};".encode())
+    for file_path in input_files(kwargs):
+        stat = os.stat(file_path)
+        digest.update(f"{stat.st_mtime_ns}:{stat.st_size};".encode())
+    return f"{func.__name__}-{digest.hexdigest()}"
+
+
+def task_record(cache_dir: str, func, outputs: list[str]) -> str:
+    """
+    Path of the record of a pipeline step in the cache, named after its method and its first output.
+    It holds the key of the last run of the step, so that a step with a new key is told apart
+    from a step that was never recorded.
+    """
+    digest = hashlib.blake2b(outputs[0].encode(), digest_size=8).hexdigest()
+    return join(cache_dir, f"{func.__name__}-{digest}")
+
+
+def recorded_key(record: str) -> str | None:
+    """
+    Key of the last run of a pipeline step, None if the step was never recorded.
+    """
+    if not os.path.exists(record):
+        return None
+    with open(record) as f:
+        return f.readline().strip()
+
+
+def record_key(record: str, key: str, kwargs: dict, outputs: list[str]):
+    """
+    Record the key of a pipeline step that ran, only if it actually produced its outputs.
+    """
+    if not all(os.path.exists(o) for o in outputs):
+        logger.warning(f"[Cache] : {key} not recorded, {outputs[0]} was not written")
+        return
+    os.makedirs(os.path.dirname(record), exist_ok=True)
+    with open(record, "w") as f:
+        f.write(key + "\n" + repr(kwargs) + "\n")
+
+
+def is_stale(kwargs: dict, outputs: list[str]) -> bool:
+    """
+    A pipeline step is stale if one of its outputs is missing or older than one of its input files.
+    """
+    if not all(os.path.exists(o) for o in outputs):
+        return True
+    inputs = input_files(kwargs)
+    if not inputs:
+        return False
+    return max(os.path.getmtime(i) for i in inputs) > min(os.path.getmtime(o) for o in outputs)
+
+
+def skip_reason(key: str, record: str, kwargs: dict, outputs: list[str]) -> str | None:
+    """
+    Why a pipeline step does not need to run, None if it must run:
+    its last run recorded the same key and its outputs still exist, or it was never recorded
+    and its outputs are newer than its inputs (see is_stale).
+    """
+    last_key = recorded_key(record)
+    if last_key == key and all(os.path.exists(o) for o in outputs):
+        return "is up to date"
+    if last_key is None and not is_stale(kwargs, outputs):
+        return "is newer than its inputs"
+    return None
+
+
+@contextmanager
+def stage(name: str, output_dir: str = None):
+    """
+    Log the wall and CPU time of a stage of the pipeline.
+    With the SSHIC_PROFILE environment variable set, the stage is also profiled with cProfile
+    and the stats are dumped in <output_dir>/.profiles/<name>.prof (main process only, not the workers).
+    """
+    profiler = None
+    if os.environ.get("SSHIC_PROFILE"):
+        profiler = cProfile.Profile()
+        profiler.enable()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        logger.info(f"[Timing] : {name} done in {wall:.1f}s (cpu {cpu:.1f}s)")
+        if profiler is not None:
+            profiler.disable()
+            profiles_dir = join(output_dir or CWD, ".profiles")
+            os.makedirs(profiles_dir, exist_ok=True)
+            profiler.dump_stats(join(profiles_dir, name.lower().replace(" ", "_") + ".prof"))
+
+
+def run_tasks(
+        tasks: list[tuple],
+        executor: ProcessPoolExecutor = None,
+        cache_dir: str = None,
+        invalidate: list[str] = None,
+        force: bool = False
+):
+    """
+    Run a list of independent tasks, i.e., (function, kwargs, outputs) tuples that do not depend on each other's outputs.
+    With an executor the tasks are dispatched on its pool of processes, otherwise they are run one after the other.
+    Exceptions raised by a task are re-raised in the caller.
+
+    With a cache_dir, a task is skipped when it does not need to run (see skip_reason), and its key is recorded.
+    A recorded task whose key changed (parameters or inputs) is always run, whatever the modification times.
+    Tasks whose method name is in invalidate are always run, and with force all the tasks are run.
+    A task that is run with a cache_dir or with force is called with force=True (when the method takes it),
+    so that its out-of-date outputs are overwritten instead of being kept by the existence check of the method.
+    The key of a task is only recorded once the task succeeded and wrote its outputs.
+    """
+    invalidate = set(invalidate or [])
+    pending = []
+    done = []
+    for func, kwargs, outputs in tasks:
+        key = record = None
+        if cache_dir:
+            key = stage_key(func, kwargs)
+            record = task_record(cache_dir, func, outputs)
+            reason = None
+            if not force and func.__name__ not in invalidate:
+                reason = skip_reason(key, record, kwargs, outputs)
+            if reason:
+                logger.info(f"[Cache] : {func.__name__} skipped, {outputs[0]} {reason}")
+                done.append((kwargs, outputs, key, record))
+                continue
+        if (cache_dir or force) and "force" in kwargs:
+            kwargs = dict(kwargs, force=True)
+        pending.append((func, kwargs, outputs, key, record))
+
+    if executor is None or len(pending) <= 1:
+        for func, kwargs, outputs, key, record in pending:
+            func(**kwargs)
+            if record:
+                record_key(record, key, kwargs, outputs)
+    else:
+        #   every task is waited for, the keys of the ones that succeeded are recorded before raising
+        futures = [executor.submit(func, **kwargs) for func, kwargs, *_ in pending]
+        errors = []
+        for (func, kwargs, outputs, key, record), future in zip(pending, futures):
+            error = future.exception()
+            if error is not None:
+                errors.append(error)
+            elif record:
+                record_key(record, key, kwargs, outputs)
+        if errors:
+            raise errors[0]
+
+    for kwargs, outputs, key, record in done:
+        record_key(record, key, kwargs, outputs)
+
+
 def full_pipeline(
         sample_sparse_mat: str,
         oligo_capture: str,
@@ -40,7 +226,7 @@ def full_pipeline(
         chr_coordinates: str,
         output_dir: str = None,
         additional_groups: str = None,
-        bin_sizes: list[int] = None,
+        bin_sizes: np.ndarray | list[int] = None,
         cen_agg_window_size: int = 15000,
         cen_aggregated_binning: int = 10000,
         telo_agg_window_size: int = 15000,
@@ -53,8 +239,21 @@ def full_pipeline(
         copy_inputs: bool = True,
         force: bool = False,
         normalize: bool = False,
+        n_jobs: int = 1,
+        use_cache: bool = True,
+        invalidate: list[str] = None
 ):
 
+    # A mistyped step name would leave its stale outputs silently skipped
+    unknown_steps = [name for name in invalidate or [] if name not in PIPELINE_STEPS]
+    if unknown_steps:
+        logger.error(f"[Pipeline] : Unknown step(s) to invalidate: {', '.join(unknown_steps)}")
+        logger.error(f"[Pipeline] : Valid steps are: {', '.join(PIPELINE_STEPS)}")
+        raise ValueError(f"Unknown step(s) to invalidate: {', '.join(unknown_steps)}")
+
+    # Bin sizes as a typed integer array, whatever the caller passed (list of int or str, array, None)
+    bin_sizes = np.fromiter(() if bin_sizes is None else bin_sizes, dtype=np.int64)
+
     # Files and path alias names
     sample_name = os.path.basename(sample_sparse_mat).split('.')[0]
     input_basedir = os.path.dirname(sample_sparse_mat)
@@ -62,6 +261,8 @@ def full_pipeline(
         output_dir = join(input_basedir, sample_name)
 
     copy_dir = join(output_dir, "inputs")
+    cache_dir = join(output_dir, ".cache") if use_cache else None
+
     dsdnaonly_name = sample_name + "_dsdna_only.txt"
     ssdnaonly_name = sample_name + "_ssdna_only.txt"
     filtered_name = sample_name + "_filtered.tsv"
@@ -86,161 +287,169 @@ def full_pipeline(
         if additional_groups:
             shcu.copy(additional_groups, copy_dir)
 
-    sshic.associate_oligo_to_frag(
-        oligo_capture_path=oligo_capture,
-        fragments_path=fragments_list,
-        force=force,
-    )
-    if copy_inputs:
-        shcu.copy(oligo_capture_with_frag, copy_dir)
-
-    """
-    dsDNA reads only
-    """
-    dsdna_dir = join(output_dir, "dsdnaonly")
-    os.makedirs(dsdna_dir, exist_ok=True)
-    logger.info("[Sparse Matrix Graal (dsdna)] : creating a new sparse matrix with only dsDNA reads")
-    sshic.sparse_with_dsdna_only(
-        sample_sparse_mat=sample_sparse_mat,
-        oligo_capture_with_frag_path=oligo_capture_with_frag,
-        n_flanking_dsdna=n_flanking_dsdna,
-        output_path=join(dsdna_dir, dsdnaonly_name),
-        force=force
-    )
-
-    logger.info("[Coverage] : Calculate the coverage for dsDNA reads only")
-    for bn in bin_sizes:
-        sshic.coverage(
-            sparse_mat_path=join(dsdna_dir, dsdnaonly_name),
-            fragments_list_path=fragments_list,
-            normalize=normalize,
-            output_dir=dsdna_dir,
-            force=force,
-            bin_size=bn
-        )
-
-    """
-    ssDNA reads only
-    """
-    ssdna_dir = join(output_dir, "ssdnaonly")
-    os.makedirs(ssdna_dir, exist_ok=True)
-    logger.info("[Sparse Matrix Graal (ssdna)] : creating a new sparse matrix with only ssDNA reads")
-    sshic.sparse_with_ssdna_only(
-        sample_sparse_mat=sample_sparse_mat,
-        oligo_capture_with_frag_path=oligo_capture_with_frag,
-        output_path=join(ssdna_dir, ssdnaonly_name),
-        force=force
-    )
-
-    logger.info("[Coverage] : Calculate the coverage per ssDNA fragment and save the result to a bedgraph")
-    for bn in bin_sizes:
-        sshic.coverage(
-            sparse_mat_path=join(ssdna_dir, ssdnaonly_name),
-            fragments_list_path=fragments_list,
+    # One pool of processes for all the groups of independent steps, n_jobs <= 0 uses all the cores.
+    # The fragments list, read by most of the steps, is parsed once in each process at start.
+    # The pool is shut down when the steps are done, or as soon as one of them fails.
+    n_workers = n_jobs if n_jobs > 0 else os.cpu_count()
+    pool = nullcontext()
+    if n_workers > 1:
+        pool = ProcessPoolExecutor(
+            max_workers=n_workers, initializer=shcu.read_fragments_list, initargs=(fragments_list,))
+
+    with pool as executor:
+        with stage("Associate", output_dir):
+            run_tasks([
+                (sshic.associate_oligo_to_frag, dict(
+                    oligo_capture_path=oligo_capture,
+                    fragments_path=fragments_list,
+                    force=force,
+                ), [oligo_capture_with_frag]),
+            ], executor, cache_dir, invalidate, force)
+        if copy_inputs:
+            shcu.copy(oligo_capture_with_frag, copy_dir)
+
+        dsdna_dir = join(output_dir, "dsdnaonly")
+        ssdna_dir = join(output_dir, "ssdnaonly")
+        os.makedirs(dsdna_dir, exist_ok=True)
+        os.makedirs(ssdna_dir, exist_ok=True)
+
+        """
+        Sparse matrices with dsDNA reads only, ssDNA reads only, and filtered contacts (all reads).
+        These steps only depend on the inputs and on the fragments associated to the oligos.
+        """
+        logger.info("[Sparse Matrix Graal (dsdna)] : creating a new sparse matrix with only dsDNA reads")
+        logger.info("[Sparse Matrix Graal (ssdna)] : creating a new sparse matrix with only ssDNA reads")
+        logger.info("[Filter] : Only keep pairs of reads that contain at least one oligo/probe")
+        logger.info("[Coverage] : Calculate the coverage per fragment and save the result to a bedgraph")
+        with stage("Sparse matrices", output_dir):
+            run_tasks([
+                (sshic.sparse_with_dsdna_only, dict(
+                    sample_sparse_mat=sample_sparse_mat,
+                    oligo_capture_with_frag_path=oligo_capture_with_frag,
+                    n_flanking_dsdna=n_flanking_dsdna,
+                    output_path=join(dsdna_dir, dsdnaonly_name),
+                    force=force
+                ), [join(dsdna_dir, dsdnaonly_name)]),
+                (sshic.sparse_with_ssdna_only, dict(
+                    sample_sparse_mat=sample_sparse_mat,
+                    oligo_capture_with_frag_path=oligo_capture_with_frag,
+                    output_path=join(ssdna_dir, ssdnaonly_name),
+                    force=force
+                ), [join(ssdna_dir, ssdnaonly_name)]),
+                (sshic.filter_contacts, dict(
+                    sparse_mat_path=sample_sparse_mat,
+                    oligo_capture_path=oligo_capture,
+                    fragments_list_path=fragments_list,
+                    output_path=join(output_dir, filtered_name),
+                    force=force
+                ), [join(output_dir, filtered_name)]),
+                (sshic.coverage, dict(
+                    sparse_mat_path=sample_sparse_mat,
+                    fragments_list_path=fragments_list,
+                    normalize=normalize,
+                    output_dir=output_dir,
+                    force=force
+                ), [join(output_dir, sample_name + "_contacts_coverage.bedgraph")]),
+            ], executor, cache_dir, invalidate, force)
+
+        """
+        Binned coverages of the dsDNA and ssDNA reads, and 4C-like profile of the filtered contacts
+        """
+        logger.info("[Coverage] : Calculate the coverage for dsDNA reads only")
+        logger.info("[Coverage] : Calculate the coverage per ssDNA fragment and save the result to a bedgraph")
+        logger.info("[Profile] : Generate a 4C-like profile for each ssDNA oligo")
+        logger.info("[Profile] : Basal résolution : 0 kb (max resolution)")
+        coverage_tasks = [
+            (sshic.coverage, dict(
+                sparse_mat_path=join(reads_dir, reads_name),
+                fragments_list_path=fragments_list,
+                normalize=normalize,
+                output_dir=reads_dir,
+                force=force,
+                bin_size=bn
+            ), [join(reads_dir, reads_name.split('.')[0] + f"_contacts_coverage_{bn // 1000}kb.bedgraph")])
+            for reads_dir, reads_name in ((dsdna_dir, dsdnaonly_name), (ssdna_dir, ssdnaonly_name))
+            for bn in bin_sizes
+        ]
+        profile_task = (sshic.profile_contacts, dict(
+            filtered_table_path=join(output_dir, filtered_name),
+            oligo_capture_with_frag_path=oligo_capture_with_frag,
+            chromosomes_coord_path=chr_coordinates,
             normalize=normalize,
-            output_dir=ssdna_dir,
             force=force,
-            bin_size=bn
-        )
-
-    """
-    All reads
-    """
-    logger.info("[Filter] : Only keep pairs of reads that contain at least one oligo/probe")
-    sshic.filter_contacts(
-        sparse_mat_path=sample_sparse_mat,
-        oligo_capture_path=oligo_capture,
-        fragments_list_path=fragments_list,
-        output_path=join(output_dir, filtered_name),
-        force=force
-    )
-
-    logger.info("[Coverage] : Calculate the coverage per fragment and save the result to a bedgraph")
-    sshic.coverage(
-        sparse_mat_path=sample_sparse_mat,
-        fragments_list_path=fragments_list,
-        normalize=normalize,
-        output_dir=output_dir,
-        force=force
-    )
-
-    logger.info("[Profile] : Generate a 4C-like profile for each ssDNA oligo")
-    logger.info("[Profile] : Basal résolution : 0 kb (max resolution)")
-    sshic.profile_contacts(
-        filtered_table_path=join(output_dir, filtered_name),
-        oligo_capture_with_frag_path=oligo_capture_with_frag,
-        chromosomes_coord_path=chr_coordinates,
-        normalize=normalize,
-        force=force,
-        additional_groups_path=additional_groups
-    )
-
-    logger.info("[Stats] : Make basic statistics on the contacts (inter/intra chr, cis/trans, ssdna/dsdna etc ...)")
-    sshic.get_stats(
-        contacts_unbinned_path=join(output_dir, profile_0kb_contacts_name),
-        sparse_mat_path=sample_sparse_mat,
-        chr_coord_path=chr_coordinates,
-        oligo_capture_with_frag_path=oligo_capture_with_frag,
-        output_dir=output_dir,
-        cis_range=cis_region_size
-    )
-
-    logger.info(f"[Rebin] : Change bin resolution of the 4-C like profile (unbinned -> binned)")
-    for bn in bin_sizes:
-        bin_suffix = str(bn // 1000) + "kb"
-        logger.info(f"[Rebin] : {bin_suffix}")
-
-        sshic.rebin_profile(
+            additional_groups_path=additional_groups
+        ), [join(output_dir, name)
+            for name in (profile_0kb_contacts_name, profile_0kb_frequencies_name)[:1 + normalize]])
+        with stage("Coverage and profile", output_dir):
+            run_tasks(coverage_tasks + [profile_task], executor, cache_dir, invalidate, force)
+
+        """
+        Statistics and rebinning of the 0kb profiles
+        """
+        logger.info("[Stats] : Make basic statistics on the contacts (inter/intra chr, cis/trans, ssdna/dsdna etc ...)")
+        logger.info(f"[Rebin] : Change bin resolution of the 4-C like profile (unbinned -> binned)")
+        stats_task = (sshic.get_stats, dict(
             contacts_unbinned_path=join(output_dir, profile_0kb_contacts_name),
-            chromosomes_coord_path=chr_coordinates,
-            bin_size=bn,
+            sparse_mat_path=sample_sparse_mat,
+            chr_coord_path=chr_coordinates,
+            oligo_capture_with_frag_path=oligo_capture_with_frag,
+            output_dir=output_dir,
+            cis_range=cis_region_size,
             force=force
-        )
+        ), [join(output_dir, f"{sample_name}_{s}.tsv") for s in ("statistics", "norm_chr_freq", "norm_inter_chr_freq")])
+        rebin_tasks = [
+            (sshic.rebin_profile, dict(
+                contacts_unbinned_path=join(output_dir, profile_name),
+                chromosomes_coord_path=chr_coordinates,
+                bin_size=bn,
+                force=force
+            ), [join(output_dir, profile_name.replace("_0kb_profile_", f"_{bn // 1000}kb_profile_"))])
+            for bn in bin_sizes
+            for profile_name in (profile_0kb_contacts_name, profile_0kb_frequencies_name)
+        ]
+        with stage("Stats and rebin", output_dir):
+            run_tasks([stats_task] + rebin_tasks, executor, cache_dir, invalidate, force)
 
-        sshic.rebin_profile(
-            contacts_unbinned_path=join(output_dir, profile_0kb_frequencies_name),
-            chromosomes_coord_path=chr_coordinates,
-            bin_size=bn,
-            force=force
-        )
-
-    logger.info("[Aggregate] : Aggregate all 4C-like profiles on centromeric regions")
-
-    binsize_for_cen = cen_aggregated_binning
-    correct_profile = profile_0kb_frequencies_name.replace(
-        "_0kb_profile_", f"_{binsize_for_cen // 1000}kb_profile_"
-    )
-
-    sshic.aggregate(
-        binned_contacts_path=join(output_dir, correct_profile),
-        chr_coord_path=chr_coordinates,
-        oligo_capture_with_frag_path=oligo_capture_with_frag,
-        window_size=cen_agg_window_size,
-        centromeres=True,
-        output_dir=output_dir,
-        excluded_chr_list=excluded_chr,
-        inter_only=inter_chr_only,
-        normalize=normalize
-    )
-
-    logger.info("[Aggregate] : Aggregate all 4C-like profiles on telomeric regions")
-    binsize_for_telo = telo_agg_binning
-    correct_profile = profile_0kb_frequencies_name.replace(
-        "_0kb_profile_", f"_{binsize_for_telo // 1000}kb_profile_"
-    )
-
-    sshic.aggregate(
-        binned_contacts_path=join(output_dir, correct_profile),
-        chr_coord_path=chr_coordinates,
-        oligo_capture_with_frag_path=oligo_capture_with_frag,
-        window_size=telo_agg_window_size,
-        telomeres=True,
-        output_dir=output_dir,
-        excluded_chr_list=excluded_chr,
-        inter_only=inter_chr_only,
-        normalize=normalize,
-        arm_length_classification=arm_length_classification
-    )
+        """
+        Aggregated profiles on centromeric and telomeric regions
+        """
+        logger.info("[Aggregate] : Aggregate all 4C-like profiles on centromeric regions")
+        logger.info("[Aggregate] : Aggregate all 4C-like profiles on telomeric regions")
+        binsize_for_cen = cen_aggregated_binning
+        binsize_for_telo = telo_agg_binning
+        # Prefix of the aggregated tables, as named by sshic.aggregate
+        agg_prefix = sample_name.split("_")[0] + "_agg_on_{0}"
+        agg_prefix += ("_inter" if inter_chr_only else "") + ("_norm" if normalize else "")
+        with stage("Aggregate", output_dir):
+            run_tasks([
+                (sshic.aggregate, dict(
+                    binned_contacts_path=join(output_dir, profile_0kb_frequencies_name.replace(
+                        "_0kb_profile_", f"_{binsize_for_cen // 1000}kb_profile_")),
+                    chr_coord_path=chr_coordinates,
+                    oligo_capture_with_frag_path=oligo_capture_with_frag,
+                    window_size=cen_agg_window_size,
+                    centromeres=True,
+                    output_dir=output_dir,
+                    excluded_chr_list=excluded_chr,
+                    inter_only=inter_chr_only,
+                    normalize=normalize,
+                    bin_size=binsize_for_cen
+                ), [join(output_dir, "aggregated", "centromeres", agg_prefix.format("cen") + "_mean.tsv")]),
+                (sshic.aggregate, dict(
+                    binned_contacts_path=join(output_dir, profile_0kb_frequencies_name.replace(
+                        "_0kb_profile_", f"_{binsize_for_telo // 1000}kb_profile_")),
+                    chr_coord_path=chr_coordinates,
+                    oligo_capture_with_frag_path=oligo_capture_with_frag,
+                    window_size=telo_agg_window_size,
+                    telomeres=True,
+                    output_dir=output_dir,
+                    excluded_chr_list=excluded_chr,
+                    inter_only=inter_chr_only,
+                    normalize=normalize,
+                    arm_length_classification=arm_length_classification,
+                    bin_size=binsize_for_telo
+                ), [join(output_dir, "aggregated", "telomeres", agg_prefix.format("telo") + "_mean.tsv")]),
+            ], executor, cache_dir, invalidate, force)
 
     now = datetime.now()
     now_string = now.strftime("%Y-%m-%d %H:%M:%S")
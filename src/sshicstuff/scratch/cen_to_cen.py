@@ -11,7 +11,7 @@ if __name__ == "__main__":
     data_dir = '../data/'
     samples_dir = data_dir + 'inputs/HiC_WT_2h_4h/samples/'
     fragments_dir = data_dir + 'inputs/HiC_WT_2h_4h/'
-    samples = sorted(os.listdir(samples_dir))
+    samples = sorted(entry.name for entry in os.scandir(samples_dir) if entry.is_file())
 
     output_dir = '../../data/outputs/hic/' + 'cen2cen/'
     if not os.path.exists(output_dir):
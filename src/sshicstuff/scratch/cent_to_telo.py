@@ -15,7 +15,7 @@ if __name__ == "__main__":
     samples_dir = data_dir + 'inputs/HiC_WT_2h_4h/samples/'
     fragments_dir = data_dir + 'inputs/HiC_WT_2h_4h/'
     chr_arm = data_dir + "inputs/S288c_chr_arm_sorted_by_length.csv"
-    samples = sorted(os.listdir(samples_dir))
+    samples = sorted(entry.name for entry in os.scandir(samples_dir) if entry.is_file())
 
     output_dir = '../../data/outputs/hic/' + 'cen2telo/'
     if not os.path.exists(output_dir):
@@ -93,9 +93,7 @@ def merge(
         wt_res: dict,
         output_dir: str
 ):
-    df_merged = pd.DataFrame()
-    for k, v in wt_res.items():
-        df_merged = pd.concat((df_merged, v))
+    df_merged = pd.concat(list(wt_res.values()))
     df_merged = df_merged.groupby(level=0).mean(numeric_only=True)
     df_merged.to_csv(
         output_dir + "average_enrichment_cohesins_peaks_intervals_" + '-'.join(list(wt_res.keys())) + '.tsv', sep='\t')
@@ -120,16 +118,16 @@ if __name__ == "__main__":
     df_cohesins_peaks = tools.sort_by_chr(df_cohesins_peaks, col1='chr', col2='start')
 
     df_cohesins_peaks.drop(['uid', 'score'], axis=1, inplace=True)
-    df_inter_peaks_10kb = pd.DataFrame()
-
+    inter_peaks_10kb = []
     for chrom in pd.unique(df_cohesins_peaks['chr']):
         df = df_cohesins_peaks.loc[df_cohesins_peaks['chr'] == chrom]
         df['end'] = df['start'].shift(-1) - 1
         df = df.iloc[:-1, :]
         df['size'] = df['end'] - df['start'] + 1
         df_filtered = df.loc[df['size'] >= 10000]
-        df_inter_peaks_10kb = pd.concat((df_inter_peaks_10kb, df_filtered))
+        inter_peaks_10kb.append(df_filtered)
 
+    df_inter_peaks_10kb = pd.concat(inter_peaks_10kb)
     df_inter_peaks_10kb.index = range(len(df_inter_peaks_10kb))
     df_inter_peaks_10kb[['start', 'end', 'size']] = df_inter_peaks_10kb[['start', 'end', 'size']].astype('int64')
 
@@ -158,7 +156,8 @@ if __name__ == "__main__":
     for sshic_dir in sshic_pcrdupt_dir:
         print(sshic_dir)
         not_binned_dir = binning_dir + sshic_dir + '0kb/'
-        samples = [f for f in sorted(os.listdir(not_binned_dir)) if 'frequencies' in f]
+        samples = sorted(
+            entry.name for entry in os.scandir(not_binned_dir) if entry.is_file() and 'frequencies' in entry.name)
 
         if not os.path.exists(cohesins_dir+sshic_dir):
             os.makedirs(cohesins_dir+sshic_dir)
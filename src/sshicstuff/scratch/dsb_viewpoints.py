@@ -14,7 +14,7 @@ if __name__ == "__main__":
     data_dir = '../data/'
     samples_dir = data_dir + 'inputs/HiC_WT_2h_4h/samples/'
     fragments_dir = data_dir + 'inputs/HiC_WT_2h_4h/'
-    samples = sorted(os.listdir(samples_dir))
+    samples = sorted(entry.name for entry in os.scandir(samples_dir) if entry.is_file())
 
     #   position on both end of the breaks, 6 bins of 1000 bp
     chr5_dsb_left_bins = [105000, 106000, 107000, 108000, 109000, 110000]
@@ -3,46 +3,82 @@ import os.path
 
 import numpy as np
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 from typing import Optional
 from scipy import stats
 import re
 
 
-def plot_size_distribution(
-        df: pd.DataFrame,
+def plot_size_distribution_grid(
+        dfs: dict[str, pd.DataFrame],
         output_path: str,
-        mode: str = 'all',
         bin_count: Optional[int] = None
 ):
+    """
+    Plot side by side, in a single figure, the size distributions (histogram + KDE) of each table of dfs.
+    Keys of dfs are the modes 'inside', 'outside' (fragments sizes in / out of NFR) or 'all' (NFR sizes).
+    """
+
+    fig, axes = plt.subplots(1, len(dfs), figsize=(10 * len(dfs), 10), dpi=200, squeeze=False)
+    for ax, (mode, df) in zip(axes[0], dfs.items()):
+        x = df['size'].values
+
+        n_bins = bin_count
+        if n_bins is None:
+            #   Freedman-Diaconis rule for optimal binning
+            q1 = np.quantile(x, 0.25)
+            q3 = np.quantile(x, 0.75)
+            iqr = q3 - q1
+            bin_width = (2 * iqr) / (len(x) ** (1 / 3))
+            n_bins = int(np.ceil((x.max() - x.min()) / bin_width))
 
-    x = df['size'].values
-
-    if bin_count is None:
-        #   Freedman-Diaconis rule for optimal binning
-        q1 = np.quantile(x, 0.25)
-        q3 = np.quantile(x, 0.75)
-        iqr = q3 - q1
-        bin_width = (2 * iqr) / (len(x) ** (1 / 3))
-        bin_count = int(np.ceil((x.max() - x.min()) / bin_width))
-
-    xx = np.linspace(min(x), max(x), 10000)
-    kde = stats.gaussian_kde(x)
-    fig, ax = plt.subplots(figsize=(16, 14), dpi=300)
-    ax.hist(x, density=True, bins=bin_count, alpha=0.3, linewidth=1.2, edgecolor='black')
-    ax.plot(xx, kde(xx))
-    plt.ylabel('Numbers')
-
-    if mode == 'all':
-        plt.xlabel('Sizes of NFR')
-        plt.title("Distribution of NFR sizes")
-        plt.savefig(output_path + 'nfr_sizes_distribution.jpg', dpi=300)
-    else:
-        plt.xlabel('Sizes of fragments')
-        plt.title("Distribution of fragments sizes {0} NFR".format(mode))
-        plt.savefig(output_path + 'fragments_sizes_{0}_nfr_distribution.jpg'.format(mode), dpi=300)
-    # plt.show()
-    plt.close()
+        #   KDE costs O(n_points x n_grid): fit it on a subsample of at most 20k sizes
+        #   and evaluate it on a 512 points grid, indistinguishable at this figure size
+        x_fit = x
+        if len(x) > 20000:
+            x_fit = np.random.default_rng(0).choice(x, 20000, replace=False)
+        xx = np.linspace(min(x), max(x), 512)
+        kde = stats.gaussian_kde(x_fit, bw_method='scott')
+        ax.hist(x, density=True, bins=n_bins, alpha=0.3, linewidth=1.2, edgecolor='black')
+        ax.plot(xx, kde(xx))
+        ax.set_ylabel('Numbers')
+
+        if mode == 'all':
+            ax.set_xlabel('Sizes of NFR')
+            ax.set_title("Distribution of NFR sizes")
+        else:
+            ax.set_xlabel('Sizes of fragments')
+            ax.set_title("Distribution of fragments sizes {0} NFR".format(mode))
+
+    fig.savefig(output_path + 'sizes_distributions_nfr.jpg')
+    plt.close(fig)
+
+
+def intervals_contain(
+        starts: np.ndarray,
+        ends: np.ndarray,
+        left_pos: np.ndarray,
+        right_pos: np.ndarray,
+        inclusive: bool = False
+) -> np.ndarray:
+    """
+    For each query, tell whether at least one interval (starts[i], ends[i]) contains [left_pos, right_pos].
+    Intervals may overlap and don't need to be sorted.
+    The intervals are sorted by start, the last one starting before left_pos is found by binary search,
+    and the running max of the ends tells if any of them goes beyond right_pos.
+    Works in O((n_intervals + n_queries) log n_intervals) on plain int arrays.
+    """
+    order = np.argsort(starts, kind='stable')
+    sorted_starts = np.ascontiguousarray(starts[order])
+    max_ends = np.maximum.accumulate(ends[order])
+    last = np.searchsorted(sorted_starts, left_pos, side='right' if inclusive else 'left') - 1
+    has_interval = last >= 0
+    max_ends = max_ends[np.maximum(last, 0)]
+    if inclusive:
+        return has_interval & (max_ends >= right_pos)
+    return has_interval & (max_ends > right_pos)
 
 
 def preprocess(
@@ -74,59 +110,66 @@ def preprocess(
             the absolute path toward the output directory to save the results
     """
 
-    df_fragments = pd.read_csv(fragments_list_path, sep='\t')
+    df_fragments = pd.read_csv(
+        fragments_list_path, sep='\t', dtype={'chrom': 'category', 'start_pos': 'int64', 'end_pos': 'int64', 'size': 'int64'})
     df_fragments.insert(0, 'uid', df_fragments.index)
-    df_nucleosomes = pd.read_csv(nucleosomes_path, sep='\t')
+    df_nucleosomes = pd.read_csv(nucleosomes_path, sep='\t', dtype={'chrom': str, 'start': 'int64', 'end': 'int64'})
     df_nucleosomes.drop_duplicates(keep='first', inplace=True)
     df_nucleosomes.index = range(len(df_nucleosomes))
     excluded_chr = ['2_micron', 'mitochondrion', 'chr_artificial']
     df_fragments = df_fragments[~df_fragments['chrom'].isin(excluded_chr)]
 
-    df_merged = pd.merge(df_fragments, df_nucleosomes, on='chrom')
-    df_merged_in_nfr = pd.DataFrame()
+    #   Positions of the fragment that must lie within a nfr, depending on the filter mode :
+    #   left_pos must be after the nfr start, right_pos must be before the nfr end.
+    #   Positions and nfr bounds are compared in a coordinate space scaled by 'scale'
+    inclusive = False
+    scale = 1
     match fragments_nfr_filter:
         case 'start_only':
-            df_merged_in_nfr = df_merged[
-                (df_merged.start_pos > df_merged.start) & (df_merged.start_pos < df_merged.end)]
+            left_pos, right_pos = df_fragments['start_pos'], df_fragments['start_pos']
         case 'end_only':
-            df_merged_in_nfr = df_merged[
-                (df_merged.end_pos > df_merged.start) & (df_merged.end_pos < df_merged.end)]
+            left_pos, right_pos = df_fragments['end_pos'], df_fragments['end_pos']
         case 'middle':
             df_fragments["midpoint"] = (df_fragments["end_pos"] + df_fragments["start_pos"]) / 2
-            df_merged = pd.merge(df_fragments, df_nucleosomes, on='chrom')
-            df_merged_in_nfr = df_merged[
-                (df_merged.midpoint >= df_merged.start) & (df_merged.midpoint <= df_merged.end)]
+            #   2 * midpoint = start_pos + end_pos, compared against doubled nfr bounds stays in integers
+            left_pos = right_pos = df_fragments["start_pos"] + df_fragments["end_pos"]
+            inclusive = True
+            scale = 2
         case 'start_&_end':
-            df_merged_in_nfr = df_merged[
-                (df_merged.start_pos > df_merged.start) & (df_merged.end_pos < df_merged.end)]
-    del df_merged
-    index_in_nfr = np.unique(df_merged_in_nfr.uid)
-    df_fragments_in_nfr = df_fragments.loc[index_in_nfr, :]
-    df_fragments_out_nfr = df_fragments.drop(index_in_nfr)
-
-    df_fragments.drop(columns='uid', inplace=True)
-    df_fragments_in_nfr.to_csv(output_dir + 'fragments_list_in_nfr.tsv', sep='\t', index_label='fragments')
-    df_fragments_out_nfr.to_csv(output_dir + 'fragments_list_out_nfr.tsv', sep='\t', index_label='fragments')
-    df_nucleosomes = df_nucleosomes.rename(columns={'length': 'size'})
+            left_pos, right_pos = df_fragments['start_pos'], df_fragments['end_pos']
+        case _:
+            raise ValueError(f"Unknown fragments_nfr_filter mode: {fragments_nfr_filter}")
 
-    plot_size_distribution(
-        df=df_fragments_in_nfr,
-        bin_count=120,
-        mode='inside',
-        output_path=output_dir
+    #   Interval lookup instead of the fragments x nucleosomes cross join, done in one sort-merge pass
+    #   over the genome: positions are shifted by chr_code * offset, with an offset larger than any
+    #   coordinate, so that nfr and fragments of different chromosomes never meet
+    chr_categories = df_fragments['chrom'].cat.categories
+    nfr_chr_codes = pd.Categorical(df_nucleosomes['chrom'], categories=chr_categories).codes.astype('int64')
+    nfr_kept = nfr_chr_codes >= 0
+    offset = scale * (max(df_fragments['end_pos'].max(), df_nucleosomes['end'].max()) + 1)
+    frag_shifts = df_fragments['chrom'].cat.codes.to_numpy().astype('int64') * offset
+    nfr_shifts = nfr_chr_codes[nfr_kept] * offset
+    in_nfr = intervals_contain(
+        scale * df_nucleosomes['start'].to_numpy()[nfr_kept] + nfr_shifts,
+        scale * df_nucleosomes['end'].to_numpy()[nfr_kept] + nfr_shifts,
+        left_pos.to_numpy() + frag_shifts,
+        right_pos.to_numpy() + frag_shifts,
+        inclusive
     )
 
-    plot_size_distribution(
-        df=df_fragments_out_nfr,
-        bin_count=120,
-        mode='outside',
-        output_path=output_dir
-    )
+    #   in_nfr is already a boolean bitmap over the fragments, no need to sort and drop uid.
+    #   uid duplicates the 'fragments' index column, it is dropped before the split so it isn't written
+    df_fragments = df_fragments.drop(columns='uid')
+    df_fragments_in_nfr = df_fragments[in_nfr]
+    df_fragments_out_nfr = df_fragments[~in_nfr]
+
+    df_fragments_in_nfr.to_csv(output_dir + 'fragments_list_in_nfr.tsv', sep='\t', index_label='fragments')
+    df_fragments_out_nfr.to_csv(output_dir + 'fragments_list_out_nfr.tsv', sep='\t', index_label='fragments')
+    df_nucleosomes = df_nucleosomes.rename(columns={'length': 'size'})
 
-    plot_size_distribution(
-        df=df_nucleosomes,
+    plot_size_distribution_grid(
+        dfs={'inside': df_fragments_in_nfr, 'outside': df_fragments_out_nfr, 'all': df_nucleosomes},
         bin_count=120,
-        mode='all',
         output_path=output_dir
     )
 
@@ -158,61 +201,87 @@ def run(
         the absolute path toward the output directory to save the results
     """
 
-    df_contacts = pd.read_csv(formatted_contacts_path, sep='\t', index_col=False)
     df_probes = pd.read_csv(probes_to_fragments_path, sep='\t', index_col=0)
     sample_id = re.search(r"AD\d+[A-Z]*", formatted_contacts_path).group()
 
-    df_fragments_in_nfr = pd.read_csv(fragments_in_nfr_path, sep='\t', index_col=0)
-    df_fragments_out_nfr = pd.read_csv(fragments_out_nfr_path, sep='\t', index_col=0)
+    #   Read the header first to only parse chr, positions and the probes fragments columns with explicit dtypes
+    contacts_columns = pd.read_csv(formatted_contacts_path, sep='\t', index_col=False, nrows=0).columns
+    frag_columns = list(dict.fromkeys(f for f in df_probes.iloc[4] if f in contacts_columns))
+    #   Contacts counts, float32 is exact for them and halves the memory traffic of the sums below
+    contacts_dtypes = {'chr': 'category', 'positions': 'int64'} | {f: 'float32' for f in frag_columns}
+
+    fragments_dtypes = {'start_pos': 'int64', 'size': 'int64'}
+    df_fragments_in_nfr = pd.read_csv(
+        fragments_in_nfr_path, sep='\t', usecols=list(fragments_dtypes), dtype=fragments_dtypes)
+    df_fragments_out_nfr = pd.read_csv(
+        fragments_out_nfr_path, sep='\t', usecols=list(fragments_dtypes), dtype=fragments_dtypes)
 
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
     output_path = output_dir+sample_id
-    df_contacts_in = df_contacts[df_contacts['positions'].isin(df_fragments_in_nfr['start_pos'])]
-    df_contacts_out = df_contacts[df_contacts['positions'].isin(df_fragments_out_nfr['start_pos'])]
+    #   Label each contacted position in a single lookup: bit 1 if it starts a fragment in nfr,
+    #   bit 2 if it starts a fragment out of nfr (a position may be both, on different chromosomes)
+    nfr_flags = pd.Series(np.int8(1), index=pd.unique(df_fragments_in_nfr['start_pos'])).add(
+        pd.Series(np.int8(2), index=pd.unique(df_fragments_out_nfr['start_pos'])), fill_value=0)
     all_probes = df_probes.columns.tolist()
 
-    probes = []
-    fragments = []
-    types = []
-    nfr_in = []
-    nfr_out = []
+    #   Sum the contacts of every probe fragment per (chromosome, flag), streaming the contacts table
+    #   by chunks so that only one chunk is in memory at a time. The flags are then folded into the
+    #   in / out per chromosome sums, the probes loop below only has to leave out the probe's own chromosome
+    df_contacts_per_flag = None
+    for df_chunk in pd.read_csv(formatted_contacts_path, sep='\t', index_col=False, usecols=list(contacts_dtypes),
+                                dtype=contacts_dtypes, chunksize=500_000):
+        position_flags = df_chunk['positions'].map(nfr_flags).fillna(0).astype(np.int8).rename('flag')
+        df_chunk_per_flag = df_chunk[frag_columns].groupby([df_chunk['chr'], position_flags], observed=True).sum()
+        if df_contacts_per_flag is None:
+            df_contacts_per_flag = df_chunk_per_flag
+        else:
+            df_contacts_per_flag = df_contacts_per_flag.add(df_chunk_per_flag, fill_value=0)
+    flags = df_contacts_per_flag.index.get_level_values('flag')
+    df_contacts_in_per_chr = df_contacts_per_flag[(flags & 1) > 0].groupby(level='chr', observed=True).sum()
+    df_contacts_out_per_chr = df_contacts_per_flag[(flags & 2) > 0].groupby(level='chr', observed=True).sum()
+
+    #   Contacts outside the probe's chromosome = total contacts - contacts on the probe's chromosome
+    in_totals = df_contacts_in_per_chr.sum().to_dict()
+    out_totals = df_contacts_out_per_chr.sum().to_dict()
+    in_per_chr = df_contacts_in_per_chr.to_dict('index')
+    out_per_chr = df_contacts_out_per_chr.to_dict('index')
+
+    #   Typed arrays preallocated for every probe, filled up to ii_probe (probes without contacts are skipped)
+    n_probes = len(all_probes)
+    probes = np.empty(n_probes, dtype=object)
+    fragments = np.empty(n_probes, dtype=object)
+    types = np.empty(n_probes, dtype=object)
+    nfr_in = np.zeros(n_probes, dtype=float)
+    nfr_out = np.zeros(n_probes, dtype=float)
     total_sizes_in = sum(df_fragments_in_nfr['size'].values)
     total_sizes_out = sum(df_fragments_out_nfr['size'].values)
     total_sizes_all = total_sizes_in + total_sizes_out
+    #   Probes infos as plain lists and contacted fragments as a set, looked up once per probe
+    probes_infos = df_probes.to_dict('list')
+    frag_columns_set = set(frag_columns)
     ii_probe = 0
     for probe in all_probes:
-        probe_type, probe_start, probe_end, probe_chr, frag, frag_start, frag_end = df_probes[probe].tolist()
-        if frag not in df_contacts.columns:
+        probe_type, probe_start, probe_end, probe_chr, frag, frag_start, frag_end = probes_infos[probe]
+        if frag not in frag_columns_set:
             continue
-        probes.append(probe)
-        fragments.append(frag)
-        types.append(probe_type)
-
-        sub_df_contacts_in = df_contacts_in.loc[df_contacts_in['chr'] != probe_chr]
-        sub_df_contacts_out = df_contacts_out.loc[df_contacts_out['chr'] != probe_chr]
+        probes[ii_probe] = probe
+        fragments[ii_probe] = frag
+        types[ii_probe] = probe_type
 
         #   cts_in:  sum of contacts made by the probe inside nfr
         #   cts_out: sum of contacts made by the probe outside nfr
-        cts_in = np.sum(sub_df_contacts_in[frag].values)
-        cts_out = np.sum(sub_df_contacts_out[frag].values)
-
-        if cts_in + cts_out == 0:
-            #   prevent from dividing by 0
-            nfr_in.append(0)
-            nfr_out.append(0)
-        else:
-            nfr_in.append(
-                (cts_in / (cts_in + cts_out)) / (total_sizes_in / total_sizes_all)
-            )
+        cts_in = in_totals[frag] - in_per_chr.get(probe_chr, {}).get(frag, 0)
+        cts_out = out_totals[frag] - out_per_chr.get(probe_chr, {}).get(frag, 0)
 
-            nfr_out.append(
-                (cts_out / (cts_in + cts_out)) / (total_sizes_out / total_sizes_all)
-            )
+        #   if cts_in + cts_out == 0, both stay to 0 to prevent from dividing by 0
+        if cts_in + cts_out > 0:
+            nfr_in[ii_probe] = (cts_in / (cts_in + cts_out)) / (total_sizes_in / total_sizes_all)
+            nfr_out[ii_probe] = (cts_out / (cts_in + cts_out)) / (total_sizes_out / total_sizes_all)
         ii_probe += 1
 
-    df_stats = pd.DataFrame({'probe': probes, 'fragment': fragments, 'type': types,
-                             'contacts_in_nfr': nfr_in, 'contacts_out_nfr': nfr_out})
+    df_stats = pd.DataFrame({'probe': probes[:ii_probe], 'fragment': fragments[:ii_probe], 'type': types[:ii_probe],
+                             'contacts_in_nfr': nfr_in[:ii_probe], 'contacts_out_nfr': nfr_out[:ii_probe]})
 
-    df_stats.to_csv(output_path + '_statistics_nfr_per_probe.tsv', sep='\t')
\ No newline at end of file
+    df_stats.to_csv(output_path + '_statistics_nfr_per_probe.tsv', sep='\t')
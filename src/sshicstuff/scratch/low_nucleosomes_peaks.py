@@ -3,6 +3,7 @@ import os
 import numpy as np
 import pandas as pd
 import multiprocessing as mp
+from functools import lru_cache
 import matplotlib.pyplot as plt
 from scipy.stats import gaussian_kde
 
@@ -12,6 +13,21 @@ import utils
 pd.options.mode.chained_assignment = None
 
 
+@lru_cache(maxsize=None)
+def read_shared_table(path: str) -> pd.DataFrame:
+    """
+    Tables shared by all the samples (probes to fragments, fragments scores), parsed once per process.
+    The returned DataFrame is shared between the calls and must not be modified.
+    """
+    return pd.read_csv(path, sep='\t', index_col=0)
+
+
+def load_shared_tables(*paths: str):
+    """Parse the shared tables, in the parent before forking the pool (and as the initializer of the workers)."""
+    for path in paths:
+        read_shared_table(path)
+
+
 def process_chunk(args):
     df_fragments_chr_mask, df_nucleosomes_chr_mask, current_chr = args
     frag_starts = df_fragments_chr_mask['start'].values
@@ -101,7 +117,7 @@ def main(
         score_filter: int | float,
         output_dir: str
 ):
-    df_probes = pd.read_csv(probes_to_fragments_path, sep='\t', index_col=0)
+    df_probes = read_shared_table(probes_to_fragments_path)
     fragments = pd.unique(df_probes['frag_id'].astype(str))
 
     sample_id = re.search(r"AD\d+[A-Z]*", formatted_contacts_path).group()
@@ -116,7 +132,7 @@ def main(
 
     df_contacts.columns = [int(col) if col.isdigit() and int(col) in fragments else col for col in df_contacts.columns]
 
-    df_fragments_with_scores = pd.read_csv(fragments_nucleosomes_score_list, sep='\t', index_col=0)
+    df_fragments_with_scores = read_shared_table(fragments_nucleosomes_score_list)
 
     probe_chrs = df_probes.loc[df_probes['frag_id'].isin(fragments), 'chr']
     probe_chrs.index = df_probes.loc[df_probes['frag_id'].isin(fragments), 'frag_id'].astype(str)
@@ -124,16 +140,23 @@ def main(
     #   We need to remove for each oligo the number of contact it makes with its own chr.
     #   Because we know that the frequency of intra-chr contact is higher than inter-chr
     #   We have to set them as NaN to not bias the average
+    #   chromosome of each fragment looked up in a dict built once (first probe of the fragment)
+    df_frag_chr = df_probes.drop_duplicates(subset='frag_id')
+    frag_to_chr = dict(zip(df_frag_chr['frag_id'].astype(str), df_frag_chr['chr']))
     for f in fragments:
-        probe_chr = df_probes.loc[df_probes['frag_id'] == int(f), 'chr'].tolist()[0]
+        probe_chr = frag_to_chr[f]
         if probe_chr not in excluded_chr:
             df_contacts.loc[df_contacts['chr'] == probe_chr, f] = np.nan
 
-    df_contacts[fragments] = df_contacts[fragments].div(df_contacts[fragments].sum(axis=0))
+    #   The fragments block is read once and divided in place by its sums (NaN skipped)
+    contacts = df_contacts[fragments].to_numpy(dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        contacts /= np.nansum(contacts, axis=0)
+    df_contacts[fragments] = contacts
     df_fragments_kept = df_fragments_with_scores[df_fragments_with_scores['average_scores'] < score_filter]
     df_contacts_merged = pd.merge(df_fragments_kept, df_contacts, on=['chr', 'start'])
 
-    df_contacts_around_lnp = pd.DataFrame()
+    contacts_around_lnp = []
     for _, row in df_contacts_merged.iterrows():
         fragment_chr = row['chr']
         fragment_start = row['start']
@@ -142,17 +165,21 @@ def main(
         tmp_df = df_contacts_chr_mask.loc[index_contact-10:index_contact+10, :]
         tmp_id = list(tmp_df.index - index_contact)
         tmp_df.insert(1, 'id', tmp_id)
-        for col in fragments:
-            contacts_0 = tmp_df.loc[tmp_df['id'] == 0, col].values
-            if len(contacts_0) > 0 and contacts_0 > 0:
-                tmp_df[col] /= contacts_0[0]
+        #   Divide all the fragments columns by their contacts on the peak at once,
+        #   columns without contacts on the peak are left as they are
+        contacts_0 = tmp_df.loc[tmp_df['id'] == 0, fragments].to_numpy(dtype=float)
+        if len(contacts_0) > 0:
+            tmp_df[fragments] = tmp_df[fragments].to_numpy(dtype=float) / np.where(contacts_0[0] > 0, contacts_0[0], 1.)
 
-        df_contacts_around_lnp = pd.concat((df_contacts_around_lnp, tmp_df))
+        contacts_around_lnp.append(tmp_df)
 
+    df_contacts_around_lnp = pd.concat(contacts_around_lnp)
     df_aggregated_lnp = df_contacts_around_lnp.groupby(by='id').mean(numeric_only=True)
     df_aggregated_lnp.drop(columns=['start', 'sizes'], inplace=True)
     df_aggregated_lnp.to_csv(output_dir + 'nucleosome_poor_region_aggregated.tsv', sep='\t')
 
+    #   One figure for all the probes, only its axes are redrawn between two plots
+    fig, ax = plt.subplots(figsize=(16, 12))
     for probe in df_probes.index.values:
         probe_frag_id = df_probes.loc[probe, 'frag_id'].astype(str)
         if probe_frag_id not in df_aggregated_lnp.columns:
@@ -163,16 +190,16 @@ def main(
         x = df_aggregated_lnp.index.values
         y = df_aggregated_lnp[probe_frag_id].to_numpy()
         ymin = -np.max(y) * 0.01
-        plt.figure(figsize=(16, 12))
-        plt.bar(x, y)
-        plt.ylim((ymin, None))
-        plt.title("Aggregated frequencies for probe {0} around poor nucleosome regions".format(probe))
-        plt.xlabel("Genomic fragments")
-        plt.xticks(rotation=45)
-        plt.ylabel("Average frequency")
-        plt.savefig(output_dir + "{0}_nucleosome_poor_region_aggregated.{1}".format(probe, 'jpg'),
+        ax.clear()
+        ax.bar(x, y)
+        ax.set_ylim((ymin, None))
+        ax.set_title("Aggregated frequencies for probe {0} around poor nucleosome regions".format(probe))
+        ax.set_xlabel("Genomic fragments")
+        ax.tick_params(axis='x', labelrotation=45)
+        ax.set_ylabel("Average frequency")
+        fig.savefig(output_dir + "{0}_nucleosome_poor_region_aggregated.{1}".format(probe, 'jpg'),
                     dpi=96)
-        plt.close()
+    plt.close(fig)
 
 
 if __name__ == "__main__":
@@ -208,7 +235,9 @@ if __name__ == "__main__":
         not_binned_dir = binning_dir + sshic_dir + '0kb/'
         samples = sorted([f for f in os.listdir(not_binned_dir) if 'contacts.tsv' in f])
         if parallel:
-            with mp.Pool(mp.cpu_count()) as p:
+            shared_tables = (probes_and_fragments, fragments_with_scores_list)
+            load_shared_tables(*shared_tables)
+            with mp.Pool(mp.cpu_count(), initializer=load_shared_tables, initargs=shared_tables) as p:
                 p.starmap(main, [(
                     not_binned_dir+samp,
                     probes_and_fragments,
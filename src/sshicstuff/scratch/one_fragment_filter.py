@@ -29,24 +29,22 @@ def only_keep_one_fragment(oligos_path: str, fragments_path: str, contacts_path:
     foi = df_oligos["fragment"].unique()
     foi_ss = df_oligos.loc[df_oligos["type"] == "ss"]["fragment"].unique()
 
+    #   rows with a fragment of interest on a / b, looked up once for all the fragments of interest
+    frag_a = df_contacts_raw[0].to_numpy()
+    frag_b = df_contacts_raw[1].to_numpy()
+    foi_on_a = np.isin(frag_a, foi)
+    foi_on_b = np.isin(frag_b, foi)
+
     for f in foi_ss:
         print(f)
         foi_minus_f = foi[foi != f]
-        df_foi_minus_f = pd.DataFrame(foi_minus_f, columns=['fragments'])
-
-        df_contacts_raw["index"] = df_contacts_raw.index
-        matches_a = pd.merge(
-            df_contacts_raw, df_foi_minus_f, left_on=0, right_on='fragments', how='inner', indicator=True)
-        matches_b = pd.merge(
-            df_contacts_raw, df_foi_minus_f, left_on=1, right_on='fragments', how='inner', indicator=True)
-        index_to_drop = np.unique(np.concatenate((matches_a['index'].to_numpy(), matches_b['index'].to_numpy())))
+        to_drop = (foi_on_a & (frag_a != f)) | (foi_on_b & (frag_b != f))
 
-        df_contacts_one_frag_kept = df_contacts_raw.copy(deep=True).iloc[:, :3]
-        df_contacts_one_frag_kept.drop(index_to_drop, inplace=True)
+        df_contacts_one_frag_kept = df_contacts_raw.loc[~to_drop, [0, 1, 2]].copy()
 
         df_contacts_one_frag_kept.iloc[0, 0] -= len(foi_minus_f)
         df_contacts_one_frag_kept.iloc[0, 1] -= len(foi_minus_f)
-        df_contacts_one_frag_kept.iloc[0, 2] -= len(index_to_drop)
+        df_contacts_one_frag_kept.iloc[0, 2] -= int(to_drop.sum())
 
         output_path_one_frag_kept: str = os.path.join(output_dir, f"{sample_name}_{f}.txt")
         df_contacts_one_frag_kept.to_csv(output_path_one_frag_kept, sep='\t', index=False, header=False)
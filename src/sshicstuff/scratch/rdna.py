@@ -22,11 +22,17 @@ def main(
     #   We need to remove for each oligo the number of contact it makes with its own chr.
     #   Because we know that the frequency of intra-chr contact is higher than inter-chr
     #   We have to set them as NaN to not bias the average
+    #   chromosome of each fragment looked up in a dict built once (first probe of the fragment)
+    df_frag_chr = df_probes.drop_duplicates(subset='frag_id')
+    frag_to_chr = dict(zip(df_frag_chr['frag_id'].astype(str), df_frag_chr['chr']))
     for f in fragments:
-        probe_chr = df_probes.loc[df_probes['frag_id'] == int(f), 'chr'].tolist()[0]
+        probe_chr = frag_to_chr[f]
         df_contacts.loc[df_contacts['chr'] == probe_chr, f] = np.nan
-    #   Inter normalization
-    df_contacts[fragments] = df_contacts[fragments].div(df_contacts[fragments].sum(axis=0))
+    #   Inter normalization, the fragments block is read once and divided in place by its sums (NaN skipped)
+    contacts = df_contacts[fragments].to_numpy(dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        contacts /= np.nansum(contacts, axis=0)
+    df_contacts[fragments] = contacts
 
     for colname, colfrag in probes_averages.items():
         df_contacts[colname] = df_contacts[colfrag].mean(axis=1)
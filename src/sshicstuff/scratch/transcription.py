@@ -34,23 +34,24 @@ def preprocess(
     df_transcript_regions = df_transcript_regions[df_transcript_regions['chr'].isin(chr_of_interest)]
     df_transcript_regions.reset_index(inplace=True, drop=True)
 
-    df_genes_list["rna_per_bp"] = np.nan
-    for index, row in df_genes_list.iterrows():
-        # print(index)
-        chrom = row["chr"]
-        start = row["start"]
-        end = row["end"]
-        sub_df = df_transcript_regions.loc[
-            (df_transcript_regions['chr'] == chrom) &
-            (df_transcript_regions['start'] >= start) &
-            (df_transcript_regions['end'] <= end)
-        ]
-        if len(sub_df) == 0:
-            coverage_per_bp = 0.
-        else:
-            interval_size = sub_df.iloc[-1, 2] - sub_df.iloc[0, 1] + 1
-            coverage_per_bp = sub_df['score'].values.sum() / interval_size
-        df_genes_list.loc[index, "rna_per_bp"] = coverage_per_bp
+    #   transcript regions of each chromosome as numpy arrays, the coverage of every gene
+    #   is filled in one array, assigned to the genes list at once
+    regions_per_chr = {
+        chrom: (df['start'].to_numpy(), df['end'].to_numpy(), df['score'].to_numpy())
+        for chrom, df in df_transcript_regions.groupby('chr', sort=False)
+    }
+    rna_per_bp = np.zeros(len(df_genes_list))
+    genes = zip(df_genes_list['chr'], df_genes_list['start'], df_genes_list['end'])
+    for index, (chrom, start, end) in enumerate(genes):
+        if chrom not in regions_per_chr:
+            continue
+        regions_start, regions_end, regions_score = regions_per_chr[chrom]
+        in_gene = (regions_start >= start) & (regions_end <= end)
+        if in_gene.any():
+            first, last = np.flatnonzero(in_gene)[[0, -1]]
+            interval_size = regions_end[last] - regions_start[first] + 1
+            rna_per_bp[index] = regions_score[in_gene].sum() / interval_size
+    df_genes_list["rna_per_bp"] = rna_per_bp
     df_genes_list.to_csv(inputs_dir+"genes_list_with_coverage_per_bp.tsv", sep='\t')
 
 
@@ -152,13 +153,9 @@ def merge(
         wt_res: dict,
         output_dir: str
 ):
-    df_merged = pd.DataFrame()
-    df_merged_b10 = pd.DataFrame()
-    df_merged_t10 = pd.DataFrame()
-    for wt, tpl in wt_res.items():
-        df_merged = pd.concat((df_merged, tpl[0]))
-        df_merged_b10 = pd.concat((df_merged_b10, tpl[1]))
-        df_merged_t10 = pd.concat((df_merged_t10, tpl[2]))
+    df_merged = pd.concat([tpl[0] for tpl in wt_res.values()])
+    df_merged_b10 = pd.concat([tpl[1] for tpl in wt_res.values()])
+    df_merged_t10 = pd.concat([tpl[2] for tpl in wt_res.values()])
 
     df_merged = df_merged.groupby(by=["name", "chr", "start", "end", ], as_index=False).mean(numeric_only=True)
     df_merged_b10 = df_merged_b10.groupby(by=["name", "chr", "start", "end"], as_index=False).mean(numeric_only=True)
@@ -189,7 +186,8 @@ if __name__ == "__main__":
     for sshic_dir in sshic_pcrdupt_dir:
         print(sshic_dir)
         not_binned_dir = binning_dir + sshic_dir + '0kb/'
-        samples = [f for f in sorted(os.listdir(not_binned_dir)) if 'frequencies' in f]
+        samples = sorted(
+            entry.name for entry in os.scandir(not_binned_dir) if entry.is_file() and 'frequencies' in entry.name)
 
         if not os.path.exists(transcripts_dir+sshic_dir):
             os.makedirs(transcripts_dir+sshic_dir)
@@ -5,6 +5,7 @@ import shutil
 import numpy as np
 import pandas as pd
 import subprocess
+from functools import lru_cache
 
 import sshicstuff.log as log
 logger = log.logger
@@ -64,9 +65,14 @@ def check_gzip():
         return None
 
 
+#   Files already found by check_if_exists, the same inputs are checked by every step of the pipeline
+_existing_files: set[str] = set()
+
+
 def check_if_exists(file_path: str):
     """
     Check if a file exists.
+    Files found once are remembered, only missing files are looked up again (see clear_exists_cache).
 
     Parameters
     ----------
@@ -78,13 +84,23 @@ def check_if_exists(file_path: str):
     bool
         True if the file exists, False otherwise.
     """
+    if file_path in _existing_files:
+        return
     if os.path.exists(file_path):
+        _existing_files.add(file_path)
         return
     else:
         logger.error(f"File {file_path} does not exist.")
         sys.exit(1)
 
 
+def clear_exists_cache():
+    """
+    Forget the files found by check_if_exists, e.g. at the start of a new pipeline run.
+    """
+    _existing_files.clear()
+
+
 def check_seqtk():
     """
     Check if seqtk is installed and retrieve its version.
@@ -131,7 +147,7 @@ def copy(source_path, destination_path):
 def detect_delimiter(path: str):
     """
     Detect the delimiter of a file.
-    The delimiter is detected by counting the number of tabs and commas in the file.
+    The delimiter is detected by counting the number of tabs and commas in the first 64 KiB of the file.
 
     Parameters
     ----------
@@ -143,16 +159,40 @@ def detect_delimiter(path: str):
     str
         Delimiter of the file.
     """
-    with open(path, 'r') as file:
-        contents = file.read()
-    tabs = contents.count('\t')
-    commas = contents.count(',')
+    with open(path, 'rb') as file:
+        sample = file.read(65536)
+    tabs = sample.count(b'\t')
+    commas = sample.count(b',')
     if tabs > commas:
         return '\t'
     else:
         return ','
 
 
+@lru_cache(maxsize=8)
+def _read_fragments_list(path: str, mtime_ns: int) -> pd.DataFrame:
+    return pd.read_csv(path, sep='\t')
+
+
+def read_fragments_list(path: str) -> pd.DataFrame:
+    """
+    Read a fragments list (hicstuff output).
+    The file is parsed once per process until it is modified (mtime), the following calls get a copy
+    of the parsed table. The pipeline workers are started with the table already parsed.
+
+    Parameters
+    ----------
+    path : str
+        Path to the fragments list file.
+
+    Returns
+    -------
+    pd.DataFrame
+        Fragments list, with the columns of the file.
+    """
+    return _read_fragments_list(path, os.stat(path).st_mtime_ns).copy()
+
+
 def frag2(x):
     """
     if x = a get b, if x = b get a
@@ -196,17 +236,71 @@ def is_debug() -> bool:
 
 
 def make_groups_of_probes(df_groups: pd.DataFrame, df: pd.DataFrame, prob2frag: dict):
-    for index, row in df_groups.iterrows():
-        group_probes = row["probes"].split(",")
-        group_frags = np.unique([prob2frag[probe] for probe in group_probes])
-        group_name = row["name"]
-        group_name = "$" + group_name.lower()
-        if row["action"] == "average":
-            df[group_name] = df[group_frags].mean(axis=1)
-        elif row["action"] == "sum":
-            df[group_name] = df[group_frags].sum(axis=1)
+    """
+    Add to df a '$<name>' column for each group of probes, i.e., the average or the sum
+    (according to the group action) of the columns of the fragments of its probes.
+    NaN values are skipped, as with DataFrame.mean / DataFrame.sum.
+    The groups are computed in float64 and stored with the dtype of the fragments columns.
+
+    Parameters
+    ----------
+    df_groups : pd.DataFrame
+        Groups of probes with the columns 'name', 'probes' (comma separated) and 'action' ('average' or 'sum').
+    df : pd.DataFrame
+        Contacts or frequencies with one column per fragment, modified in place.
+    prob2frag : dict
+        Probe name to fragment column.
+    """
+    groups = [
+        ("$" + name.lower(), np.unique([prob2frag[probe] for probe in probes.split(",")]), action)
+        for name, probes, action in zip(df_groups["name"], df_groups["probes"], df_groups["action"])
+        if action in ("average", "sum")
+    ]
+    if not groups:
+        return
+
+    # All the fragments used by the groups are read once into a single array
+    needed_frags = list(dict.fromkeys(frag for _, group_frags, _ in groups for frag in group_frags))
+    frag_idx = {frag: i for i, frag in enumerate(needed_frags)}
+    values = df[needed_frags].to_numpy(dtype=float)
+    is_value = ~np.isnan(values)
+    groups_dtype = np.result_type(*df.dtypes[needed_frags])
+
+    for group_name, group_frags, action in groups:
+        idx = np.fromiter((frag_idx[frag] for frag in group_frags), dtype=np.intp, count=len(group_frags))
+        group_sum = np.nansum(values[:, idx], axis=1)
+        if action == "average":
+            with np.errstate(invalid="ignore", divide="ignore"):
+                df[group_name] = (group_sum / is_value[:, idx].sum(axis=1)).astype(groups_dtype)
         else:
-            continue
+            df[group_name] = group_sum.astype(groups_dtype)
+
+
+def chr_dtype(chr_list: list[str]) -> pd.CategoricalDtype:
+    """
+    Ordered categorical dtype of the chromosomes : the chromosomes of the form "chrX" with X being a number
+    first, in numerical order, then the other ones in their order of appearance.
+
+    Parameters
+    ----------
+    chr_list : List[str]
+        List of chromosomes, may hold one entry per bin.
+
+    Returns
+    -------
+    pd.CategoricalDtype
+        Ordered categorical dtype, the codes of a chr column of this dtype are int8 / int16.
+    """
+    # chr_list may hold one entry per bin, only keep each chromosome once (in order of appearance)
+    chr_list = list(dict.fromkeys(chr_list))
+
+    # use re to identify chromosomes of the form "chrX" with X being a number
+    chr_with_number = [c for c in chr_list if re.match(r'chr\d+', c)]
+    chr_with_number.sort(key=lambda x: int(x[3:]))
+    chr_without_number = [c for c in chr_list if c not in chr_with_number]
+
+    return pd.CategoricalDtype(chr_with_number + chr_without_number, ordered=True)
+
 
 def sort_by_chr(df: pd.DataFrame, chr_list: list[str], *args: str):
     """
@@ -226,20 +320,19 @@ def sort_by_chr(df: pd.DataFrame, chr_list: list[str], *args: str):
     pd.DataFrame
         Sorted DataFrame.
     """
-    # use re to identify chromosomes of the form "chrX" with X being a number
-    chr_with_number = [c for c in chr_list if re.match(r'chr\d+', c)]
-    chr_with_number.sort(key=lambda x: int(x[3:]))
-    chr_without_number = [c for c in chr_list if c not in chr_with_number]
-
-    order = chr_with_number + chr_without_number
-    df['chr'] = df['chr'].apply(lambda x: order.index(x) if x in order else len(order))
-
-    if args:
-        df = df.sort_values(by=['chr', *args])
-    else:
-        df = df.sort_values(by=['chr'])
-
-    df['chr'] = df['chr'].map(lambda x: order[x])
+    # The rank of a chromosome is its code in the ordered categorical dtype, the chromosomes
+    # absent from chr_list are appended to the categories in alphabetical order (sorted at the end).
+    # The ranks are only computed as the sort key of the chr column, the input DataFrame is not modified.
+    order = list(chr_dtype(chr_list).categories)
+    categories = order + sorted(set(pd.unique(df['chr'].dropna())) - set(order))
+
+    def chr_rank(column: pd.Series) -> pd.Series:
+        if column.name != 'chr':
+            return column
+        codes = pd.Categorical(column, categories=categories, ordered=True).codes
+        return pd.Series(np.where(codes < 0, len(categories), codes), index=column.index)
+
+    df = df.sort_values(by=['chr', *[c for c in args if c != 'chr']], key=chr_rank, kind='stable')
     df.index = range(len(df))
 
     return df
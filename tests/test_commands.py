@@ -1,6 +1,19 @@
 import os
+import sys
+import time
+import shutil
+import logging
+import subprocess
 from os.path import join, dirname
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+import pandas as pd
+
 import sshicstuff.commands as shcmd
+import sshicstuff.methods as sshic
+import sshicstuff.pipeline as shpip
+import sshicstuff.utils as shcu
 
 
 CWD = os.getcwd()
@@ -31,6 +44,37 @@ def test_genomaker():
     proc.execute()
 
 
+def test_genomaker_outputs(tmp_path):
+    genome = shutil.copy(GENOME, tmp_path)
+    args = (
+        "-e {0} -g {1} -o {2} -s N -l 80 -f 150"
+    ).format(DPNII, genome, ANNEALING)
+    proc = shcmd.Genomaker(args.split(" "), {})
+    proc.execute()
+
+    with open(join(tmp_path, "chr_artificial_ssDNA.fa")) as f:
+        artificial_chr = f.read()
+    assert artificial_chr.startswith(">chr_artificial_ssDNA")
+    with open(join(tmp_path, "S288c_DSB_LY_Capture_artificial.fa")) as f:
+        assert artificial_chr in f.read()
+
+
+def test_genomaker_dry_run(tmp_path, caplog):
+    genome = shutil.copy(GENOME, tmp_path)
+    args = (
+        "-e {0} -g {1} -o {2} -s N -l 80 -f 150"
+    ).format(DPNII, genome, ANNEALING)
+    proc = shcmd.Genomaker(args.split(" "), {"--dry-run": True})
+    with caplog.at_level(logging.INFO):
+        proc.execute()
+
+    assert os.listdir(tmp_path) == ["S288c_DSB_LY_Capture.fa"]
+    assert "[Dry run] : sshicstuff.methods.edit_genome_ref(" in caplog.text
+    assert f"annealing_input={ANNEALING!r}" in caplog.text
+    assert f"genome_input={genome!r}" in caplog.text
+    assert f"enzyme={DPNII!r}" in caplog.text
+
+
 def test_associate():
     args = (
         "-f {0} -o {1} -F"
@@ -121,3 +165,199 @@ def test_aggregate():
     proc.execute()
 
 
+def test_aggregate_flags(tmp_path, caplog):
+    profile = join(tmp_path, "AD162_pcrdupkept_10kb_profile_frequencies.tsv")
+    write_file(profile, "")
+    args = (
+        "-c {0} -h {1} -p {2} -C"
+    ).format(CAPTURE, COORDS, profile)
+    proc = shcmd.Aggregate(args.split(" "), {"--dry-run": True})
+    assert proc.args["--cen"] is True
+    assert proc.args["--tel"] is False
+    with caplog.at_level(logging.INFO):
+        proc.execute()
+    assert "[Dry run] : sshicstuff.methods.aggregate(" in caplog.text
+
+    proc = shcmd.Aggregate((args + " -T").split(" "), {"--dry-run": True})
+    with pytest.raises(ValueError):
+        proc.execute()
+
+
+def test_unknown_commands(monkeypatch, capsys):
+    for name in ["Dict", "Option", "DocoptExit", "TokenStream"]:
+        assert not hasattr(shcmd, name)
+
+    #   main reads the installed package version at import
+    main = pytest.importorskip("sshicstuff.main")
+    for name in ["dict", "option", "abstractcommand"]:
+        monkeypatch.setattr(sys, "argv", ["sshicstuff", name])
+        with pytest.raises(main.DocoptExit):
+            main.main()
+        assert "Unknown command." in capsys.readouterr().out
+
+
+def upper_copy(input_path, output_path, suffix="", force=False):
+    """Pipeline-like step of the cache tests: an existing output is kept unless forced"""
+    if os.path.exists(output_path) and not force:
+        return
+    with open(input_path) as f_in, open(output_path, "w") as f_out:
+        f_out.write(f_in.read().upper() + suffix)
+
+
+def write_file(path, content, mtime_s=None):
+    with open(path, "w") as f:
+        f.write(content)
+    if mtime_s is not None:
+        os.utime(path, (mtime_s, mtime_s))
+
+
+def read_file(path):
+    with open(path) as f:
+        return f.read()
+
+
+def test_cache_reruns_changed_input(tmp_path):
+    input_path = join(tmp_path, "input.txt")
+    output_path = join(tmp_path, "output.txt")
+    cache_dir = join(tmp_path, ".cache")
+    tasks = [(upper_copy, dict(input_path=input_path, output_path=output_path, force=False), [output_path])]
+
+    now = time.time()
+    write_file(input_path, "first", mtime_s=now - 100)
+    shpip.run_tasks(tasks, cache_dir=cache_dir)
+    assert read_file(output_path) == "FIRST"
+    assert len(os.listdir(cache_dir)) == 1
+
+    #   unchanged input: skipped, even if the output was modified meanwhile
+    write_file(output_path, "kept")
+    shpip.run_tasks(tasks, cache_dir=cache_dir)
+    assert read_file(output_path) == "kept"
+
+    #   changed input: the step runs again and overwrites its output
+    write_file(input_path, "second", mtime_s=now + 100)
+    shpip.run_tasks(tasks, cache_dir=cache_dir)
+    assert read_file(output_path) == "SECOND"
+
+    #   invalidated step: runs again with the same input
+    write_file(output_path, "stale")
+    shpip.run_tasks(tasks, cache_dir=cache_dir, invalidate=["upper_copy"])
+    assert read_file(output_path) == "SECOND"
+
+
+def test_cache_reruns_stale_outputs(tmp_path):
+    input_path = join(tmp_path, "input.txt")
+    output_path = join(tmp_path, "output.txt")
+    cache_dir = join(tmp_path, ".cache")
+    kwargs = dict(input_path=input_path, output_path=output_path, force=False)
+
+    #   output of a former run, older than the input and not recorded in the cache: rewritten
+    now = time.time()
+    write_file(output_path, "former", mtime_s=now - 100)
+    write_file(input_path, "input", mtime_s=now)
+    shpip.run_tasks([(upper_copy, kwargs, [output_path])], cache_dir=cache_dir)
+    assert read_file(output_path) == "INPUT"
+
+    #   output newer than its input and not recorded: kept, and recorded
+    shutil.rmtree(cache_dir)
+    write_file(output_path, "newer", mtime_s=now + 100)
+    shpip.run_tasks([(upper_copy, kwargs, [output_path])], cache_dir=cache_dir)
+    assert read_file(output_path) == "newer"
+
+    #   recorded step with a new parameter: rerun although its output is newer than its input
+    shpip.run_tasks([(upper_copy, dict(kwargs, suffix="!"), [output_path])], cache_dir=cache_dir)
+    assert read_file(output_path) == "INPUT!"
+
+
+def failing_step(output_path, force=False):
+    raise RuntimeError(f"{output_path} not written")
+
+
+def test_cache_force_and_failures(tmp_path):
+    input_path = join(tmp_path, "input.txt")
+    output_path = join(tmp_path, "output.txt")
+    cache_dir = join(tmp_path, ".cache")
+    tasks = [(upper_copy, dict(input_path=input_path, output_path=output_path, force=False), [output_path])]
+
+    write_file(input_path, "input")
+    shpip.run_tasks(tasks, cache_dir=cache_dir)
+    write_file(output_path, "modified")
+
+    #   with force, up to date steps are run again
+    shpip.run_tasks(tasks, cache_dir=cache_dir, force=True)
+    assert read_file(output_path) == "INPUT"
+
+    #   on a pool, the error of a step is raised, and only the steps that succeeded are recorded
+    failing_output = join(tmp_path, "failing.txt")
+    failing = (failing_step, dict(output_path=failing_output, force=False), [failing_output])
+    write_file(output_path, "modified")
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        with pytest.raises(RuntimeError):
+            shpip.run_tasks(tasks + [failing], executor, cache_dir, invalidate=["upper_copy"])
+    assert read_file(output_path) == "INPUT"
+    assert [r.split("-")[0] for r in os.listdir(cache_dir)] == ["upper_copy"]
+
+
+def test_pipeline_unknown_invalidate(tmp_path):
+    output_dir = join(tmp_path, "out")
+    with pytest.raises(ValueError, match="coverge"):
+        shpip.full_pipeline(
+            join(tmp_path, "sample.txt"), CAPTURE, join(tmp_path, "fragments_list.txt"), COORDS,
+            output_dir=output_dir, invalidate=["coverage", "coverge"])
+    assert not os.path.exists(output_dir)
+    assert set(shpip.PIPELINE_STEPS) >= {"filter_contacts", "coverage", "rebin_profile", "aggregate"}
+
+
+def test_lazy_submodules():
+    code = (
+        "import sys, sshicstuff\n"
+        "assert sshicstuff.utils.__name__ == 'sshicstuff.utils'\n"
+        "assert sshicstuff.sort_by_chr is sshicstuff.utils.sort_by_chr\n"
+        "assert not {'sshicstuff.methods', 'sshicstuff.gui', 'dash'} & set(sys.modules)\n"
+        "assert sshicstuff.aggregate is sshicstuff.methods.aggregate\n"
+        "assert 'sshicstuff.pipeline' not in sys.modules\n"
+        "try:\n"
+        "    sshicstuff.not_a_function\n"
+        "except AttributeError:\n"
+        "    pass\n"
+        "else:\n"
+        "    raise AssertionError('sshicstuff.not_a_function should not resolve')\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+    import sshicstuff
+    for name, submodule in sshicstuff._EXPORTED_FROM.items():
+        assert getattr(sshicstuff, name) is getattr(getattr(sshicstuff, submodule), name)
+
+
+def test_dsdna_only_removes_temporary_file(tmp_path):
+    sparse_mat = join(tmp_path, "sample.txt")
+    oligo_capture = join(tmp_path, "oligo_capture.csv")
+    output_path = join(tmp_path, "sample_dsdna_only.txt")
+    write_file(sparse_mat, "10\t10\t3\n0\t1\t5\n2\t3\t1\n4\t5\t2\n")
+    write_file(oligo_capture, "type,fragment\nss,1\nds,8\n")
+
+    #   a directory in place of the output: the call fails once the contacts were streamed to the temporary file
+    os.mkdir(output_path)
+    with pytest.raises(IsADirectoryError):
+        sshic.sparse_with_dsdna_only(sparse_mat, oligo_capture, output_path=output_path, force=True)
+    assert not os.path.exists(output_path + ".tmp")
+
+    os.rmdir(output_path)
+    sshic.sparse_with_dsdna_only(sparse_mat, oligo_capture, n_flanking_dsdna=1, output_path=output_path)
+    assert read_file(output_path) == "6\t6\t2\n2\t3\t1\n4\t5\t2\n"
+    assert sorted(os.listdir(tmp_path)) == ["oligo_capture.csv", "sample.txt", "sample_dsdna_only.txt"]
+
+
+def test_sort_by_chr():
+    df = pd.DataFrame({
+        "chr": ["chr10", "2_micron", "chr2", "chrM", "chr2", "chr1"],
+        "chr_bins": [0, 0, 20, 0, 10, 0],
+    }, index=[5, 4, 3, 2, 1, 0])
+    df_before = df.copy()
+
+    df_sorted = shcu.sort_by_chr(df, ["chr2", "chr10", "chr1", "2_micron"], "chr", "chr_bins")
+    assert df_sorted["chr"].tolist() == ["chr1", "chr2", "chr2", "chr10", "2_micron", "chrM"]
+    assert df_sorted["chr_bins"].tolist() == [0, 10, 20, 0, 0, 0]
+    assert df_sorted.index.tolist() == list(range(6))
+    #   the input DataFrame is left as it was
+    pd.testing.assert_frame_equal(df, df_before)
@@ -0,0 +1,438 @@
+import os
+import shutil
+from os.path import join, dirname
+from collections import Counter, defaultdict
+
+import pytest
+import numpy as np
+import pandas as pd
+
+import sshicstuff.methods as sshic
+import sshicstuff.scratch.in_out_nfr as nfr
+import sshicstuff.scratch.rdna as rdna
+
+
+CWD = os.getcwd()
+TESTDIR = join(dirname(CWD), "test_data")
+CAPTURE = join(TESTDIR, "capture_oligo_positions.csv")
+COORDS = join(TESTDIR, "chr_coords.tsv")
+GROUPS = join(TESTDIR, "additional_probe_groups.tsv")
+SAMPLE = "AD000_sample"
+BIN_SIZE = 10000
+SEED = 42
+
+#   The methods below are checked against naive loops over a small sample generated from the
+#   bundled oligos and chromosomes coordinates: random fragments and a sparse matrix enriched
+#   in contacts made by the probes fragments.
+
+
+def make_fragments(rng):
+    df_coords = pd.read_csv(COORDS, sep="\t")
+    rows = []
+    for chr_, length in zip(df_coords["chr"], df_coords["length"]):
+        start = 0
+        while start < length:
+            size = 366 if "artificial" in chr_ else int(rng.integers(1000, 8000))
+            end = min(start + size, length)
+            rows.append((chr_, start, end, end - start, round(float(rng.random()), 4)))
+            start = end
+
+    df_fragments = pd.DataFrame(rows, columns=["chrom", "start_pos", "end_pos", "size", "gc_content"])
+    df_fragments.insert(0, "id", np.arange(1, len(df_fragments) + 1))
+    return df_fragments
+
+
+def make_sparse_mat(rng, n_fragments, probes_fragments):
+    frag_a = np.concatenate([rng.integers(0, n_fragments, 4000), rng.choice(probes_fragments, 4000)])
+    frag_b = rng.integers(0, n_fragments, len(frag_a))
+    df_sparse = pd.DataFrame({
+        "frag_a": np.minimum(frag_a, frag_b),
+        "frag_b": np.maximum(frag_a, frag_b),
+        "contacts": 1
+    }).groupby(["frag_a", "frag_b"], as_index=False)["contacts"].sum()
+    df_sparse["contacts"] += rng.integers(0, 3, len(df_sparse))
+    return df_sparse
+
+
+@pytest.fixture(scope="module")
+def sample(tmp_path_factory):
+    """
+    Run associate -> filter -> profile -> rebin on the generated sample, once for the module.
+    """
+    outdir = str(tmp_path_factory.mktemp("sample"))
+    rng = np.random.default_rng(SEED)
+
+    capture = shutil.copy(CAPTURE, outdir)
+    df_fragments = make_fragments(rng)
+    fragments_path = join(outdir, "fragments_list.txt")
+    df_fragments.to_csv(fragments_path, sep="\t", index=False)
+
+    probes_fragments = []
+    for chr_, start, end in pd.read_csv(CAPTURE)[["chr", "start", "end"]].itertuples(index=False):
+        middle = (start + end) // 2
+        probes_fragments.append(df_fragments.index[
+            (df_fragments["chrom"] == chr_) & (df_fragments["start_pos"] < middle) &
+            (df_fragments["end_pos"] > middle)][0])
+
+    df_sparse = make_sparse_mat(rng, len(df_fragments), probes_fragments)
+    sparse_path = join(outdir, f"{SAMPLE}.txt")
+    with open(sparse_path, "w") as f:
+        f.write(f"{len(df_fragments)}\t{len(df_fragments)}\t{len(df_sparse)}\n")
+        df_sparse.to_csv(f, sep="\t", index=False, header=False)
+
+    sshic.associate_oligo_to_frag(capture, fragments_path, force=True)
+    capture_fragments = capture.replace(".csv", "_fragments_associated.csv")
+    filtered_path = sparse_path.replace(".txt", "_filtered.tsv")
+    sshic.filter_contacts(sparse_path, capture, fragments_path, filtered_path, force=True)
+    profile_path = filtered_path.replace("filtered.tsv", "0kb_profile_contacts.tsv")
+    sshic.profile_contacts(
+        filtered_path, capture_fragments, COORDS, normalize=True, output_path=profile_path,
+        additional_groups_path=GROUPS, force=True)
+    binned_path = profile_path.replace("0kb_profile", f"{BIN_SIZE // 1000}kb_profile")
+    for path in [profile_path, profile_path.replace("contacts", "frequencies")]:
+        sshic.rebin_profile(path, COORDS, BIN_SIZE, force=True)
+
+    return {
+        "dir": outdir,
+        "fragments": df_fragments,
+        "fragments_path": fragments_path,
+        "sparse": df_sparse,
+        "sparse_path": sparse_path,
+        "oligo": pd.read_csv(capture_fragments),
+        "capture_fragments": capture_fragments,
+        "filtered_path": filtered_path,
+        "profile_path": profile_path,
+        "binned_path": binned_path,
+        "binned_frequencies_path": binned_path.replace("contacts", "frequencies")
+    }
+
+
+def oligo_fragments(df_oligo):
+    fragments = list(dict.fromkeys(df_oligo["fragment"].astype(str)))
+    frag_to_chr_ori = dict(zip(df_oligo["fragment"].astype(str)[::-1], df_oligo["chr_ori"][::-1]))
+    return fragments, frag_to_chr_ori
+
+
+def profile_reference(sample):
+    """
+    Contacts of each probe fragment with every other fragment, straight from the sparse matrix.
+    """
+    df_fragments = sample["fragments"]
+    probes_fragments = set(sample["oligo"]["fragment"])
+    profiles = defaultdict(Counter)
+    for frag_a, frag_b, contacts in sample["sparse"].itertuples(index=False):
+        if frag_a in probes_fragments:
+            profiles[str(frag_a)][frag_b] += contacts
+        if frag_b in probes_fragments:
+            profiles[str(frag_b)][frag_a] += contacts
+
+    return {
+        frag: {(df_fragments.loc[f, "chrom"], df_fragments.loc[f, "start_pos"]): c for f, c in profile.items()}
+        for frag, profile in profiles.items()
+    }
+
+
+def test_associate_oligo_to_frag(sample):
+    df_fragments = sample["fragments"]
+    for _, oligo in sample["oligo"].iterrows():
+        middle = int(oligo["start"] + (oligo["end"] - oligo["start"]) / 2)
+        df_before = df_fragments[(df_fragments["chrom"] == oligo["chr"]) & (df_fragments["start_pos"] < middle)]
+        frag = df_before.index[df_before["start_pos"] == df_before["start_pos"].max()][0]
+        assert oligo["fragment"] == frag
+        assert oligo["fragment_start"] == df_fragments.loc[frag, "start_pos"]
+        assert oligo["fragment_end"] == df_fragments.loc[frag, "end_pos"]
+
+
+def test_filter_contacts(sample):
+    df_fragments = sample["fragments"]
+    probes_per_fragment = defaultdict(list)
+    for frag, name in zip(sample["oligo"]["fragment"], sample["oligo"]["name"]):
+        probes_per_fragment[frag].append(name)
+
+    expected = []
+    for frag_a, frag_b, contacts in sample["sparse"].itertuples(index=False):
+        expected += [(frag_a, frag_b, contacts, name, "") for name in probes_per_fragment[frag_a]]
+        expected += [(frag_a, frag_b, contacts, "", name) for name in probes_per_fragment[frag_b]]
+
+    df = pd.read_csv(sample["filtered_path"], sep="\t")
+    df_names = df[["name_a", "name_b"]].fillna("")
+    assert sorted(zip(df["frag_a"], df["frag_b"], df["contacts"], df_names["name_a"], df_names["name_b"])) == \
+        sorted(expected)
+    for x in ["a", "b"]:
+        assert (df["chr_" + x] == df_fragments.loc[df["frag_" + x], "chrom"].to_numpy()).all()
+        assert (df["start_" + x] == df_fragments.loc[df["frag_" + x], "start_pos"].to_numpy()).all()
+        assert (df["size_" + x] == df_fragments.loc[df["frag_" + x], "size"].to_numpy()).all()
+    assert (np.diff(df["frag_a"]) >= 0).all()
+
+
+def test_coverage(sample):
+    df_fragments = sample["fragments"]
+    expected = Counter()
+    for frag_a, frag_b, contacts in sample["sparse"].itertuples(index=False):
+        expected[frag_a] += contacts
+        expected[frag_b] += contacts
+
+    sshic.coverage(sample["sparse_path"], sample["fragments_path"], force=True)
+    sshic.coverage(sample["sparse_path"], sample["fragments_path"], force=True, bin_size=BIN_SIZE)
+    output_path = join(sample["dir"], f"{SAMPLE}_contacts_coverage.bedgraph")
+
+    df = pd.read_csv(output_path, sep="\t", header=None, names=["chr", "start", "end", "contacts"])
+    assert list(df.itertuples(index=False, name=None)) == [
+        (df_fragments.loc[f, "chrom"], df_fragments.loc[f, "start_pos"], df_fragments.loc[f, "end_pos"], c)
+        for f, c in sorted(expected.items())
+    ]
+
+    df_binned = pd.read_csv(output_path.replace(".bedgraph", "_10kb.bedgraph"), sep="\t", header=None,
+                            names=["chr", "start", "end", "contacts"])
+    assert ((df_binned["start"] % BIN_SIZE == 0) & (df_binned["end"] == df_binned["start"] + BIN_SIZE)).all()
+    chr_totals = df.groupby("chr")["contacts"].sum()
+    binned_chr_totals = df_binned.groupby("chr")["contacts"].sum()
+    assert np.allclose(binned_chr_totals[chr_totals.index], chr_totals, atol=1e-2)
+
+
+def test_profile_contacts(sample):
+    expected = profile_reference(sample)
+    fragments, _ = oligo_fragments(sample["oligo"])
+    df_coords = pd.read_csv(COORDS, sep="\t")
+    chr_starts = dict(zip(df_coords["chr"], np.cumsum(df_coords["length"]) - df_coords["length"]))
+    chr_rank = {c: i for i, c in enumerate(df_coords["chr"])}
+
+    df = pd.read_csv(sample["profile_path"], sep="\t")
+    assert list(df.columns[:4]) == ["chr", "start", "sizes", "genome_start"]
+    assert list(df.columns[4:4 + len(fragments)]) == fragments
+    assert (df["genome_start"] == df["chr"].map(chr_starts) + df["start"]).all()
+    assert list(zip(df["chr"].map(chr_rank), df["start"])) == sorted(zip(df["chr"].map(chr_rank), df["start"]))
+
+    positions = list(zip(df["chr"], df["start"]))
+    for frag in fragments:
+        assert {p: c for p, c in zip(positions, df[frag]) if c != 0} == expected.get(frag, {})
+
+    df_frequencies = pd.read_csv(sample["profile_path"].replace("contacts", "frequencies"), sep="\t")
+    for frag in fragments:
+        if df[frag].sum() > 0:
+            assert np.allclose(df_frequencies[frag], df[frag] / df[frag].sum())
+
+    df_groups = pd.read_csv(GROUPS, sep="\t")
+    probe_to_frag = dict(zip(sample["oligo"]["name"], sample["oligo"]["fragment"].astype(str)))
+    for name, probes, action in df_groups.itertuples(index=False):
+        group_frags = sorted({probe_to_frag[p] for p in probes.split(",")})
+        group = df[group_frags].mean(axis=1) if action == "average" else df[group_frags].sum(axis=1)
+        assert np.allclose(df["$" + name.lower()], group)
+
+
+def test_rebin_profile(sample):
+    df_profile = pd.read_csv(sample["profile_path"], sep="\t")
+    columns = [c for c in df_profile.columns if c.isdigit() or c.startswith("$")]
+    expected = defaultdict(Counter)
+    for row in df_profile.to_dict("records"):
+        start, end = row["start"], row["start"] + row["sizes"]
+        start_bin, end_bin = start // BIN_SIZE * BIN_SIZE, end // BIN_SIZE * BIN_SIZE
+        end_share = (end - end_bin) / row["sizes"] if start_bin != end_bin else 0
+        for c in columns:
+            expected[(row["chr"], start_bin)][c] += row[c] * (1 - end_share)
+            expected[(row["chr"], end_bin)][c] += row[c] * end_share
+
+    df_coords = pd.read_csv(COORDS, sep="\t")
+    bins = [(c, b) for c, length in zip(df_coords["chr"], df_coords["length"])
+            for b in range(0, (length // BIN_SIZE + 1) * BIN_SIZE, BIN_SIZE)]
+
+    df = pd.read_csv(sample["binned_path"], sep="\t")
+    assert list(zip(df["chr"], df["chr_bins"])) == bins
+    assert (df["genome_bins"] == np.arange(len(bins)) * BIN_SIZE).all()
+    for c in columns:
+        assert np.allclose(df[c], [expected[b][c] for b in bins])
+
+
+def test_rebin_profile_out_of_chr(sample, tmp_path):
+    #   Positions past the length of their chromosome (mismatched coordinates file) are dropped,
+    #   on the first chromosome as on the last one
+    df_profile = pd.read_csv(sample["profile_path"], sep="\t")
+    df_coords = pd.read_csv(COORDS, sep="\t")
+    df_extra = df_profile.iloc[:2].copy()
+    df_extra["chr"] = [df_coords["chr"].iloc[0], df_coords["chr"].iloc[-1]]
+    df_extra["start"] = [df_coords["length"].iloc[0] + BIN_SIZE, df_coords["length"].iloc[-1] + BIN_SIZE]
+    df_extra.iloc[:, 4:] = 1.0
+    profile_path = join(tmp_path, f"{SAMPLE}_0kb_profile_contacts.tsv")
+    pd.concat([df_profile, df_extra]).to_csv(profile_path, sep="\t", index=False)
+
+    sshic.rebin_profile(profile_path, COORDS, BIN_SIZE, force=True)
+    df = pd.read_csv(profile_path.replace("0kb_profile", "10kb_profile"), sep="\t")
+    assert df.equals(pd.read_csv(sample["binned_path"], sep="\t"))
+
+
+def test_get_stats(sample):
+    cis_range = 50000
+    df_oligo = sample["oligo"]
+    df_profile = pd.read_csv(sample["profile_path"], sep="\t")
+    df_coords = pd.read_csv(COORDS, sep="\t")
+    chr_sizes = dict(zip(df_coords["chr"], df_coords["length"]))
+    total_contacts = sample["sparse"]["contacts"].sum()
+
+    sshic.get_stats(sample["profile_path"], sample["sparse_path"], COORDS, sample["capture_fragments"],
+                    cis_range=cis_range, force=True)
+    df_stats = pd.read_csv(join(sample["dir"], f"{SAMPLE}_statistics.tsv"), sep="\t")
+    df_chr_freq = pd.read_csv(join(sample["dir"], f"{SAMPLE}_norm_chr_freq.tsv"), sep="\t")
+
+    ds_contacts = []
+    for i, oligo in df_oligo.iterrows():
+        contacts = df_profile[str(oligo["fragment"])]
+        total = contacts.sum()
+        is_chr_ori = df_profile["chr"] == oligo["chr_ori"]
+        is_cis = (is_chr_ori & (df_profile["start"] >= oligo["start_ori"] - cis_range) &
+                  (df_profile["start"] + df_profile["sizes"] <= oligo["stop_ori"] + cis_range))
+        assert df_stats.loc[i, "probe"] == oligo["name"]
+        assert df_stats.loc[i, "contacts"] == total
+        assert np.isclose(df_stats.loc[i, "coverage_over_hic_contacts"], total / total_contacts)
+        assert np.isclose(df_stats.loc[i, "cis"], contacts[is_cis].sum() / total if total else 0)
+        assert np.isclose(df_stats.loc[i, "inter_chr"], contacts[~is_chr_ori].sum() / total if total else 0)
+
+        genome_size = sum(s for c, s in chr_sizes.items() if c != oligo["chr_ori"])
+        for chr_, chr_size in chr_sizes.items():
+            n1 = contacts[df_profile["chr"] == chr_].sum()
+            assert np.isclose(df_chr_freq.loc[i, chr_], (n1 / total) / (chr_size / genome_size) if n1 else 0)
+        if oligo["type"] == "ds":
+            ds_contacts.append(total)
+
+    assert np.allclose(df_stats["dsdna_norm_capture_efficiency"], df_stats["contacts"] / np.mean(ds_contacts))
+
+
+def test_aggregate_centromeres(sample):
+    window_size = 50000
+    excluded_chr = ["chr3", "2_micron", "mitochondrion", "chr_artificial_donor", "chr_artificial_ssDNA"]
+    fragments, frag_to_chr_ori = oligo_fragments(sample["oligo"])
+
+    df = pd.read_csv(sample["binned_frequencies_path"], sep="\t")
+    df = df[~df["chr"].isin(excluded_chr)].copy()
+    for frag in fragments:
+        df.loc[df["chr"] == frag_to_chr_ori[frag], frag] = np.nan
+        df[frag] /= df[frag].sum()
+
+    df_coords = pd.read_csv(COORDS, sep="\t")
+    left_arms = dict(zip(df_coords["chr"], df_coords["left_arm_length"]))
+    rows = []
+    for row in df.to_dict("records"):
+        left_arm = left_arms[row["chr"]]
+        if left_arm - window_size - BIN_SIZE < row["chr_bins"] < left_arm + window_size:
+            rows.append(dict(row, chr_bins=abs(row["chr_bins"] - left_arm // BIN_SIZE * BIN_SIZE)))
+    expected = (pd.DataFrame(rows).groupby(["chr", "chr_bins"]).mean(numeric_only=True)
+                .groupby("chr_bins").mean().drop(columns="genome_bins"))
+
+    sshic.aggregate(sample["binned_frequencies_path"], COORDS, sample["capture_fragments"], window_size,
+                    centromeres=True, excluded_chr_list=excluded_chr, inter_only=True, normalize=True)
+    output_prefix = join(sample["dir"], "aggregated", "centromeres", "AD000_agg_on_cen_inter_norm")
+    df_mean = pd.read_csv(output_prefix + "_mean.tsv", sep="\t", index_col=0).set_index("chr_bins")
+    assert list(df_mean.index) == list(expected.index)
+    assert np.allclose(df_mean[expected.columns], expected, rtol=1e-4, equal_nan=True)
+
+
+def test_nfr_preprocess(sample, tmp_path):
+    rng = np.random.default_rng(SEED)
+    df_fragments = sample["fragments"]
+    chrs = [c for c in pd.unique(df_fragments["chrom"]) if c not in ["2_micron", "mitochondrion"]]
+    nfr_starts = rng.integers(0, 200000, 600)
+    nfr_lengths = rng.integers(100, 6000, 600)
+    df_nucleosomes = pd.DataFrame({
+        "chrom": rng.choice(chrs, 600),
+        "start": nfr_starts,
+        "end": nfr_starts + nfr_lengths,
+        "length": nfr_lengths
+    })
+    nucleosomes_path = join(tmp_path, "nucleosomes.tsv")
+    df_nucleosomes.to_csv(nucleosomes_path, sep="\t", index=False)
+
+    df_kept = df_fragments[~df_fragments["chrom"].isin(["2_micron", "mitochondrion"])]
+    nfr_per_chr = {c: (df["start"].to_numpy(), df["end"].to_numpy()) for c, df in df_nucleosomes.groupby("chrom")}
+    for mode, left, right, inclusive in [("start_only", "start_pos", "start_pos", False),
+                                         ("end_only", "end_pos", "end_pos", False),
+                                         ("middle", "midpoint", "midpoint", True),
+                                         ("start_&_end", "start_pos", "end_pos", False)]:
+        in_nfr = set()
+        for frag in df_kept.assign(midpoint=(df_kept["start_pos"] + df_kept["end_pos"]) / 2).itertuples():
+            nfr_starts, nfr_ends = nfr_per_chr.get(frag.chrom, (np.array([]), np.array([])))
+            left_pos, right_pos = getattr(frag, left), getattr(frag, right)
+            if inclusive:
+                is_in = (nfr_starts <= left_pos) & (right_pos <= nfr_ends)
+            else:
+                is_in = (nfr_starts < left_pos) & (right_pos < nfr_ends)
+            if is_in.any():
+                in_nfr.add(frag.Index)
+        assert 0 < len(in_nfr) < len(df_kept)
+
+        output_dir = join(tmp_path, mode) + "/"
+        os.makedirs(output_dir)
+        nfr.preprocess(sample["fragments_path"], mode, nucleosomes_path, output_dir)
+        df_in = pd.read_csv(output_dir + "fragments_list_in_nfr.tsv", sep="\t")
+        df_out = pd.read_csv(output_dir + "fragments_list_out_nfr.tsv", sep="\t")
+        assert set(df_in["fragments"]) == in_nfr
+        assert set(df_out["fragments"]) == set(df_kept.index) - in_nfr
+
+
+def test_nfr_run(sample, tmp_path):
+    df_oligo = sample["oligo"]
+    df_fragments = sample["fragments"]
+    df_profile = pd.read_csv(sample["profile_path"], sep="\t")
+    contacts_path = join(tmp_path, "AD000_formatted_contacts.tsv")
+    df_profile.rename(columns={"start": "positions"}).to_csv(contacts_path, sep="\t", index=False)
+
+    probes_path = join(tmp_path, "probes_to_fragments.tsv")
+    pd.DataFrame(
+        [df_oligo["type"], df_oligo["start"], df_oligo["end"], df_oligo["chr_ori"], df_oligo["fragment"],
+         df_oligo["fragment_start"], df_oligo["fragment_end"]],
+        index=["type", "probe_start", "probe_end", "chr", "frag_id", "frag_start", "frag_end"]
+    ).set_axis(df_oligo["name"], axis=1).to_csv(probes_path, sep="\t")
+
+    is_in = np.zeros(len(df_fragments), dtype=bool)
+    is_in[::3] = True
+    in_path, out_path = join(tmp_path, "in_nfr.tsv"), join(tmp_path, "out_nfr.tsv")
+    df_fragments[is_in].to_csv(in_path, sep="\t", index_label="fragments")
+    df_fragments[~is_in].to_csv(out_path, sep="\t", index_label="fragments")
+
+    output_dir = join(tmp_path, "nfr") + "/"
+    nfr.run(contacts_path, probes_path, in_path, out_path, output_dir)
+    df_stats = pd.read_csv(output_dir + "AD000_statistics_nfr_per_probe.tsv", sep="\t", index_col=0)
+
+    size_in, size_out = df_fragments["size"][is_in].sum(), df_fragments["size"][~is_in].sum()
+    starts_in, starts_out = set(df_fragments["start_pos"][is_in]), set(df_fragments["start_pos"][~is_in])
+    assert list(df_stats["probe"]) == list(df_oligo["name"])
+    for i, oligo in df_oligo.iterrows():
+        df_inter = df_profile[df_profile["chr"] != oligo["chr_ori"]]
+        contacts = df_inter[str(oligo["fragment"])]
+        cts_in = contacts[df_inter["start"].isin(starts_in)].sum()
+        cts_out = contacts[df_inter["start"].isin(starts_out)].sum()
+        total = cts_in + cts_out
+        assert np.isclose(df_stats.loc[i, "contacts_in_nfr"],
+                          (cts_in / total) / (size_in / (size_in + size_out)) if total else 0)
+        assert np.isclose(df_stats.loc[i, "contacts_out_nfr"],
+                          (cts_out / total) / (size_out / (size_in + size_out)) if total else 0)
+
+
+def test_rdna(sample, tmp_path, monkeypatch):
+    df_oligo = sample["oligo"]
+    fragments, frag_to_chr_ori = oligo_fragments(df_oligo)
+    regions = {
+        "avg_flanking_left_(chr12-440000:450000)": range(400000, 450000, BIN_SIZE),
+        "avg_rdna_region_(chr12-451000:467000)": range(450000, 480000, BIN_SIZE),
+        "avg_flanking_right_(chr12-490000:500000)": range(490000, 510000, BIN_SIZE),
+    }
+    averages = {"Average_left": fragments[:4], "Average_right": fragments[4:9]}
+    monkeypatch.setattr(rdna, "df_probes", pd.DataFrame(
+        {"frag_id": df_oligo["fragment"], "chr": df_oligo["chr_ori"]}), raising=False)
+    monkeypatch.setattr(rdna, "probes_averages", averages, raising=False)
+    for var, bins in zip(["rdna_flanking_left", "rdna_regions", "rdna_flanking_right"], regions.values()):
+        monkeypatch.setattr(rdna, var, pd.DataFrame({"chr": "chr12", "chr_bins": list(bins)}), raising=False)
+
+    output_dir = str(tmp_path) + "/"
+    rdna.main(sample["binned_path"], output_dir)
+    df = pd.read_csv(output_dir + "AD000_rDNA_regions_frequencies.tsv", sep="\t", index_col=0)
+
+    df_contacts = pd.read_csv(sample["binned_path"], sep="\t")
+    for frag in fragments:
+        df_contacts.loc[df_contacts["chr"] == frag_to_chr_ori[frag], frag] = np.nan
+        df_contacts[frag] /= df_contacts[frag].sum()
+    for name, frags in averages.items():
+        df_contacts[name] = df_contacts[frags].mean(axis=1)
+
+    for region, bins in regions.items():
+        df_region = df_contacts[(df_contacts["chr"] == "chr12") & df_contacts["chr_bins"].isin(bins)]
+        for column in fragments + list(averages):
+            assert np.isclose(df.loc[column, region], df_region[column].mean(), equal_nan=True)